@@ -1,5 +1,5 @@
 from SciRetriever.database.optera import Query, Insert
-from SciRetriever.model.paper import PaperMetadata
+from SciRetriever.utils.normalize import canonical_publisher
 
 """
 过滤出版社名称并合并数据库
@@ -16,15 +16,7 @@ PUBLISHER = [
     "American Physical Society",
     "Institute of Physics Publishing",
 ]
-TRANS_DICT = {
-    "Elsevier BV": "Elsevier",
-    "American Chemical Society (ACS)": "American Chemical Society",
-    "ACS Publications": "American Chemical Society",
-    "pubs.rsc.org": "Royal Society of Chemistry",
-    "AIP Publishing": "American Institute of Physics",
-    "Wiley Online Library": "Wiley",
-    "Springer Science and Business Media LLC": "Springer",
-}
+# 出版社别名的统一见SciRetriever.utils.normalize.PUBLISHER_ALIASES
 
 dir1 = "1.db"
 dir2 = "2.db"
@@ -33,25 +25,15 @@ dir4 = "4.db"
 
 output = "all.db"
 
-query1 = Query.connect_db(dir1)
-query2 = Query.connect_db(dir2)
-query3 = Query.connect_db(dir3)
-query4 = Query.connect_db(dir4)
-query_all = Query.connect_db(output,create_db=True)
-insert_all = Insert.connect_db(output)
+insert_all = Insert.connect_db(output, create_db=True, profile="bulk-load")
 
-paper1 = query1.query_all(limit=None)
-paper2 = query2.query_all(limit=None)
-paper3 = query3.query_all(limit=None)
-paper4 = query4.query_all(limit=None)
-
-paper_all = paper1 + paper2 + paper3 + paper4
-
-all_meta = [PaperMetadata.from_paper(paper) for paper in paper_all]
-for meta in all_meta:
-    if meta.publisher in TRANS_DICT:
-        meta.publisher = TRANS_DICT[meta.publisher]
-    meta.Insert_database(insert_all)
-    
-print(all_meta[0])
+def trans_publisher(rows):
+    for row in rows:
+        row["publisher"] = canonical_publisher(row["publisher"])
+        yield row
 
+# 逐条读取每个数据库并批量写入,内存占用与数据库大小无关
+for db_dir in [dir1, dir2, dir3, dir4]:
+    with Query.connect_db(db_dir) as query:
+        result = insert_all.upsert(trans_publisher(query.stream(as_dict=True)))
+        print(db_dir, result)
@@ -0,0 +1,362 @@
+"""
+papers表去重
+
+重复论文的分组在数据库中完成:
+    1. doi: doi_norm相同的论文
+    2. title: title_hash(规范化标题的哈希)相同,并且最多只有一个不同的DOI的论文,只删除其中没有DOI的论文
+    3. near(可选): 标题+摘要的MinHash/LSH相似度超过阈值的论文,LSH分桶同样保存在临时表中
+
+每一组保留一篇论文(优先有DOI、已下载PDF、引用数多、id小的),其余论文的元数据合并到保留的论文中,
+引用关系和任务改为指向保留的论文,然后按批删除。所有中间结果保存在SQLite临时表中,内存占用与数据库大小无关。
+
+示例：
+    dedup = Dedup.connect_db("all.db")
+    report = dedup.run(near_duplicates=True, threshold=0.9)
+    logger.info(report)
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import bindparam, select, text, update
+from sqlalchemy.engine import Connection
+
+from .migrate import create_indexes
+from .model import Paper
+from .optera import DEFAULT_MERGE_RULES, Insert, Optera
+from ..utils.logging import get_logger
+from ..utils.normalize import normalize_doi, normalize_title, title_hash
+
+logger = get_logger(__name__)
+
+# 保留论文的优先级
+_SURVIVOR_ORDER = "doi_norm IS NULL, pdf_downloaded DESC, citations_num IS NULL, citations_num DESC, id"
+
+_DOI_GROUPS = f"""
+CREATE TEMP TABLE dedup_map AS
+SELECT id AS dup_id, survivor_id FROM (
+    SELECT id, FIRST_VALUE(id) OVER (PARTITION BY doi_norm ORDER BY {_SURVIVOR_ORDER}) AS survivor_id
+    FROM papers
+    WHERE doi_norm IN (
+        SELECT doi_norm FROM papers WHERE doi_norm IS NOT NULL GROUP BY doi_norm HAVING COUNT(*) > 1
+    )
+) WHERE id != survivor_id
+"""
+
+_TITLE_GROUPS = f"""
+CREATE TEMP TABLE dedup_map AS
+SELECT id AS dup_id, survivor_id FROM (
+    SELECT id, doi_norm, FIRST_VALUE(id) OVER (PARTITION BY title_hash ORDER BY {_SURVIVOR_ORDER}) AS survivor_id
+    FROM papers
+    WHERE title_hash IN (
+        SELECT title_hash FROM papers WHERE title_hash IS NOT NULL GROUP BY title_hash
+        HAVING COUNT(*) > 1 AND COUNT(DISTINCT doi_norm) <= 1 AND SUM(doi_norm IS NULL) > 0
+    )
+) WHERE id != survivor_id AND doi_norm IS NULL
+"""
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+@dataclass
+class DedupReport:
+    """一次去重的统计"""
+    groups: int = 0
+    removed: int = 0
+    per_key: dict[str, int] = field(default_factory=dict)
+
+
+def shingles(text_: str, size: int = 3) -> set[str]:
+    """规范化文本的词级shingle集合,文本少于size个词时返回整个文本"""
+    words = _WORD.findall(normalize_title(text_))
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set[str], b: set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(items: set[str], num_perm: int = 64) -> list[int]:
+    """
+    MinHash签名,第i个哈希函数为hash((i, item))
+
+    只在同一个进程内比较签名,Python的哈希随机化不影响结果
+    """
+    return [min(hash((i, item)) for item in items) for i in range(num_perm)]
+
+
+class Dedup(Optera):
+    """
+    基于SQL分组的去重引擎
+    """
+    def __init__(self, DB_engine, merge_rules: dict[str, str] | None = None) -> None:
+        """
+        Args:
+            merge_rules: 合并元数据的规则,见optera.DEFAULT_MERGE_RULES
+        """
+        super().__init__(DB_engine)
+        self.merge_rules: dict[str, str] = {**DEFAULT_MERGE_RULES, **(merge_rules or {})}
+
+    def run(
+        self,
+        by: tuple[str, ...] = ("doi", "title"),
+        near_duplicates: bool = False,
+        threshold: float = 0.9,
+        chunk_size: int = 1000,
+        dry_run: bool = False,
+    ) -> DedupReport:
+        """
+        执行去重
+
+        Args:
+            by: 精确去重使用的键,doi和/或title
+            near_duplicates: 是否再用MinHash/LSH查找近似重复
+            threshold: 近似重复的Jaccard相似度阈值
+            chunk_size: 每批合并删除的论文数
+            dry_run: 只统计,不修改数据库
+
+        Returns:
+            DedupReport
+        """
+        report = DedupReport()
+        with self.engine.connect() as conn:
+            for key in by:
+                if key == "doi":
+                    self._create_map(conn, _DOI_GROUPS)
+                elif key == "title":
+                    self._create_map(conn, _TITLE_GROUPS)
+                else:
+                    raise ValueError(f"Unknown dedup key '{key}', expected 'doi' or 'title'")
+                self._process(conn, key, report, chunk_size, dry_run)
+            if near_duplicates:
+                self._create_near_map(conn, threshold)
+                self._process(conn, "near", report, chunk_size, dry_run)
+            conn.execute(text("DROP TABLE IF EXISTS temp.dedup_map"))
+            conn.commit()
+
+        if report.removed and not dry_run:
+            # 去掉重复的DOI之后可以创建唯一索引
+            create_indexes(self.engine)
+        logger.info(f"Dedup finished: {report}")
+        return report
+
+    @staticmethod
+    def _create_map(conn: Connection, sql: str) -> None:
+        """创建临时表dedup_map(dup_id, survivor_id)"""
+        conn.execute(text("DROP TABLE IF EXISTS temp.dedup_map"))
+        conn.execute(text(sql))
+        conn.execute(text("CREATE INDEX temp.ix_dedup_map_survivor ON dedup_map (survivor_id)"))
+        conn.commit()
+
+    def _process(self, conn: Connection, key: str, report: DedupReport, chunk_size: int, dry_run: bool) -> None:
+        """按照保留论文的id分批合并并删除dedup_map中的重复论文"""
+        groups, removed = conn.execute(text("SELECT COUNT(DISTINCT survivor_id), COUNT(*) FROM dedup_map")).one()
+        report.groups += groups
+        report.removed += removed
+        report.per_key[key] = removed
+        logger.info(f"[{key}] {removed} duplicates in {groups} groups")
+        if dry_run or not removed:
+            return
+
+        last_id = -1
+        done = 0
+        # 按(survivor_id, dup_id)顺序合并,同一组的结果与数据库中的行顺序无关
+        while True:
+            pairs = conn.execute(
+                text(
+                    "SELECT dup_id, survivor_id FROM dedup_map WHERE survivor_id IN ("
+                    "SELECT DISTINCT survivor_id FROM dedup_map WHERE survivor_id > :last "
+                    "ORDER BY survivor_id LIMIT :limit) ORDER BY survivor_id, dup_id"
+                ),
+                {"last": last_id, "limit": chunk_size},
+            ).all()
+            if not pairs:
+                break
+            self._merge_chunk(conn, pairs)
+            conn.commit()
+            last_id = pairs[-1].survivor_id
+            done += len(pairs)
+            logger.info(f"[{key}] Removed {done}/{removed} duplicates")
+
+    def _merge_chunk(self, conn: Connection, pairs: list[Any]) -> None:
+        table = Paper.__table__
+        dup_ids = [pair.dup_id for pair in pairs]
+        survivor_ids = sorted({pair.survivor_id for pair in pairs})
+        rows = {
+            row.id: row._asdict()
+            for row in conn.execute(select(table).where(table.c.id.in_(dup_ids + survivor_ids)))
+        }
+
+        # 合并元数据,保留论文的值优先
+        merged: dict[int, dict[str, Any]] = {survivor_id: rows[survivor_id] for survivor_id in survivor_ids}
+        for pair in pairs:
+            merged[pair.survivor_id] = Insert._merge_rows(merged[pair.survivor_id], rows[pair.dup_id], self.merge_rules)
+
+        # 引用关系和任务指向保留的论文,已经存在的关系会被忽略,剩下的随重复论文一起删除
+        remap = [{"dup": pair.dup_id, "survivor": pair.survivor_id} for pair in pairs]
+        conn.execute(text("UPDATE OR IGNORE paper_citation_association SET citing_paper_id = :survivor WHERE citing_paper_id = :dup"), remap)
+        conn.execute(text("UPDATE OR IGNORE paper_citation_association SET cited_paper_id = :survivor WHERE cited_paper_id = :dup"), remap)
+        conn.execute(text("UPDATE OR IGNORE jobs SET paper_id = :survivor WHERE paper_id = :dup"), remap)
+        dups = {"ids": dup_ids}
+        conn.execute(
+            text("DELETE FROM paper_citation_association WHERE citing_paper_id IN :ids OR cited_paper_id IN :ids")
+            .bindparams(bindparam("ids", expanding=True)),
+            dups,
+        )
+        conn.execute(text("DELETE FROM paper_citation_association WHERE citing_paper_id = cited_paper_id"))
+        conn.execute(text("DELETE FROM jobs WHERE paper_id IN :ids").bindparams(bindparam("ids", expanding=True)), dups)
+        conn.execute(table.delete().where(table.c.id.in_(dup_ids)))
+
+        # 先删除重复论文,保留论文填充DOI时不会违反唯一约束
+        values = []
+        for survivor_id, row in merged.items():
+            row = dict(row)
+            row["pid"] = survivor_id
+            row["doi_norm"] = normalize_doi(row["doi"])
+            row["title_hash"] = title_hash(row["title"])
+            values.append(row)
+        columns = [name for name in values[0] if name not in ("id", "pid")]
+        conn.execute(
+            update(table)
+            .where(table.c.id == bindparam("pid"))
+            .values({name: bindparam(name) for name in columns}),
+            values,
+        )
+
+    def find_near_duplicates(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_bucket: int = 50,
+        page_size: int = 5000,
+    ) -> list[tuple[int, int, float]]:
+        """
+        使用MinHash/LSH查找标题和摘要近似的论文
+
+        Returns:
+            (id1, id2, Jaccard相似度)列表,只包含相似度不低于threshold的论文对
+        """
+        with self.engine.connect() as conn:
+            pairs = self._near_pairs(conn, threshold, num_perm, bands, max_bucket, page_size)
+            conn.execute(text("DROP TABLE IF EXISTS temp.dedup_lsh"))
+        return pairs
+
+    def _near_pairs(
+        self,
+        conn: Connection,
+        threshold: float,
+        num_perm: int = 64,
+        bands: int = 16,
+        max_bucket: int = 50,
+        page_size: int = 5000,
+    ) -> list[tuple[int, int, float]]:
+        """计算LSH分桶并验证候选对的真实相似度"""
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rows_per_band = num_perm // bands
+        table = Paper.__table__
+
+        conn.execute(text("DROP TABLE IF EXISTS temp.dedup_lsh"))
+        conn.execute(text("CREATE TEMP TABLE dedup_lsh (bucket INTEGER NOT NULL, id INTEGER NOT NULL)"))
+        last_id = 0
+        while True:
+            page = conn.execute(
+                select(table.c.id, table.c.title, table.c.abstract)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(page_size)
+            ).all()
+            if not page:
+                break
+            buckets = []
+            for paper_id, title, abstract in page:
+                items = shingles(f"{title or ''} {abstract or ''}")
+                if not items:
+                    continue
+                signature = minhash(items, num_perm)
+                for band in range(bands):
+                    chunk = tuple(signature[band * rows_per_band:(band + 1) * rows_per_band])
+                    # SQLite的INTEGER为64位有符号整数
+                    buckets.append({"bucket": hash((band, chunk)) & 0x7FFFFFFFFFFFFFFF, "id": paper_id})
+            if buckets:
+                conn.execute(text("INSERT INTO dedup_lsh (bucket, id) VALUES (:bucket, :id)"), buckets)
+            last_id = page[-1].id
+        conn.execute(text("CREATE INDEX temp.ix_dedup_lsh_bucket ON dedup_lsh (bucket)"))
+
+        # 过大的桶(例如标题为Editorial的论文)会产生大量候选对,直接跳过
+        # 候选对按page_size分批读取并验证,不一次性载入内存
+        candidates = conn.execution_options(yield_per=page_size).execute(text(
+            "SELECT DISTINCT a.id, b.id FROM dedup_lsh a JOIN dedup_lsh b ON a.bucket = b.bucket AND a.id < b.id "
+            "WHERE a.bucket IN (SELECT bucket FROM dedup_lsh GROUP BY bucket HAVING COUNT(*) BETWEEN 2 AND :max_bucket) "
+            "ORDER BY a.id, b.id"
+        ), {"max_bucket": max_bucket})
+
+        pairs = []
+        for chunk in candidates.partitions():
+            ids = {paper_id for pair in chunk for paper_id in pair}
+            papers = {
+                row.id: row
+                for row in conn.execute(
+                    select(table.c.id, table.c.title, table.c.abstract, table.c.doi_norm).where(table.c.id.in_(ids))
+                )
+            }
+            for id1, id2 in chunk:
+                a, b = papers[id1], papers[id2]
+                # DOI不同的论文是不同的作品(例如勘误),不合并
+                if a.doi_norm and b.doi_norm and a.doi_norm != b.doi_norm:
+                    continue
+                similarity = jaccard(
+                    shingles(f"{a.title or ''} {a.abstract or ''}"),
+                    shingles(f"{b.title or ''} {b.abstract or ''}"),
+                )
+                if similarity >= threshold:
+                    pairs.append((id1, id2, similarity))
+        return pairs
+
+    def _create_near_map(self, conn: Connection, threshold: float) -> None:
+        """将近似重复的论文对合并为组(并查集),写入dedup_map"""
+        pairs = self._near_pairs(conn, threshold)
+        conn.execute(text("DROP TABLE IF EXISTS temp.dedup_lsh"))
+
+        parent: dict[int, int] = {}
+
+        def find(x: int) -> int:
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for id1, id2, _ in pairs:
+            root1, root2 = find(id1), find(id2)
+            if root1 != root2:
+                parent[max(root1, root2)] = min(root1, root2)
+
+        groups: dict[int, list[int]] = {}
+        for paper_id in parent:
+            groups.setdefault(find(paper_id), []).append(paper_id)
+
+        conn.execute(text("DROP TABLE IF EXISTS temp.dedup_map"))
+        conn.execute(text("CREATE TEMP TABLE dedup_map (dup_id INTEGER NOT NULL, survivor_id INTEGER NOT NULL)"))
+        mapping = []
+        for members in groups.values():
+            ranked = conn.execute(
+                text(f"SELECT id, doi_norm FROM papers WHERE id IN :ids ORDER BY {_SURVIVOR_ORDER}")
+                .bindparams(bindparam("ids", expanding=True)),
+                {"ids": members},
+            ).all()
+            survivor = ranked[0]
+            for row in ranked[1:]:
+                # 组内通过传递得到的不同DOI不合并
+                if row.doi_norm and survivor.doi_norm and row.doi_norm != survivor.doi_norm:
+                    continue
+                mapping.append({"dup_id": row.id, "survivor_id": survivor.id})
+        if mapping:
+            conn.execute(text("INSERT INTO dedup_map (dup_id, survivor_id) VALUES (:dup_id, :survivor_id)"), mapping)
+        conn.execute(text("CREATE INDEX temp.ix_dedup_map_survivor ON dedup_map (survivor_id)"))
+        conn.commit()
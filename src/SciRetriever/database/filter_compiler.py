@@ -0,0 +1,168 @@
+"""
+将searcher.filter.UniversalFilter编译为SQL条件
+
+数据库在读取时直接丢弃不满足条件的论文,不需要先创建Python对象再逐条调用UniversalFilter.check:
+    exclude_terms -> NOT (text LIKE '%term%')
+    KeywordGroup  -> (fuzzy_terms的LIKE) OR (strict_terms的全词匹配), 多个组之间为AND
+    strict_terms  -> FTS5词元匹配(strict="fts") 或者 REGEXP '\\bterm\\b'(strict="regexp")
+
+SQLite内置的lower()和LIKE只转换ASCII字母的大小写,文本统一通过unicode_lower转换为小写,
+在SQLite中编译为register_sqlite_functions注册的Python函数(与str.lower相同),其他数据库中为lower()。
+Optera.connect_db创建的engine已经注册,其他方式创建的engine需要先调用register_sqlite_functions。
+
+示例：
+    with Query.connect_db("all.db") as query:
+        papers = query.select(filter=my_filter, limit=None)
+        for paper_id, title in query.stream(columns=[Paper.id, Paper.title], filter=my_filter):
+            ...
+"""
+import re
+import sqlite3
+from typing import TYPE_CHECKING, Any
+
+from sqlalchemy import String, and_, column, event, false, func, literal_column, not_, or_, select, table, true
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.functions import GenericFunction
+
+from .migrate import FTS_COLUMNS
+from .model import Paper
+
+if TYPE_CHECKING:
+    # searcher包会导入数据库模块,这里只用于类型标注
+    from ..searcher.filter import KeywordGroup, UniversalFilter
+
+# 默认检查的文本: 标题 + 摘要
+DEFAULT_COLUMNS: tuple[str, ...] = ("title", "abstract")
+
+_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# 在SQLite连接上注册的小写函数名
+SQLITE_LOWER = "py_lower"
+
+
+class unicode_lower(GenericFunction):
+    """与Python的str.lower相同的小写转换"""
+    type = String()
+    inherit_cache = True
+
+
+@compiles(unicode_lower)
+def _compile_unicode_lower(element, compiler, **kw):
+    return f"lower({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(unicode_lower, "sqlite")
+def _compile_unicode_lower_sqlite(element, compiler, **kw):
+    return f"{SQLITE_LOWER}({compiler.process(element.clauses, **kw)})"
+
+
+def _py_lower(value: Any) -> Any:
+    return value.lower() if isinstance(value, str) else value
+
+
+def register_sqlite_functions(engine: Engine) -> None:
+    """在engine的每个新SQLite连接上注册unicode_lower使用的函数"""
+    @event.listens_for(engine, "connect")
+    def _register(dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            dbapi_connection.create_function(SQLITE_LOWER, 1, _py_lower, deterministic=True)
+
+
+def _text_expression(columns: tuple[str, ...]) -> ColumnElement:
+    """将多列拼接为一个小写的文本"""
+    parts = [func.coalesce(getattr(Paper, name), "") for name in columns]
+    expr = parts[0]
+    for part in parts[1:]:
+        expr = expr.op("||")(" ").op("||")(part)
+    return unicode_lower(expr)
+
+
+def _contains(text_: ColumnElement, term: str) -> ColumnElement:
+    """子串匹配,与Python中的term.lower() in text.lower()相同"""
+    return text_.contains(term.lower(), autoescape=True)
+
+
+def _strict_regexp(text_: ColumnElement, terms: list[str]) -> ColumnElement:
+    """全词匹配,与KeywordGroup中的正则表达式相同"""
+    pattern = r"(?i)\b(" + "|".join(re.escape(term) for term in terms) + r")\b"
+    return text_.regexp_match(pattern)
+
+
+def _fts_token(term: str) -> str | None:
+    """将全词匹配的词转换为FTS5短语,词中含有无法索引的字符(例如C++)时返回None"""
+    tokens = _FTS_TOKEN.findall(term)
+    if not tokens or "".join(tokens) != re.sub(r"\s+", "", term):
+        return None
+    return '"' + " ".join(tokens) + '"'
+
+
+def _strict_fts(columns: tuple[str, ...], terms: list[str]) -> ColumnElement:
+    """全词匹配使用全文索引,无法转换为FTS5词元的词退回为正则表达式"""
+    phrases = [_fts_token(term) for term in terms]
+    fallback = [term for term, phrase in zip(terms, phrases) if phrase is None]
+    phrases = [phrase for phrase in phrases if phrase is not None]
+
+    conditions = []
+    if phrases:
+        fts_table = table("papers_fts", column("rowid"))
+        match = "{" + " ".join(columns) + "} : (" + " OR ".join(phrases) + ")"
+        conditions.append(
+            Paper.id.in_(select(fts_table.c.rowid).where(literal_column("papers_fts").op("MATCH")(match)))
+        )
+    if fallback:
+        conditions.append(_strict_regexp(_text_expression(columns), fallback))
+    return or_(*conditions)
+
+
+def compile_group(
+    group: "KeywordGroup",
+    columns: tuple[str, ...] = DEFAULT_COLUMNS,
+    strict: str = "regexp",
+) -> ColumnElement:
+    """将KeywordGroup编译为SQL条件(组内OR)"""
+    text_ = _text_expression(columns)
+    conditions = [_contains(text_, term) for term in group.fuzzy_terms]
+    if group.strict_terms:
+        if strict == "fts":
+            conditions.append(_strict_fts(columns, group.strict_terms))
+        elif strict == "regexp":
+            conditions.append(_strict_regexp(text_, group.strict_terms))
+        else:
+            raise ValueError(f"Unknown strict mode '{strict}', expected 'regexp' or 'fts'")
+    # 没有任何词的组不会命中
+    return or_(*conditions) if conditions else false()
+
+
+def compile_filter(
+    universal_filter: "UniversalFilter",
+    columns: tuple[str, ...] | list[str] | None = None,
+    strict: str = "regexp",
+) -> ColumnElement:
+    """
+    将UniversalFilter编译为papers表上的SQL条件
+
+    Args:
+        universal_filter: 过滤器
+        columns: 参与匹配的列,拼接后相当于传给UniversalFilter.check的文本,默认为标题和摘要
+        strict: 全词匹配的实现方式
+            regexp: REGEXP '\\bterm\\b',与Python完全一致(SQLite中由SQLAlchemy注册的Python函数实现)
+            fts: 使用papers_fts全文索引,速度最快;词的边界由FTS5分词器决定,与\\b略有差别,
+                 columns必须是全文索引中的列
+
+    Returns:
+        可以直接用于Query.select(filters=[...])或者session.query(Paper).filter(...)的条件
+    """
+    columns = tuple(columns or DEFAULT_COLUMNS)
+    if strict == "fts" and not set(columns) <= set(FTS_COLUMNS):
+        raise ValueError(f"strict='fts' only supports the full-text columns {list(FTS_COLUMNS)}")
+    text_ = _text_expression(columns)
+
+    conditions: list[Any] = [
+        # 与UniversalFilter.check一致,空文本不满足条件
+        or_(*(getattr(Paper, name).isnot(None) & (getattr(Paper, name) != "") for name in columns)),
+    ]
+    conditions.extend(not_(_contains(text_, term)) for term in universal_filter.exclude_terms)
+    conditions.extend(compile_group(group, columns, strict) for group in universal_filter.groups)
+    return and_(*conditions) if conditions else true()
@@ -0,0 +1,191 @@
+"""
+已有数据库的结构升级
+
+Optera.connect_db在连接时调用upgrade_schema,旧版本创建的数据库会自动:
+    1. 添加新增的列(doi_norm、title_hash)
+    2. 分批回填新增的列
+    3. 创建缺少的索引
+    4. 创建全文检索表papers_fts(SQLite FTS5)及同步触发器,并从已有数据建立索引
+所有步骤都可以重复执行。
+"""
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.engine.base import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from .model import Paper
+from ..utils.logging import get_logger
+from ..utils.normalize import normalize_doi, title_hash
+
+logger = get_logger(__name__)
+
+# 旧版本数据库中可能缺少的列
+_NEW_COLUMNS: dict[str, str] = {
+    "doi_norm": "VARCHAR",
+    "title_hash": "VARCHAR",
+}
+
+
+def upgrade_schema(engine: Engine, chunk_size: int = 10000) -> None:
+    """
+    将papers表升级到当前的结构
+
+    Args:
+        engine: 数据库引擎
+        chunk_size: 回填时每批处理的行数
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(Paper.__tablename__):
+        return
+
+    columns = {column["name"] for column in inspector.get_columns(Paper.__tablename__)}
+    added = [name for name in _NEW_COLUMNS if name not in columns]
+    if added:
+        with engine.begin() as conn:
+            for name in added:
+                conn.execute(text(f"ALTER TABLE {Paper.__tablename__} ADD COLUMN {name} {_NEW_COLUMNS[name]}"))
+        logger.info(f"Added columns {added} to {Paper.__tablename__}")
+        backfill_normalized(engine, chunk_size=chunk_size)
+
+    create_indexes(engine)
+    create_fts(engine)
+
+
+def backfill_normalized(engine: Engine, chunk_size: int = 10000) -> int:
+    """
+    按照id分批计算doi_norm和title_hash
+
+    Returns:
+        更新的行数
+    """
+    last_id = 0
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(Paper.id, Paper.doi, Paper.title)
+                .where(Paper.id > last_id)
+                .order_by(Paper.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                update(Paper.__table__).where(Paper.__table__.c.id == bindparam("pid")),
+                [
+                    {"pid": paper_id, "doi_norm": normalize_doi(doi), "title_hash": title_hash(title)}
+                    for paper_id, doi, title in rows
+                ],
+            )
+        last_id = rows[-1].id
+        total += len(rows)
+        logger.info(f"Backfilled normalized columns for {total} papers")
+    return total
+
+
+def create_indexes(engine: Engine) -> None:
+    """
+    创建模型中定义但数据库中缺少的索引
+
+    如果已有数据中存在重复的DOI,唯一索引无法创建,此时退回为普通索引并给出警告,
+    去重之后再次连接数据库会自动升级为唯一索引
+    """
+    existing = {index["name"]: index for index in inspect(engine).get_indexes(Paper.__tablename__)}
+    for index in Paper.__table__.indexes:
+        current = existing.get(index.name)
+        if current is not None and (bool(current["unique"]) == bool(index.unique) or not index.unique):
+            continue
+        try:
+            with engine.begin() as conn:
+                if current is not None:
+                    conn.execute(text(f"DROP INDEX {index.name}"))
+                index.create(conn)
+            logger.info(f"Created index {index.name}")
+        except IntegrityError:
+            if current is not None:
+                # 仍然存在重复,保留原来的普通索引
+                logger.warning(f"Index {index.name} is still not unique because of duplicate values")
+                continue
+            logger.warning(
+                f"Duplicate values prevent the unique index {index.name}, created a non-unique index instead. "
+                "Remove the duplicates and reconnect to make it unique."
+            )
+            columns = ", ".join(column.name for column in index.columns)
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX {index.name} ON {Paper.__tablename__} ({columns})"))
+
+
+def doi_norm_unique(engine: Engine) -> bool:
+    """doi_norm是否有唯一索引;已有数据中存在重复DOI时create_indexes只能创建普通索引,不能使用upsert"""
+    return any(
+        index["unique"] and index["column_names"] == ["doi_norm"]
+        for index in inspect(engine).get_indexes(Paper.__tablename__)
+    )
+
+
+# 全文检索的列,顺序与Query.search中bm25的权重对应
+FTS_COLUMNS: tuple[str, ...] = ("title", "abstract", "keywords")
+
+_FTS_TABLE = f"""
+CREATE VIRTUAL TABLE papers_fts USING fts5(
+    {", ".join(FTS_COLUMNS)},
+    content='papers', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)
+"""
+
+_NEW_VALUES = ", ".join(f"new.{name}" for name in FTS_COLUMNS)
+_OLD_VALUES = ", ".join(f"old.{name}" for name in FTS_COLUMNS)
+_FTS_NAMES = ", ".join(FTS_COLUMNS)
+
+# external content表需要通过触发器与papers表保持同步
+_FTS_TRIGGERS = (
+    f"""
+    CREATE TRIGGER papers_fts_insert AFTER INSERT ON papers BEGIN
+        INSERT INTO papers_fts(rowid, {_FTS_NAMES}) VALUES (new.id, {_NEW_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER papers_fts_delete AFTER DELETE ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, {_FTS_NAMES}) VALUES ('delete', old.id, {_OLD_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER papers_fts_update AFTER UPDATE OF {_FTS_NAMES} ON papers BEGIN
+        INSERT INTO papers_fts(papers_fts, rowid, {_FTS_NAMES}) VALUES ('delete', old.id, {_OLD_VALUES});
+        INSERT INTO papers_fts(rowid, {_FTS_NAMES}) VALUES (new.id, {_NEW_VALUES});
+    END
+    """,
+)
+
+
+def create_fts(engine: Engine) -> bool:
+    """
+    创建全文检索表和同步触发器,新创建时从papers表建立索引
+
+    Returns:
+        全文检索是否可用(SQLite没有编译FTS5时返回False)
+    """
+    if engine.dialect.name != "sqlite":
+        return False
+    inspector = inspect(engine)
+    if inspector.has_table("papers_fts"):
+        return True
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(_FTS_TABLE))
+            for trigger in _FTS_TRIGGERS:
+                conn.execute(text(trigger))
+            conn.execute(text("INSERT INTO papers_fts(papers_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        logger.warning(f"Full-text search is not available: {e}")
+        return False
+    logger.info("Created full-text search index papers_fts")
+    return True
+
+
+def rebuild_fts(engine: Engine, optimize: bool = True) -> None:
+    """从papers表重新建立全文索引,用于绕过触发器直接修改数据之后"""
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO papers_fts(papers_fts) VALUES ('rebuild')"))
+        if optimize:
+            conn.execute(text("INSERT INTO papers_fts(papers_fts) VALUES ('optimize')"))
@@ -1,9 +1,11 @@
 from typing import Any
-from sqlalchemy import  Column, Integer, String ,ForeignKey, Boolean,DateTime, Table
+from sqlalchemy import  Column, Integer, String ,ForeignKey, Boolean,DateTime, Table, Index, UniqueConstraint, event
 from sqlalchemy.orm import backref, mapped_column, Mapped,relationship,DeclarativeBase
 from sqlalchemy.dialects.sqlite import JSON
 import datetime
 
+from ..utils.normalize import normalize_doi, title_hash
+
 class Base(DeclarativeBase):
     pass
 
@@ -27,16 +29,20 @@ paper_citation_association = Table(
 
 class Paper(Base):
     __tablename__:str = 'papers'
+    __table_args__ = (
+        # DownloadManager按照id分页读取pdf_downloaded为False的论文
+        Index('ix_papers_pending', 'pdf_downloaded', 'id'),
+    )
     
     # 主键ID,用于唯一标识每条记录
     id:Mapped[int] = mapped_column(Integer, primary_key=True)
     title:Mapped[str] = mapped_column(String, nullable=True)
     authors:Mapped[list[str]] = mapped_column(JSON, nullable=True)
     abstract:Mapped[str] = mapped_column(String, nullable=True)
-    doi:Mapped[str] = mapped_column(String, nullable=True)
+    doi:Mapped[str] = mapped_column(String, nullable=True, index=True)
     url:Mapped[str] = mapped_column(String, nullable=True)
-    publisher:Mapped[str] = mapped_column(String, nullable=True)
-    pub_year:Mapped[int] = mapped_column(Integer, nullable=True)
+    publisher:Mapped[str] = mapped_column(String, nullable=True, index=True)
+    pub_year:Mapped[int] = mapped_column(Integer, nullable=True, index=True)
     journal:Mapped[str] = mapped_column(String, nullable=True)
     volume:Mapped[str] = mapped_column(String, nullable=True)
     issue:Mapped[str] = mapped_column(String, nullable=True)
@@ -50,7 +56,10 @@ class Paper(Base):
     citations_num:Mapped[int] = mapped_column(Integer, nullable=True)
     notes:Mapped[str] = mapped_column(String, nullable=True)
     type:Mapped[str] = mapped_column(String, nullable=True) # article or book
-    source:Mapped[str] = mapped_column(String, nullable=True) # GS or Crossref or other
+    source:Mapped[str] = mapped_column(String, nullable=True, index=True) # GS or Crossref or other
+    # 以下两列由doi和title自动生成,见utils.normalize
+    doi_norm:Mapped[str] = mapped_column(String, nullable=True, unique=True, index=True)
+    title_hash:Mapped[str] = mapped_column(String, nullable=True, index=True)
     cited_papers = relationship(
         'Paper',  # 关联到自身
         secondary=paper_citation_association,
@@ -92,6 +101,43 @@ class Paper(Base):
             "notes": self.notes
         }
         
+@event.listens_for(Paper, "before_insert")
+@event.listens_for(Paper, "before_update")
+def _fill_normalized(mapper, connection, target: Paper) -> None:
+    """通过ORM写入时自动填充doi_norm和title_hash"""
+    target.doi_norm = normalize_doi(target.doi)
+    target.title_hash = title_hash(target.title)
+
+
+class Job(Base):
+    """
+    任务队列表
+
+    每条记录表示对一篇论文执行一种任务(kind,例如download、llm),
+    worker通过JobQueue领取任务并获得一段时间的租约,租约过期的任务可以被其他worker重新领取
+    state: pending(等待领取) running(已被领取) done(完成) failed(超过最大尝试次数或不可重试)
+    """
+    __tablename__:str = 'jobs'
+    __table_args__ = (
+        UniqueConstraint('paper_id', 'kind', name='uq_jobs_paper_kind'),
+        Index('ix_jobs_claim', 'kind', 'state', 'lease_expires_at'),
+    )
+
+    id:Mapped[int] = mapped_column(Integer, primary_key=True)
+    paper_id:Mapped[int] = mapped_column(Integer, ForeignKey('papers.id', ondelete='CASCADE'), nullable=False)
+    kind:Mapped[str] = mapped_column(String, nullable=False)
+    state:Mapped[str] = mapped_column(String, default='pending', nullable=False)
+    attempts:Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    lease_owner:Mapped[str] = mapped_column(String, nullable=True)
+    lease_expires_at:Mapped[datetime.datetime] = mapped_column(DateTime, nullable=True) # UTC
+    last_error:Mapped[str] = mapped_column(String, nullable=True)
+    payload:Mapped[dict[str,Any]] = mapped_column(JSON, nullable=True)
+    created_at:Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, nullable=False)
+    updated_at:Mapped[datetime.datetime] = mapped_column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, nullable=False)
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, paper_id={self.paper_id}, kind='{self.kind}', state='{self.state}')>"
+
 # class Author(Base):
 #     __tablename__:str = 'Author_table'
 
@@ -1,15 +1,123 @@
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy.exc import NoResultFound, OperationalError
+import datetime
 import os
+import re
+import socket
 from sqlalchemy.engine.base import Engine
-from sqlalchemy.orm import joinedload, sessionmaker,Session
-from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import joinedload, make_transient_to_detached, sessionmaker,Session
+from sqlalchemy import String, case, create_engine, event, func, insert, inspect, column, literal, literal_column, or_, select, table, true, type_coerce, update
+from sqlalchemy.types import JSON
 from abc import ABC
 from pathlib import Path
 from contextlib import contextmanager
-from collections.abc import Generator
-from typing import Any
+from collections import deque
+from collections.abc import Generator, Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+from .model import Job, Paper,Base, paper_citation_association
+from .filter_compiler import compile_filter, register_sqlite_functions
+from .migrate import FTS_COLUMNS, doi_norm_unique, rebuild_fts, upgrade_schema
+from ..utils.config import get_config
+from ..utils.exceptions import DatabaseError
+from ..utils.logging import get_logger
+from ..utils.normalize import normalize_doi, title_hash
+
+if TYPE_CHECKING:
+    from ..searcher.filter import UniversalFilter
+    from ..model.paper import PaperMetadata
+
+logger = get_logger(__name__)
+
+# JSON列中视为空值的内容
+_JSON_EMPTY = (literal_column("'null'"), literal_column("'[]'"), literal_column("'{}'"))
+# upsert写入的列,id由数据库生成,doi_norm和title_hash由upsert计算
+_UPSERT_COLUMNS: tuple[str, ...] = tuple(
+    column.name for column in Paper.__table__.columns if column.name not in ("id", "doi_norm", "title_hash")
+)
+# SQLite连接配置,每个新连接都会执行对应的PRAGMA
+#   safe: 默认的回滚日志模式,每次提交都完整同步到磁盘,适合放在网络文件系统上被多台机器共享的数据库
+#   concurrent: WAL模式,读写互不阻塞,适合下载循环和入库任务同时使用同一个数据库
+#   bulk-load: WAL模式并关闭同步,适合一次性的大批量导入,断电时可能丢失最近的提交
+SQLITE_PROFILES: dict[str, dict[str, Any]] = {
+    "safe": {
+        "synchronous": "FULL",
+        "busy_timeout": 30000,
+    },
+    "concurrent": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 60000,
+        "cache_size": -64000,  # 约64MB
+        "mmap_size": 268435456,  # 256MB
+        "temp_store": "MEMORY",
+    },
+    "bulk-load": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "busy_timeout": 60000,
+        "cache_size": -256000,  # 约256MB
+        "mmap_size": 1073741824,  # 1GB
+        "temp_store": "MEMORY",
+    },
+}
+
+
+def apply_sqlite_profile(
+    engine:Engine,
+    profile:str|None = None,
+    pragmas:dict[str,Any]|None = None,
+    ) -> dict[str,Any]:
+    """
+    在engine的connect事件中为每个新连接执行profile对应的PRAGMA
+
+    Returns:
+        实际使用的PRAGMA
+    """
+    profile = profile or get_config().get("database.profile", "safe")
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Unknown SQLite profile '{profile}', expected one of {list(SQLITE_PROFILES)}")
+    settings = {**SQLITE_PROFILES[profile], **(pragmas or {})}
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in settings.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return settings
+
+_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _fts_match(
+    query:str,
+    phrase:bool = False,
+    prefix:bool = False,
+    raw:bool = False,
+    fields:list[str]|None = None,
+    ) -> str:
+    """将检索词转换为FTS5的MATCH表达式,非raw模式下每个词都加上引号,避免标点被解析为语法"""
+    if raw:
+        expr = query
+    else:
+        tokens = _FTS_TOKEN.findall(query)
+        if not tokens:
+            raise ValueError(f"Search query {query!r} has no searchable words")
+        if phrase:
+            expr = '"' + " ".join(tokens) + '"' + ("*" if prefix else "")
+        else:
+            expr = " ".join(f'"{token}"' + ("*" if prefix else "") for token in tokens)
+    if fields:
+        unknown = set(fields) - set(FTS_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown search fields {sorted(unknown)}, expected {list(FTS_COLUMNS)}")
+        expr = "{" + " ".join(fields) + "} : (" + expr + ")"
+    return expr
 
-from .model import Paper,Base
 '''
 对于每一个数据库都有一个操作单元,使用操作单元可以进行增删改查
 '''
@@ -18,26 +126,48 @@ class Optera(ABC):
                  DB_engine:Engine,
 
     ) -> None:
+        self.engine:Engine = DB_engine
         self.sessionfactory:sessionmaker[Session] = sessionmaker(bind=DB_engine)
 
 
 
     @classmethod
-    def connect_db(cls,db_dir:str,create_db:bool = True):
-        
+    def connect_db(
+        cls,
+        db_dir:str,
+        create_db:bool = True,
+        profile:str|None = None,
+        pragmas:dict[str,Any]|None = None,
+        **kwargs,
+        ):
+        """
+        连接SQLite数据库
+
+        Args:
+            db_dir: 数据库文件路径
+            create_db: 是否创建不存在的表
+            profile: 连接配置,见SQLITE_PROFILES,None时使用配置database.profile(默认safe)
+            pragmas: 额外的PRAGMA,覆盖profile中的同名设置
+            **kwargs: 传递给子类构造函数的参数,例如JobQueue的owner
+        """
         if isinstance(db_dir,Path):
             db_dir = str(db_dir)
         
         engine = create_engine(f'sqlite:///{db_dir}')
+        apply_sqlite_profile(engine, profile, pragmas)
+        register_sqlite_functions(engine)
         
         if create_db:
             Base.metadata.create_all(engine)
+        # 旧版本创建的数据库需要添加新的列和索引
+        upgrade_schema(engine)
             
         if not os.path.exists(db_dir):
             raise FileNotFoundError("Database directory not found: {db_dir}")
                 
         return cls(
             DB_engine=engine,
+            **kwargs,
         )
         
     @contextmanager
@@ -52,6 +182,25 @@ class Optera(ABC):
         finally:
             session.close()
 
+# upsert时已有记录与新记录的合并规则:
+#   fill: 保留已有的值,只填充为空的字段
+#   replace: 新的值不为空时覆盖已有的值
+#   max: 取两者中较大的值
+#   keep: 始终保留已有的值
+DEFAULT_MERGE_RULES: dict[str, str] = {
+    "citations_num": "max",
+    "pdf_downloaded": "max",
+    "created_at": "keep",
+}
+
+@dataclass
+class UpsertResult:
+    """upsert的统计结果"""
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+
 class Insert(Optera):
     def __init__(
             self,
@@ -66,24 +215,26 @@ class Insert(Optera):
         '''
         The General paradigm of inserting data
 
+        DOI(doi_norm)已经存在时按DEFAULT_MERGE_RULES合并到已有记录,不会因为唯一索引抛出IntegrityError;
+        写入之后paper.id为数据库中对应记录的id,cited_papers中的论文同样写入并建立引用关系
+
         Parameters:
         -----------
         all_data: dict
         '''
-
-        with self.transaction() as session:
-            session.add(paper)
-            print(f"Successfully insert paper: {paper.title}")
+        self._write_papers([paper])
+        logger.info(f"Successfully insert paper: {paper.title}")
     def _Insert_bulk(
         self,
         paper_list:list[Paper]
     ):
         '''
         批量插入数据
+
+        DOI重复的论文合并到已有记录,不会让整批回滚,其余行为与_Insert相同
         '''
-        with self.transaction() as session:
-            session.add_all(paper_list)
-            print(f"Successfully insert {len(paper_list)} papers")
+        self._write_papers(paper_list)
+        logger.info(f"Successfully insert {len(paper_list)} papers")
     def from_paper(self,paper:Paper):
         '''
         从paper中插入数据
@@ -103,6 +254,225 @@ class Insert(Optera):
         
         self._Insert(new_paper)
         
+    @staticmethod
+    def _paper_row(paper:Paper|dict[str,Any]) -> dict[str,Any]:
+        """将Paper、PaperMetadata或字典转换为papers表的一行,并计算doi_norm和title_hash"""
+        if hasattr(paper, "to_row"):
+            # PaperMetadata.to_row已经是完整的一行
+            return paper.to_row()
+        if isinstance(paper, Paper):
+            row = {name: getattr(paper, name) for name in _UPSERT_COLUMNS}
+        else:
+            row = {name: paper.get(name) for name in _UPSERT_COLUMNS}
+        if isinstance(row["pdf_path"], Path):
+            row["pdf_path"] = str(row["pdf_path"])
+        if row["pdf_downloaded"] is None:
+            row["pdf_downloaded"] = False
+        if row["created_at"] is None:
+            row["created_at"] = datetime.datetime.now()
+        row["doi_norm"] = normalize_doi(row["doi"])
+        row["title_hash"] = title_hash(row["title"])
+        return row
+
+    @staticmethod
+    def _merge_rows(old:dict[str,Any], new:dict[str,Any], rules:dict[str,str]) -> dict[str,Any]:
+        """在Python中按照合并规则合并同一批数据中DOI相同的两行"""
+        merged = dict(old)
+        for name in _UPSERT_COLUMNS:
+            rule = rules.get(name, "fill")
+            if rule == "keep" or new[name] is None:
+                continue
+            if old[name] is None or old[name] in ([], {}):
+                merged[name] = new[name]
+            elif rule == "replace":
+                merged[name] = new[name]
+            elif rule == "max":
+                merged[name] = max(old[name], new[name])
+        return merged
+
+    @staticmethod
+    def _citation_graph(paper_list:list[Paper]) -> list[Paper]:
+        """收集paper_list以及通过cited_papers/cited_by新添加的所有论文,每个对象只出现一次"""
+        papers:dict[int,Paper] = {}
+        queue = deque(paper_list)
+        while queue:
+            paper = queue.popleft()
+            if id(paper) in papers:
+                continue
+            papers[id(paper)] = paper
+            state = inspect(paper)
+            queue.extend(state.attrs.cited_papers.history.added)
+            queue.extend(state.attrs.cited_by.history.added)
+        return list(papers.values())
+
+    def _write_papers(self, paper_list:list[Paper]) -> None:
+        """
+        在一个事务中逐篇写入Paper对象,把数据库中的id写回对象,并建立cited_papers中的引用关系
+
+        doi_norm有唯一索引时使用upsert语句,DOI已经存在的论文合并到已有记录并取已有记录的id;
+        已有数据中存在重复DOI时(唯一索引退回为普通索引,见migrate.create_indexes)退回为普通插入。
+        已经在数据库中的对象(persistent/detached)不会重新写入,只用于建立引用关系。
+        """
+        papers = self._citation_graph(paper_list)
+        table = Paper.__table__
+        if doi_norm_unique(self.engine):
+            upsert = self._upsert_statement(DEFAULT_MERGE_RULES)
+        else:
+            upsert = None
+            logger.warning("papers.doi_norm has no unique index, duplicate DOIs are inserted without merging (run Dedup)")
+        plain = insert(table).returning(table.c.id)
+
+        ids:dict[int,int] = {}
+        with self.engine.begin() as conn:
+            for paper in papers:
+                if inspect(paper).key is not None:
+                    ids[id(paper)] = paper.id
+                    continue
+                row = self._paper_row(paper)
+                if upsert is not None and row["doi_norm"] is not None:
+                    paper_id = conn.execute(upsert, row).scalar()
+                    if paper_id is None:
+                        # 与已有记录相同,没有更新,RETURNING不返回
+                        paper_id = conn.execute(
+                            select(table.c.id).where(table.c.doi_norm == row["doi_norm"])
+                        ).scalar_one()
+                else:
+                    paper_id = conn.execute(plain, row).scalar_one()
+                ids[id(paper)] = paper_id
+
+            links = [
+                {"citing_paper_id": ids[id(paper)], "cited_paper_id": ids[id(cited)]}
+                for paper in papers
+                for cited in inspect(paper).attrs.cited_papers.history.added
+            ]
+            if links:
+                conn.execute(self._dialect_insert(paper_citation_association).on_conflict_do_nothing(), links)
+
+        for paper in papers:
+            if inspect(paper).transient:
+                # 与ORM提交之后一样,对象变为detached,之后可以通过session.add/merge继续使用
+                paper.id = ids[id(paper)]
+                make_transient_to_detached(paper)
+
+    def _dialect_insert(self, target):
+        """根据数据库类型选择支持ON CONFLICT的insert"""
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(target)
+
+    def _upsert_statement(self, rules:dict[str,str]):
+        """构建INSERT ... ON CONFLICT(doi_norm) DO UPDATE语句,没有任何变化的行不会被更新"""
+        greatest = func.greatest if self.engine.dialect.name == "postgresql" else func.max
+        table = Paper.__table__
+        stmt = self._dialect_insert(table)
+        excluded = stmt.excluded
+
+        values = {}
+        for name in _UPSERT_COLUMNS:
+            rule = rules.get(name, "fill")
+            if rule == "keep":
+                continue
+            old, new = table.c[name], excluded[name]
+            if isinstance(table.c[name].type, JSON):
+                # JSON列中的null、空列表和空字典也视为空值
+                old, new = type_coerce(old, String), type_coerce(new, String)
+                old_empty = or_(old.is_(None), old.in_(_JSON_EMPTY))
+                new_empty = or_(new.is_(None), new.in_(_JSON_EMPTY))
+            else:
+                old_empty, new_empty = old.is_(None), new.is_(None)
+            if rule == "fill":
+                value = case((old_empty, new), else_=old)
+            elif rule == "replace":
+                value = case((new_empty, old), else_=new)
+            elif rule == "max":
+                value = greatest(func.coalesce(old, new), func.coalesce(new, old))
+            else:
+                raise ValueError(f"Unknown merge rule '{rule}' for column '{name}'")
+            values[name] = (value, old)
+
+        if "title" in values:
+            # 标题取了新的值时,title_hash也使用新的值
+            title = values["title"][0]
+            values["title_hash"] = (
+                case((title.is_not_distinct_from(excluded.title), excluded.title_hash), else_=table.c.title_hash),
+                table.c.title_hash,
+            )
+
+        return (
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.doi_norm],
+                set_={name: value for name, (value, _) in values.items()},
+                where=or_(*(value.is_distinct_from(old) for value, old in values.values())),
+            )
+            .returning(table.c.id, table.c.doi_norm)
+        )
+
+    def upsert(
+        self,
+        papers:Iterable["Paper|PaperMetadata|dict[str,Any]"],
+        merge_rules:dict[str,str]|None = None,
+        chunk_size:int = 1000,
+        ) -> UpsertResult:
+        """
+        批量插入或更新论文,以规范化之后的DOI(doi_norm)为唯一键
+
+        每chunk_size条数据使用一条INSERT ... ON CONFLICT DO UPDATE批量执行并单独提交;
+        同一批中DOI相同的数据先在Python中合并,没有DOI的论文总是插入。
+
+        Args:
+            papers: Paper对象、PaperMetadata或者字段字典
+            merge_rules: 每个字段的合并规则(fill/replace/max/keep),没有指定的字段使用fill,
+                默认规则见DEFAULT_MERGE_RULES
+            chunk_size: 每批的数据量
+
+        Returns:
+            UpsertResult,同一批中重复的数据计为skipped
+        """
+        rules = {**DEFAULT_MERGE_RULES, **(merge_rules or {})}
+        stmt = self._upsert_statement(rules)
+        result = UpsertResult()
+
+        chunk:dict[Any,dict[str,Any]] = {}
+        for paper in papers:
+            row = self._paper_row(paper)
+            key = row["doi_norm"] if row["doi_norm"] is not None else object()
+            if key in chunk:
+                chunk[key] = self._merge_rows(chunk[key], row, rules)
+                result.skipped += 1
+                continue
+            chunk[key] = row
+            if len(chunk) >= chunk_size:
+                self._upsert_chunk(stmt, list(chunk.values()), result)
+                chunk.clear()
+        if chunk:
+            self._upsert_chunk(stmt, list(chunk.values()), result)
+
+        logger.info(f"Upsert done: {result.inserted} inserted, {result.updated} updated, {result.skipped} skipped")
+        return result
+
+    def _upsert_chunk(self, stmt, rows:list[dict[str,Any]], result:UpsertResult) -> None:
+        table = Paper.__table__
+        dois = [row["doi_norm"] for row in rows if row["doi_norm"] is not None]
+        try:
+            with self.engine.begin() as conn:
+                existing = set(
+                    conn.execute(select(table.c.doi_norm).where(table.c.doi_norm.in_(dois))).scalars()
+                ) if dois else set()
+                written = [row.doi_norm for row in conn.execute(stmt, rows)]
+        except OperationalError as e:
+            if "ON CONFLICT" in str(e):
+                raise DatabaseError(
+                    "papers.doi_norm has no unique index, remove duplicate DOIs (Dedup) and reconnect before upserting"
+                ) from e
+            raise
+        updated = sum(1 for doi in written if doi in existing)
+        result.updated += updated
+        result.inserted += len(written) - updated
+        result.skipped += len(rows) - len(written)
+
+
 class Update(Optera):
     def __init__(
             self,
@@ -143,24 +513,169 @@ class Query(Optera):
     def __init__(
         self,
         DB_engine:Engine,
+        keep_sessions:bool = False,
         ) -> None:
+        """
+        Args:
+            keep_sessions: 为True时查询使用的会话在查询结束后不关闭,返回的Paper对象可以继续延迟加载
+                关联关系(例如cited_papers),需要调用close()或者使用with语句释放;
+                默认每次查询结束后关闭会话,返回detached的Paper对象,已经读取的列可以正常访问
+        """
         super().__init__(DB_engine)
+        self.keep_sessions:bool = keep_sessions
         self._active_sessions = []
+
+    def __enter__(self) -> "Query":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
     @contextmanager
     def transaction(self) -> Generator[Session, None, None]:
+        """
+        查询使用的会话
+
+        默认在查询结束后关闭,返回的对象变为detached;keep_sessions为True时会话保持打开,
+        直到close()(或者with Query.connect_db(..., keep_sessions=True) as query结束)
+        """
         session = self.sessionfactory()
-        self._active_sessions.append(session)
+        if self.keep_sessions:
+            self._active_sessions.append(session)
         try:
             yield session
         except Exception as e:
             session.rollback()
-            self._active_sessions.remove(session)  # 发生异常时移除
+            if self.keep_sessions:
+                self._active_sessions.remove(session)  # 发生异常时移除
             session.close()
             raise e
-        # finally:
-        #     self._active_sessions.remove(session)
-        #     session.close() 
+        if not self.keep_sessions:
+            session.close()
+
+    def close(self) -> None:
+        """关闭keep_sessions模式下查询打开的会话,之前返回的Paper对象将无法再延迟加载"""
+        for session in self._active_sessions:
+            session.close()
+        self._active_sessions.clear()
+
+    def stream(
+        self,
+        filters: list[Any]|None = None,
+        order_by: list[Any]|None = None,
+        limit: int|None = None,
+        columns: list[Any]|None = None,
+        as_dict: bool = False,
+        batch_size: int = 1000,
+        filter: "UniversalFilter|None" = None,
+    ) -> Generator[Any, None, None]:
+        """
+        逐条返回查询结果,内存占用与数据库大小无关
+
+        使用独立的会话和yield_per/stream_results分批读取,生成器结束(或被关闭)时会话随之关闭。
+
+        参数：
+            filters: 过滤条件列表。
+            order_by: 排序条件列表。
+            limit: 限制返回的记录数。
+            columns: 只读取这些列(Paper的属性或列名),返回Row元组,不创建ORM对象。
+            as_dict: 返回字典;没有指定columns时返回papers表的全部列。
+            batch_size: 每批从数据库读取的记录数。
+            filter: UniversalFilter,编译为SQL条件在数据库中过滤标题和摘要。
+        返回：
+            Paper对象、Row元组或字典的生成器。
+
+        示例：
+            with Query.connect_db("all.db") as query:
+                for paper_id, doi in query.stream(columns=[Paper.id, Paper.doi], filters=[Paper.doi.isnot(None)]):
+                    ...
+        """
+        if columns is not None:
+            columns = [getattr(Paper, column) if isinstance(column, str) else column for column in columns]
+            stmt = select(*columns)
+        elif as_dict:
+            stmt = select(*Paper.__table__.columns)
+        else:
+            stmt = select(Paper)
+        if filters:
+            stmt = stmt.where(*filters)
+        if filter is not None:
+            stmt = stmt.where(compile_filter(filter))
+        if order_by:
+            stmt = stmt.order_by(*order_by)
+        if limit:
+            stmt = stmt.limit(limit)
+
+        session = self.sessionfactory()
+        try:
+            result = session.execute(stmt.execution_options(yield_per=batch_size, stream_results=True))
+            if columns is None and not as_dict:
+                yield from result.scalars()
+            elif as_dict:
+                for row in result:
+                    yield row._asdict()
+            else:
+                yield from result
+        finally:
+            session.close()
         
+    def search(
+        self,
+        query: str,
+        limit: int|None = 20,
+        offset: int|None = None,
+        phrase: bool = False,
+        prefix: bool = False,
+        raw: bool = False,
+        fields: list[str]|None = None,
+        filters: list[Any]|None = None,
+        snippet_tokens: int = 16,
+    ) -> list[dict[str,Any]]:
+        """
+        使用全文索引(papers_fts)检索论文,按照BM25相关性排序
+
+        参数：
+            query: 检索词。默认拆分为词,所有词都需要出现(AND)。
+            limit: 限制返回的记录数。
+            offset: 设置跳过多少前面的数据,与limit连用。
+            phrase: 整个检索词作为短语匹配。
+            prefix: 每个词作为前缀匹配,例如"perovsk"可以匹配perovskite。
+            raw: query直接使用FTS5查询语法,例如'"solar cell" AND (perovskite OR silicon) NOT review'。
+            fields: 只在这些列中检索,可选title、abstract、keywords,默认全部。
+            filters: papers表的过滤条件列表,例如[Paper.pub_year >= 2020]。
+            snippet_tokens: 摘要片段的最大词数。
+        返回：
+            字典列表,包含id、title、doi、pub_year、journal、score(越小越相关)和snippet(匹配词用[]标出)。
+        """
+        match = _fts_match(query, phrase=phrase, prefix=prefix, raw=raw, fields=fields)
+        fts_table = table("papers_fts", column("rowid"))
+        fts = literal_column("papers_fts")
+        # 标题权重最高,其次是关键词,再次是摘要
+        score = func.bm25(fts, 10.0, 1.0, 5.0).label("score")
+        snippet = func.snippet(fts, -1, "[", "]", "...", snippet_tokens).label("snippet")
+        stmt = (
+            select(Paper.id, Paper.title, Paper.doi, Paper.pub_year, Paper.journal, score, snippet)
+            .select_from(fts_table)
+            .join(Paper, Paper.id == fts_table.c.rowid)
+            .where(fts.op("MATCH")(match))
+            .order_by(score)
+        )
+        if filters:
+            stmt = stmt.where(*filters)
+        if limit:
+            stmt = stmt.limit(limit)
+        if offset:
+            stmt = stmt.offset(offset)
+        try:
+            with self.engine.connect() as conn:
+                return [row._asdict() for row in conn.execute(stmt)]
+        except OperationalError as e:
+            raise DatabaseError(f"Full-text search failed for {match!r}: {e}") from e
+
+    def rebuild_fts(self, optimize: bool = True) -> None:
+        """重新建立全文索引"""
+        rebuild_fts(self.engine, optimize=optimize)
+
     def query_paper_id(self, id:list[int]|int, eager_load: bool = True):
         if not isinstance(id, list):
             id = [id]
@@ -193,6 +708,7 @@ class Query(Optera):
         limit: int|None = 1000,
         offset: int|None = None,
         eager_load: bool = False,
+        filter: "UniversalFilter|None" = None,
     ) -> list[Paper]:
         """
         执行一个 SELECT 查询。
@@ -207,11 +723,14 @@ class Query(Optera):
             limit: 限制返回的记录数。
             offset: 设置跳过多少前面的数据,与limit连用。
             eager_load_all: 是否使用 eager loading 加载所有相关数据。
+            filter: UniversalFilter,编译为SQL条件在数据库中过滤标题和摘要,见filter_compiler。
             
             offset+limit可以实现分页查询
         返回：
             查询结果列表。
         """
+        if filter is not None:
+            filters = [*(filters or []), compile_filter(filter)]
         with self.transaction() as session:
             query = self.build_query(
                     session,
@@ -307,4 +826,228 @@ class Delete(Optera):
             raise ValueError("ID must be an integer or a list of integers.")
         with self.transaction() as session:
             session.query(Paper).filter(Paper.id.in_(id)).delete()
-            session.commit()
\ No newline at end of file
+            session.commit()
+
+def _utcnow() -> datetime.datetime:
+    """租约时间统一使用UTC,多台机器共享数据库时不受时区影响"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class JobQueue(Optera):
+    """
+    基于jobs表的持久化任务队列
+
+    多个进程(可以在不同机器上,共享同一个数据库)通过claim领取任务,
+    领取是一条UPDATE ... RETURNING语句,同一个任务不会被两个worker同时领取。
+    领取的任务带有租约,worker需要在租约过期前ack/fail,长任务可以renew续租;
+    worker崩溃后租约过期,任务会被其他worker重新领取。
+
+    示例：
+        queue = JobQueue.connect_db("all.db")
+        queue.enqueue_pending("download")
+        while jobs := queue.claim("download", limit=10):
+            for job in jobs:
+                try:
+                    ...
+                    queue.ack(job["id"])
+                except Exception as e:
+                    queue.fail(job["id"], str(e))
+    """
+    def __init__(
+        self,
+        DB_engine:Engine,
+        owner:str|None = None,
+        lease:float = 600,
+        max_attempts:int = 5,
+        ) -> None:
+        """
+        Args:
+            owner: 租约持有者的名称,默认为"主机名:进程号"
+            lease: 租约时长(秒)
+            max_attempts: 每个任务的最大尝试次数
+        """
+        super().__init__(DB_engine)
+        self.owner:str = owner or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease:float = lease
+        self.max_attempts:int = max_attempts
+
+    def _insert(self):
+        """根据数据库类型选择支持ON CONFLICT的insert"""
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(Job)
+
+    def enqueue(
+        self,
+        paper_ids:list[int]|int,
+        kind:str,
+        payload:dict[str,Any]|None = None,
+        ) -> int:
+        """
+        添加任务,已经存在的(paper_id, kind)会被忽略
+
+        Returns:
+            新添加的任务数
+        """
+        if not isinstance(paper_ids, list):
+            paper_ids = [paper_ids]
+        if not paper_ids:
+            return 0
+        now = datetime.datetime.now()
+        rows = [
+            {"paper_id": paper_id, "kind": kind, "state": "pending", "attempts": 0,
+             "payload": payload, "created_at": now, "updated_at": now}
+            for paper_id in paper_ids
+        ]
+        with self.transaction() as session:
+            # 使用Core执行executemany才能得到插入的行数
+            result = session.connection().execute(self._insert().on_conflict_do_nothing(), rows)
+            return result.rowcount
+
+    def enqueue_pending(
+        self,
+        kind:str = "download",
+        filters:list[Any]|None = None,
+        ) -> int:
+        """
+        将papers表中满足条件的论文全部加入队列,在数据库内完成,不需要读取论文
+
+        Args:
+            kind: 任务类型
+            filters: papers表的过滤条件,默认为有DOI且没有下载PDF的论文
+
+        Returns:
+            新添加的任务数
+        """
+        if filters is None:
+            filters = [Paper.pdf_downloaded == False, Paper.doi.isnot(None)]
+        now = datetime.datetime.now()
+        # 没有过滤条件时也需要WHERE,否则SQLite无法区分ON CONFLICT与SELECT的JOIN约束
+        source = select(
+            Paper.id, literal(kind), literal("pending"), literal(0), literal(now), literal(now)
+        ).where(true(), *filters)
+        stmt = self._insert().from_select(
+            ["paper_id", "kind", "state", "attempts", "created_at", "updated_at"], source
+        ).on_conflict_do_nothing()
+        with self.transaction() as session:
+            result = session.execute(stmt)
+            return result.rowcount
+
+    def claim(
+        self,
+        kind:str,
+        limit:int = 1,
+        filters:list[Any]|None = None,
+        ) -> list[dict[str,Any]]:
+        """
+        原子地领取最多limit个任务
+
+        可以领取的任务:state为pending,或者state为running但租约已经过期(原持有者可能已经崩溃)。
+        在PostgreSQL上子查询使用FOR UPDATE SKIP LOCKED,并发的worker不会互相等待;
+        在SQLite上整个UPDATE在一个写事务中执行。
+
+        Args:
+            kind: 任务类型
+            limit: 最多领取的任务数
+            filters: 额外的过滤条件,可以引用Paper的列,例如[Paper.publisher == "Elsevier"]
+
+        Returns:
+            领取到的任务,每个任务为{"id", "paper_id", "attempts", "payload"}
+        """
+        now = _utcnow()
+        candidates = (
+            select(Job.id)
+            .where(
+                Job.kind == kind,
+                Job.attempts < self.max_attempts,
+                or_(
+                    Job.state == "pending",
+                    (Job.state == "running") & (Job.lease_expires_at < now),
+                ),
+            )
+            .order_by(Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if filters:
+            candidates = candidates.join(Paper, Paper.id == Job.paper_id).where(*filters)
+        stmt = (
+            update(Job)
+            .where(Job.id.in_(candidates.scalar_subquery()))
+            .values(
+                state="running",
+                lease_owner=self.owner,
+                lease_expires_at=now + datetime.timedelta(seconds=self.lease),
+                attempts=Job.attempts + 1,
+                updated_at=datetime.datetime.now(),
+            )
+            .returning(Job.id, Job.paper_id, Job.attempts, Job.payload)
+            .execution_options(synchronize_session=False)
+        )
+        with self.transaction() as session:
+            rows = session.execute(stmt).all()
+        return sorted((row._asdict() for row in rows), key=lambda job: job["id"])
+
+    def _finish(self, job_ids:list[int]|int, **values) -> int:
+        """只更新仍由自己持有租约的任务,返回更新的任务数"""
+        if not isinstance(job_ids, list):
+            job_ids = [job_ids]
+        if not job_ids:
+            return 0
+        stmt = (
+            update(Job)
+            .where(Job.id.in_(job_ids), Job.state == "running", Job.lease_owner == self.owner)
+            .values(updated_at=datetime.datetime.now(), **values)
+            .execution_options(synchronize_session=False)
+        )
+        with self.transaction() as session:
+            return session.execute(stmt).rowcount
+
+    def renew(self, job_ids:list[int]|int) -> int:
+        """
+        延长租约
+
+        Returns:
+            续租成功的任务数,租约已经被其他worker接管的任务不会续租
+        """
+        return self._finish(job_ids, lease_expires_at=_utcnow() + datetime.timedelta(seconds=self.lease))
+
+    def ack(self, job_ids:list[int]|int) -> int:
+        """
+        标记任务完成
+
+        Returns:
+            成功标记的任务数,租约已经丢失的任务返回0
+        """
+        return self._finish(job_ids, state="done", lease_owner=None, lease_expires_at=None, last_error=None)
+
+    def fail(self, job_ids:list[int]|int, error:str, retry:bool = True) -> int:
+        """
+        标记任务失败
+
+        retry为True且尝试次数没有超过max_attempts时任务回到pending,否则变为failed
+        """
+        state = case((Job.attempts < self.max_attempts, "pending"), else_="failed") if retry else "failed"
+        return self._finish(job_ids, state=state, lease_owner=None, lease_expires_at=None, last_error=error)
+
+    def release(self) -> int:
+        """归还自己持有的所有任务(不增加失败记录),用于worker正常退出"""
+        stmt = (
+            update(Job)
+            .where(Job.state == "running", Job.lease_owner == self.owner)
+            .values(state="pending", lease_owner=None, lease_expires_at=None,
+                    attempts=Job.attempts - 1, updated_at=datetime.datetime.now())
+            .execution_options(synchronize_session=False)
+        )
+        with self.transaction() as session:
+            return session.execute(stmt).rowcount
+
+    def stats(self, kind:str|None = None) -> dict[str,int]:
+        """统计各个状态的任务数"""
+        stmt = select(Job.state, func.count(Job.id)).group_by(Job.state)
+        if kind is not None:
+            stmt = stmt.where(Job.kind == kind)
+        with self.transaction() as session:
+            return {state: count for state, count in session.execute(stmt).all()}
@@ -0,0 +1,345 @@
+"""
+papers表和引用关系表与Parquet文件之间的导出导入
+
+导出目录的结构(hive分区,可以直接被pyarrow、pandas、polars、DuckDB、Spark读取):
+    out_dir/papers/pub_year=2020/source=Crossref/part-0-0.parquet
+    out_dir/paper_citation_association/part-0.parquet
+
+导出和导入都按chunk_size分批进行,内存占用与数据库大小无关。
+
+示例：
+    query = Query.connect_db("all.db")
+    export_parquet(query.engine, "corpus")
+
+    insert = Insert.connect_db("new.db", create_db=True, profile="bulk-load")
+    import_parquet(insert.engine, "corpus")
+"""
+import json
+import shutil
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+from sqlalchemy import Boolean, Column, DateTime, Integer, JSON, MetaData, String, Table, func, insert, select
+from sqlalchemy.engine.base import Connection, Engine
+
+from .model import Paper, paper_citation_association
+from .optera import Insert
+from ..utils.exceptions import DatabaseError
+from ..utils.logging import get_logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PYARROW = True
+except ImportError:
+    PYARROW = False
+
+logger = get_logger(__name__)
+
+PAPERS_DIR = "papers"
+ASSOCIATION_DIR = "paper_citation_association"
+DEFAULT_PARTITION: tuple[str, ...] = ("pub_year", "source")
+
+# 字符串列表的JSON列保存为list<string>,其他JSON列保存为JSON字符串
+_LIST_COLUMNS: tuple[str, ...] = ("authors", "keywords")
+
+# upsert导入时保存 导出文件中的id -> doi_norm 的临时表,引用关系按批在数据库中转换为新的id
+_id_map = Table(
+    "_parquet_id_map",
+    MetaData(),
+    Column("old_id", Integer, primary_key=True),
+    Column("doi_norm", String, nullable=False),
+    prefixes=["TEMPORARY"],
+)
+
+
+@dataclass
+class ParquetReport:
+    """导出或导入的行数"""
+    papers: int = 0
+    associations: int = 0
+    skipped_associations: int = 0
+
+
+def _require_pyarrow() -> None:
+    if not PYARROW:
+        raise ImportError("pyarrow is required for Parquet export/import, install it with 'pip install pyarrow'")
+
+
+def _arrow_type(column) -> "pa.DataType":
+    if column.name in _LIST_COLUMNS:
+        return pa.list_(pa.string())
+    if isinstance(column.type, JSON):
+        return pa.string()
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def papers_schema() -> "pa.Schema":
+    """papers表对应的Arrow结构"""
+    _require_pyarrow()
+    return pa.schema([pa.field(column.name, _arrow_type(column)) for column in Paper.__table__.columns])
+
+
+def _to_arrow_value(name: str, value: Any, json_columns: set[str]) -> Any:
+    if value is None:
+        return None
+    if name in _LIST_COLUMNS:
+        return [str(item) for item in value] if isinstance(value, list) else [str(value)]
+    if name in json_columns:
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _from_arrow_value(name: str, value: Any, json_columns: set[str]) -> Any:
+    if value is not None and name in json_columns and name not in _LIST_COLUMNS:
+        return json.loads(value)
+    return value
+
+
+def _json_columns() -> set[str]:
+    return {column.name for column in Paper.__table__.columns if isinstance(column.type, JSON)}
+
+
+def _paper_chunks(engine: Engine, chunk_size: int) -> Iterator[list[dict[str, Any]]]:
+    """按照id分批读取papers表"""
+    table = Paper.__table__
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(table).where(table.c.id > last_id).order_by(table.c.id).limit(chunk_size)
+            ).mappings().all()
+        if not rows:
+            return
+        last_id = rows[-1]["id"]
+        yield [dict(row) for row in rows]
+
+
+def export_parquet(
+    engine: Engine,
+    out_dir: str | Path,
+    partition_by: tuple[str, ...] | list[str] = DEFAULT_PARTITION,
+    chunk_size: int = 50000,
+    compression: str = "zstd",
+) -> ParquetReport:
+    """
+    将papers表和paper_citation_association表导出为Parquet
+
+    Args:
+        engine: 数据库引擎,例如Query.connect_db(...).engine
+        out_dir: 导出目录,其中已有的papers和paper_citation_association子目录会先被删除
+        partition_by: papers按这些列分区(hive风格的目录),为空时不分区
+        chunk_size: 每批读取的行数,每批在每个分区中写出一个文件
+        compression: Parquet的压缩算法
+
+    Returns:
+        导出的行数
+    """
+    _require_pyarrow()
+    out_dir = Path(out_dir)
+    schema = papers_schema()
+    partition_by = tuple(partition_by)
+    unknown = set(partition_by) - set(schema.names)
+    if unknown:
+        raise ValueError(f"Unknown partition columns {sorted(unknown)}")
+    partitioning = (
+        ds.partitioning(pa.schema([schema.field(name) for name in partition_by]), flavor="hive")
+        if partition_by else None
+    )
+    json_columns = _json_columns()
+    file_format = ds.ParquetFileFormat()
+    report = ParquetReport()
+
+    # 旧的导出中可能有本次没有写到的分区或文件,保留下来会在导入时重复
+    for name in (PAPERS_DIR, ASSOCIATION_DIR):
+        shutil.rmtree(out_dir / name, ignore_errors=True)
+
+    for index, rows in enumerate(_paper_chunks(engine, chunk_size)):
+        data = {
+            name: [_to_arrow_value(name, row[name], json_columns) for row in rows]
+            for name in schema.names
+        }
+        ds.write_dataset(
+            pa.table(data, schema=schema),
+            out_dir / PAPERS_DIR,
+            format=file_format,
+            file_options=file_format.make_write_options(compression=compression),
+            partitioning=partitioning,
+            basename_template=f"part-{index}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_partitions=100000,
+        )
+        report.papers += len(rows)
+        logger.info(f"Exported {report.papers} papers to {out_dir / PAPERS_DIR}")
+
+    report.associations = _export_association(engine, out_dir / ASSOCIATION_DIR, chunk_size, compression)
+    logger.info(f"Exported {report.associations} citation links to {out_dir / ASSOCIATION_DIR}")
+    return report
+
+
+def _export_association(engine: Engine, path: Path, chunk_size: int, compression: str) -> int:
+    table = paper_citation_association
+    schema = pa.schema([pa.field(column.name, pa.int64()) for column in table.columns])
+    path.mkdir(parents=True, exist_ok=True)
+    total = 0
+    with pq.ParquetWriter(path / "part-0.parquet", schema, compression=compression) as writer:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                select(table).order_by(table.c.citing_paper_id, table.c.cited_paper_id)
+            )
+            for rows in result.partitions():
+                writer.write_table(
+                    pa.table({name: [row[i] for row in rows] for i, name in enumerate(schema.names)}, schema=schema)
+                )
+                total += len(rows)
+    return total
+
+
+def import_parquet(
+    engine: Engine,
+    in_dir: str | Path,
+    mode: str = "bulk",
+    chunk_size: int = 50000,
+    partition_by: tuple[str, ...] | list[str] = DEFAULT_PARTITION,
+) -> ParquetReport:
+    """
+    从export_parquet导出的目录导入
+
+    Args:
+        engine: 目标数据库引擎,表结构需要已经创建(connect_db(create_db=True))
+        in_dir: export_parquet的导出目录
+        mode: 导入方式
+            bulk: 保留原来的id直接批量插入,最快,目标数据库中的papers表必须为空
+            upsert: 使用Insert.upsert按DOI合并到已有数据库,论文会得到新的id,
+                    引用关系按照DOI转换为新的id,没有DOI的论文之间的引用关系会被跳过
+        chunk_size: 每批读取和写入的行数
+        partition_by: 导出时使用的分区列,用于从目录名恢复列的类型
+
+    Returns:
+        导入的行数
+    """
+    _require_pyarrow()
+    if mode not in ("bulk", "upsert"):
+        raise ValueError(f"Unknown import mode '{mode}', expected 'bulk' or 'upsert'")
+    in_dir = Path(in_dir)
+    schema = papers_schema()
+    partition_by = tuple(partition_by)
+    dataset = ds.dataset(
+        in_dir / PAPERS_DIR,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([schema.field(name) for name in partition_by]), flavor="hive")
+        if partition_by else None,
+    )
+    report = ParquetReport()
+
+    if mode == "bulk":
+        with engine.connect() as conn:
+            if conn.execute(select(func.count()).select_from(Paper.__table__)).scalar():
+                raise DatabaseError("Bulk import requires an empty papers table, use mode='upsert' to merge")
+        _import_papers(engine, dataset, schema, chunk_size, None, report)
+        _import_association(engine, in_dir / ASSOCIATION_DIR, chunk_size, None, report)
+    else:
+        # 临时表只在创建它的连接中可见,id的转换和引用关系的写入都使用这个连接
+        with engine.connect() as map_conn:
+            _id_map.create(map_conn)
+            map_conn.commit()
+            try:
+                _import_papers(engine, dataset, schema, chunk_size, map_conn, report)
+                _import_association(engine, in_dir / ASSOCIATION_DIR, chunk_size, map_conn, report)
+            finally:
+                _id_map.drop(map_conn)
+                map_conn.commit()
+    return report
+
+
+def _import_papers(
+    engine: Engine,
+    dataset: "ds.Dataset",
+    schema: "pa.Schema",
+    chunk_size: int,
+    map_conn: Connection | None,
+    report: ParquetReport,
+) -> None:
+    """map_conn为None时按原来的id批量插入,否则upsert并把 旧id -> doi_norm 写入临时表"""
+    json_columns = _json_columns()
+    upserter = Insert(DB_engine=engine) if map_conn is not None else None
+    names = [name for name in schema.names if name in dataset.schema.names]
+    for batch in dataset.to_batches(columns=names, batch_size=chunk_size):
+        columns = batch.to_pydict()
+        rows = [
+            {name: _from_arrow_value(name, value, json_columns) for name, value in zip(names, values)}
+            for values in zip(*(columns[name] for name in names))
+        ]
+        if upserter is None:
+            with engine.begin() as conn:
+                conn.execute(insert(Paper.__table__), rows)
+        else:
+            upserter.upsert(rows, chunk_size=chunk_size)
+            mapping = [
+                {"old_id": row["id"], "doi_norm": row["doi_norm"]} for row in rows if row["doi_norm"] is not None
+            ]
+            if mapping:
+                map_conn.execute(insert(_id_map), mapping)
+                map_conn.commit()
+        report.papers += len(rows)
+        logger.info(f"Imported {report.papers} papers")
+
+
+def _new_ids(map_conn: Connection, old_ids: set[int]) -> dict[int, int]:
+    """导出文件中的id -> 目标数据库中的id,只查询本批引用关系用到的id"""
+    found: dict[int, int] = {}
+    old_ids = list(old_ids)
+    # SQLite单条语句的参数个数有上限
+    for start in range(0, len(old_ids), 500):
+        rows = map_conn.execute(
+            select(_id_map.c.old_id, Paper.id)
+            .join(Paper, Paper.doi_norm == _id_map.c.doi_norm)
+            .where(_id_map.c.old_id.in_(old_ids[start:start + 500]))
+        )
+        found.update((old_id, new_id) for old_id, new_id in rows)
+    return found
+
+
+def _import_association(
+    engine: Engine,
+    path: Path,
+    chunk_size: int,
+    map_conn: Connection | None,
+    report: ParquetReport,
+) -> None:
+    if not path.exists():
+        return
+    table = paper_citation_association
+    dataset = ds.dataset(path, format="parquet")
+    for batch in dataset.to_batches(batch_size=chunk_size):
+        columns = batch.to_pydict()
+        pairs = list(zip(columns["citing_paper_id"], columns["cited_paper_id"]))
+        if map_conn is not None:
+            id_map = _new_ids(map_conn, {paper_id for pair in pairs for paper_id in pair})
+            mapped = [(id_map.get(citing), id_map.get(cited)) for citing, cited in pairs]
+            rows = [
+                {"citing_paper_id": citing, "cited_paper_id": cited}
+                for citing, cited in mapped if citing is not None and cited is not None
+            ]
+            report.skipped_associations += len(mapped) - len(rows)
+        else:
+            rows = [{"citing_paper_id": citing, "cited_paper_id": cited} for citing, cited in pairs]
+        if rows:
+            # 合并时可能已经存在相同的引用关系
+            statement = insert(table).prefix_with("OR IGNORE", dialect="sqlite")
+            if map_conn is not None:
+                map_conn.execute(statement, rows)
+                map_conn.commit()
+            else:
+                with engine.begin() as conn:
+                    conn.execute(statement, rows)
+        report.associations += len(rows)
+    logger.info(f"Imported {report.associations} citation links, skipped {report.skipped_associations}")
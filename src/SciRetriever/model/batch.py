@@ -0,0 +1,349 @@
+"""
+按列保存的论文批次
+
+流水线中大批量的论文不需要逐条创建PaperMetadata或Paper对象,PaperBatch为每个字段保存一列,
+筛选、DOI规范化、出版社名称统一等操作都按列进行,10万条数据只有20多个列。
+
+安装了pyarrow时,类型统一的列(字符串、整数、布尔、字符串列表)保存为pyarrow.Array,
+掩码和规范化由pyarrow.compute完成;其他列(paper_metadata、类型混杂的列)以及没有安装pyarrow时保存为列表,
+两种列的结果相同。
+
+示例：
+    batch = crossref.export_batch()
+    batch = batch.select(batch.type_mask(["journal-article"]) & batch.year_mask(2000, 2024))
+    batch.canonicalize_publisher()
+    insert.upsert(batch.to_rows())
+"""
+import json
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping, Sequence
+
+from .paper import PaperMetadata, ROW_FIELDS
+from ..utils.normalize import DOI_PREFIX_PATTERN, PUBLISHER_ALIASES, canonical_publisher, normalize_doi
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    PYARROW = True
+except ImportError:
+    PYARROW = False
+
+# 转为Arrow时保存为JSON字符串的列(内容不固定,无法推断统一的Arrow类型)
+_JSON_COLUMNS: tuple[str, ...] = ("paper_metadata",)
+
+# 保存为pyarrow.Array的列类型,转换前后的Python值完全相同(例如整数和小数混合的列会变成double,不在其中)
+if PYARROW:
+    _ARROW_TYPES = (pa.string(), pa.int64(), pa.bool_(), pa.list_(pa.string()))
+
+
+class Mask(list):
+    """
+    布尔掩码,长度与PaperBatch相同,支持 & | ~ 组合
+    """
+    def __and__(self, other: Sequence[bool]) -> "Mask":
+        return Mask([a and b for a, b in zip(self, other, strict=True)])
+
+    def __or__(self, other: Sequence[bool]) -> "Mask":
+        return Mask([a or b for a, b in zip(self, other, strict=True)])
+
+    def __invert__(self) -> "Mask":
+        return Mask([not a for a in self])
+
+
+class PaperBatch:
+    """
+    按列保存的一批论文,列名与PaperMetadata的字段(papers表的列)相同,
+    也可以保存额外的列(例如doi_norm),to_rows时一并输出
+    """
+    __slots__ = ("columns",)
+
+    def __init__(self, columns: Mapping[str, Sequence[Any]] | None = None):
+        columns = {name: _to_column(name, values) for name, values in (columns or {}).items()}
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"All columns must have the same length, got {sorted(lengths)}")
+        size = lengths.pop() if lengths else 0
+        for name in ROW_FIELDS:
+            columns.setdefault(name, [None] * size)
+        # 列表或者pyarrow.Array,见_to_column
+        self.columns: dict[str, Any] = columns
+
+    def __len__(self) -> int:
+        return len(self.columns["title"])
+
+    def __getitem__(self, name: str) -> list[Any]:
+        return _to_list(self.columns[name])
+
+    def __setitem__(self, name: str, values: Sequence[Any]) -> None:
+        if len(values) != len(self):
+            raise ValueError(f"Column '{name}' has {len(values)} values, expected {len(self)}")
+        self.columns[name] = _to_column(name, values)
+
+    def _arrow(self, name: str, *types: "pa.DataType") -> "pa.Array | None":
+        """某一列为types之一的pyarrow.Array时返回它,否则返回None(使用列表的实现)"""
+        values = self.columns[name]
+        if PYARROW and isinstance(values, pa.Array) and values.type in types:
+            return values
+        return None
+
+    def __repr__(self) -> str:
+        return f"PaperBatch(rows={len(self)}, columns={len(self.columns)})"
+
+    # ------------------------------------------------------------------
+    # 创建
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_rows(cls, rows: Iterable[Mapping[str, Any]]) -> "PaperBatch":
+        """
+        从逐行的字典创建,例如Crossref.item2row、Query.stream(as_dict=True)的结果,
+        缺少的字段为None,pub_year转换为整数(与PaperMetadata相同)
+        """
+        columns: dict[str, list[Any]] = {name: [] for name in ROW_FIELDS}
+        appends = [(name, columns[name].append) for name in ROW_FIELDS]
+        for row in rows:
+            for name, append in appends:
+                append(row.get(name))
+        columns["pub_year"] = [_to_year(year) for year in columns["pub_year"]]
+        columns["pdf_path"] = [str(path) if isinstance(path, Path) else path for path in columns["pdf_path"]]
+        columns["pdf_downloaded"] = [bool(value) for value in columns["pdf_downloaded"]]
+        return cls(columns)
+
+    @classmethod
+    def from_papers(cls, papers: Iterable[PaperMetadata]) -> "PaperBatch":
+        """从PaperMetadata创建"""
+        return cls.from_rows({name: getattr(paper, name) for name in ROW_FIELDS} for paper in papers)
+
+    @classmethod
+    def from_crossref(cls, items: Iterable[dict[str, Any]]) -> "PaperBatch":
+        """从Crossref API返回的items创建"""
+        from ..searcher.crossref import Crossref
+        return cls.from_rows(Crossref.item2row(item) for item in items)
+
+    @classmethod
+    def from_semantic(cls, datas: Iterable[dict[str, Any]]) -> "PaperBatch":
+        """从Semantic Scholar API返回的data创建"""
+        from ..searcher.semantic_scholar import SemanticScholarSearch
+        return cls.from_rows(SemanticScholarSearch.data2row(data) for data in datas)
+
+    @classmethod
+    def from_gs(cls, rows: Iterable[Any]) -> "PaperBatch":
+        """从GoogleScholar的GSRow创建"""
+        return cls.from_rows(row.export_row() for row in rows)
+
+    @classmethod
+    def concat(cls, batches: Iterable["PaperBatch"]) -> "PaperBatch":
+        """按行拼接多个批次,只保留所有批次共有的列"""
+        batches = list(batches)
+        if not batches:
+            return cls()
+        names = [name for name in batches[0].columns if all(name in batch.columns for batch in batches)]
+        return cls({name: _concat([batch.columns[name] for batch in batches]) for name in names})
+
+    # ------------------------------------------------------------------
+    # 掩码和筛选
+    # ------------------------------------------------------------------
+    def type_mask(self, types: Iterable[str]) -> Mask:
+        """type在types中的行(不区分大小写)"""
+        types = {value.lower() for value in types}
+        column = self._arrow("type", pa.string()) if PYARROW else None
+        if column is not None:
+            return _mask(pc.is_in(pc.utf8_lower(column), value_set=pa.array(sorted(types), pa.string())))
+        return Mask([value is not None and value.lower() in types for value in self.columns["type"]])
+
+    def year_mask(self, start: int | None = None, end: int | None = None) -> Mask:
+        """start <= pub_year <= end 的行,没有年份的行不满足条件"""
+        column = self._arrow("pub_year", pa.int64()) if PYARROW else None
+        if column is not None:
+            mask = pc.is_valid(column)
+            if start is not None:
+                mask = pc.and_(mask, pc.greater_equal(column, start))
+            if end is not None:
+                mask = pc.and_(mask, pc.less_equal(column, end))
+            return _mask(mask)
+        return Mask([
+            year is not None and (start is None or year >= start) and (end is None or year <= end)
+            for year in self.columns["pub_year"]
+        ])
+
+    def isin_mask(self, name: str, values: Iterable[Any]) -> Mask:
+        """某一列的值在values中的行"""
+        values = set(values)
+        column = self._arrow(name, pa.string(), pa.int64(), pa.bool_()) if PYARROW else None
+        if column is not None:
+            try:
+                value_set = pa.array(list(values), column.type)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # values中有类型不同的值,例如字符串列与整数比较
+                value_set = None
+            if value_set is not None:
+                return _mask(pc.is_in(column, value_set=value_set))
+        return Mask([value in values for value in _to_list(self.columns[name])])
+
+    def notnull_mask(self, name: str) -> Mask:
+        """某一列不为None且不为空字符串的行"""
+        column = self._arrow(name, *_ARROW_TYPES) if PYARROW else None
+        if column is not None:
+            mask = pc.is_valid(column)
+            if column.type == pa.string():
+                mask = pc.and_(mask, pc.not_equal(column, ""))
+            return _mask(mask)
+        return Mask([value is not None and value != "" for value in _to_list(self.columns[name])])
+
+    def text_mask(self, universal_filter: Any) -> Mask:
+        """
+        使用searcher.filter.UniversalFilter筛选标题 + 摘要
+
+        Args:
+            universal_filter: UniversalFilter,也可以是任何有check_many方法的对象
+        """
+        texts = [
+            f"{title or ''} {abstract or ''}"
+            for title, abstract in zip(self["title"], self["abstract"])
+        ]
+        return Mask(universal_filter.check_many(texts))
+
+    def select(self, mask: Sequence[bool]) -> "PaperBatch":
+        """返回mask为True的行组成的新批次"""
+        if len(mask) != len(self):
+            raise ValueError(f"Mask has {len(mask)} values, expected {len(self)}")
+        indices = [i for i, keep in enumerate(mask) if keep]
+        return self.take(indices)
+
+    def take(self, indices: Sequence[int]) -> "PaperBatch":
+        """按照下标取出行组成新批次"""
+        if PYARROW and any(isinstance(values, pa.Array) for values in self.columns.values()):
+            arrow_indices = pa.array(indices, pa.int64())
+        return PaperBatch({
+            name: values.take(arrow_indices) if PYARROW and isinstance(values, pa.Array) else [values[i] for i in indices]
+            for name, values in self.columns.items()
+        })
+
+    def slices(self, size: int) -> Iterator["PaperBatch"]:
+        """按照size行切分"""
+        for start in range(0, len(self), size):
+            yield PaperBatch({name: values[start:start + size] for name, values in self.columns.items()})
+
+    # ------------------------------------------------------------------
+    # 按列转换
+    # ------------------------------------------------------------------
+    def normalize_doi(self) -> list[str | None]:
+        """计算规范化的DOI并保存为doi_norm列,结果与utils.normalize.normalize_doi相同"""
+        column = self._arrow("doi", pa.string()) if PYARROW else None
+        if column is not None:
+            doi = pc.utf8_trim_whitespace(column)
+            doi = pc.replace_substring_regex(doi, pattern=f"(?i){DOI_PREFIX_PATTERN}", replacement="", max_replacements=1)
+            doi = pc.utf8_lower(pc.utf8_trim_whitespace(doi))
+            # 空DOI为None
+            self.columns["doi_norm"] = pc.if_else(pc.equal(doi, ""), pa.scalar(None, pa.string()), doi)
+        else:
+            self.columns["doi_norm"] = [normalize_doi(doi) for doi in self.columns["doi"]]
+        return self["doi_norm"]
+
+    def canonicalize_publisher(self, aliases: dict[str, str] | None = None) -> None:
+        """
+        将publisher列的别名替换为统一的名称
+
+        Args:
+            aliases: 别名表,默认为utils.normalize.PUBLISHER_ALIASES
+        """
+        column = self._arrow("publisher", pa.string()) if PYARROW else None
+        if column is not None:
+            aliases = PUBLISHER_ALIASES if aliases is None else aliases
+            index = pc.index_in(column, value_set=pa.array(list(aliases), pa.string()))
+            canonical = pa.array(list(aliases.values()), pa.string()).take(index)
+            self.columns["publisher"] = pc.if_else(pc.is_valid(index), canonical, column)
+            return
+        self.columns["publisher"] = [
+            canonical_publisher(publisher, aliases) for publisher in self.columns["publisher"]
+        ]
+
+    def fill(self, name: str, value: Any) -> None:
+        """将某一列中的None替换为value,例如 batch.fill("source", "Crossref")"""
+        self.columns[name] = _to_column(name, [value if old is None else old for old in _to_list(self.columns[name])])
+
+    # ------------------------------------------------------------------
+    # 导出
+    # ------------------------------------------------------------------
+    def to_rows(self) -> Iterator[dict[str, Any]]:
+        """逐行生成字典,可以直接传给Insert.upsert"""
+        names = list(self.columns)
+        for values in zip(*(self[name] for name in names)):
+            yield dict(zip(names, values))
+
+    def to_papers(self) -> list[PaperMetadata]:
+        """转换为PaperMetadata列表"""
+        return [
+            PaperMetadata(**{name: value for name, value in row.items() if name in ROW_FIELDS})
+            for row in self.to_rows()
+        ]
+
+    def to_arrow(self) -> "pa.Table":
+        """
+        转换为pyarrow.Table,paper_metadata保存为JSON字符串
+
+        Raises:
+            ImportError: 没有安装pyarrow
+        """
+        if not PYARROW:
+            raise ImportError("pyarrow is required for PaperBatch.to_arrow, install it with 'pip install pyarrow'")
+        data = {
+            name: [None if value is None else json.dumps(value, ensure_ascii=False) for value in _to_list(values)]
+            if name in _JSON_COLUMNS else values
+            for name, values in self.columns.items()
+        }
+        return pa.table(data)
+
+    @classmethod
+    def from_arrow(cls, table: "pa.Table") -> "PaperBatch":
+        """从to_arrow生成的pyarrow.Table创建"""
+        columns: dict[str, Any] = {name: table.column(name).combine_chunks() for name in table.column_names}
+        for name in _JSON_COLUMNS:
+            if name in columns:
+                columns[name] = [None if value is None else json.loads(value) for value in columns[name].to_pylist()]
+        return cls(columns)
+
+
+def _to_year(value: Any) -> int | None:
+    """与PaperMetadata.__post_init__相同,无法转换的年份为None"""
+    if value is None or isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_column(name: str, values: Sequence[Any]) -> Any:
+    """
+    没有安装pyarrow、JSON列或者无法无损转换为_ARROW_TYPES的列保存为列表,其他列保存为pyarrow.Array
+    """
+    if not PYARROW or name in _JSON_COLUMNS:
+        return _to_list(values)
+    if isinstance(values, pa.ChunkedArray):
+        values = values.combine_chunks()
+    if isinstance(values, pa.Array):
+        return values if values.type in _ARROW_TYPES else values.to_pylist()
+    values = list(values)
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+        return values
+    return array if array.type in _ARROW_TYPES else values
+
+
+def _to_list(values: Any) -> list[Any]:
+    if PYARROW and isinstance(values, (pa.Array, pa.ChunkedArray)):
+        return values.to_pylist()
+    return list(values)
+
+
+def _concat(columns: list[Any]) -> Any:
+    """拼接多个批次的同一列,类型相同的pyarrow.Array直接拼接"""
+    if PYARROW and all(isinstance(values, pa.Array) and values.type == columns[0].type for values in columns):
+        return pa.concat_arrays(columns)
+    return [value for values in columns for value in _to_list(values)]
+
+
+def _mask(mask: "pa.Array") -> Mask:
+    """pyarrow.compute的布尔结果转换为Mask,null(缺失值)为False"""
+    return Mask(pc.fill_null(mask, False).to_pylist())
@@ -1,19 +1,25 @@
 """
 文章元信息
 """
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Mapping
 
 from ..utils.logging import get_logger
+from ..utils.normalize import normalize_doi, title_hash
 from ..database.optera import Insert
 from ..database.model import Paper
 
 logger = get_logger(__name__)
-@dataclass
+@dataclass(slots=True)
 class PaperMetadata():
-    """Represents a scientific paper."""
+    """
+    Represents a scientific paper.
+
+    使用__slots__保存,大量持有时没有每个实例的__dict__;
+    to_row/from_row直接与papers表的行(字典)互相转换,不经过ORM对象
+    """
     
     # Required fields
     title: str
@@ -58,9 +64,8 @@ class PaperMetadata():
                 self.pub_year = None
                 
     def Insert_database(self,insert:Insert) -> None:
-        """将全部插入到数据库中"""
-        paper = self.export_paper()
-        insert.from_paper(paper)
+        """将全部插入到数据库中,DOI已经存在时合并到已有记录"""
+        insert.from_paper(self.export_paper())
         logger.info(f"paper_{self.title}插入完成")
 
     def export_paper(self) -> Paper:
@@ -70,10 +75,38 @@ class PaperMetadata():
         Returns:
             Paper instance
         """
-        paper_dict = self.__dict__.copy()
-        paper_dict.pop("references")
-        paper_dict.pop("citations")
-        return Paper(**paper_dict)
+        return Paper(**{name: getattr(self, name) for name in ROW_FIELDS})
+
+    def to_row(self) -> dict[str, Any]:
+        """
+        转换为papers表的一行,可以直接用于Insert.upsert或者insert(Paper.__table__)的批量插入,
+        doi_norm、title_hash和created_at已经填好(Core插入不会触发ORM事件)
+
+        Returns:
+            列名到值的字典
+        """
+        row = {name: getattr(self, name) for name in ROW_FIELDS}
+        if row["pdf_path"] is not None:
+            row["pdf_path"] = str(row["pdf_path"])
+        row["created_at"] = datetime.now()
+        row["doi_norm"] = normalize_doi(self.doi)
+        row["title_hash"] = title_hash(self.title)
+        return row
+
+    @classmethod
+    def from_row(cls, row: Mapping[str, Any]) -> "PaperMetadata":
+        """
+        从papers表的一行创建,row可以是字典或者select(Paper.__table__)等Core查询返回的Row,
+        表中多出的列(id、created_at等)会被忽略
+
+        Args:
+            row: 列名到值的映射
+
+        Returns:
+            PaperMetadata instance
+        """
+        row = getattr(row, "_mapping", row)
+        return cls(**{name: row[name] for name in ROW_FIELDS if name in row})
     
     @property
     def full_citation(self) -> str:
@@ -167,9 +200,8 @@ class PaperMetadata():
         Returns:
             PaperMetadata instance
         """
-        data = paper.dump_dict()
-        data.pop("created_at")
-        data["notes"] = str(data.pop("id"))
+        data = {name: getattr(paper, name) for name in ROW_FIELDS}
+        data["notes"] = str(paper.id)
         return cls(**data)
     
     def update_keywords(self, keywords: list[str]) -> None:
@@ -197,3 +229,8 @@ class PaperMetadata():
         author = data["Authors"]
         journal = data["Journal Title"]
         
+
+
+# 所有字段,以及与papers表的列一一对应的字段(references和citations不入库)
+FIELDS: tuple[str, ...] = tuple(f.name for f in fields(PaperMetadata))
+ROW_FIELDS: tuple[str, ...] = tuple(name for name in FIELDS if name not in ("references", "citations"))
@@ -1,7 +1,16 @@
-from .client import NetworkClient,Proxy,RateLimiter
+from .client import BaseNetworkClient,NetworkClient,Proxy,RateLimiter
+from .async_client import AsyncNetworkClient
+from .ratelimit import TokenBucket,set_host_limits
+from .cache import DiskResponseCache,ResponseCache
 
 __all__=[
+    "AsyncNetworkClient",
+    "BaseNetworkClient",
+    "DiskResponseCache",
     "NetworkClient",
     "Proxy",
-    "RateLimiter"
+    "RateLimiter",
+    "ResponseCache",
+    "TokenBucket",
+    "set_host_limits",
     ]
\ No newline at end of file
@@ -0,0 +1,446 @@
+"""
+基于asyncio的网络请求客户端
+
+与NetworkClient使用相同的参数和重试策略,但底层使用aiohttp的连接池,
+一个进程内可以同时保持大量DOI查询和下载请求
+"""
+import asyncio
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
+from urllib.parse import urljoin
+
+try:
+    import aiohttp
+    AIOHTTP = True
+except ImportError:
+    AIOHTTP = False
+
+from .client import BaseNetworkClient, Proxy
+from ..utils.exceptions import DownloadError, RetryError
+from ..utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncNetworkClient(BaseNetworkClient):
+    """
+    用于网络爬虫的异步网络请求客户端
+
+    示例：
+    async with AsyncNetworkClient(max_connections=200) as client:
+        responses = await asyncio.gather(*[client.get(url) for url in urls])
+
+    返回的aiohttp.ClientResponse已经读取完响应体,可以直接使用
+    await response.text() / await response.json()
+    """
+
+    def __init__(
+        self,
+        rate_limit: float | None = None,
+        max_retries: int | None = None,
+        retry_delay: float | None = None,
+        timeout: float | None = None,
+        user_agent: str | None = None,
+        use_proxy: bool = False,
+        proxy: Proxy | None = None,
+        headers: dict[str, str] | None = None,
+        allow_redirects: bool = True,
+        cookie: dict[str, str] | None = None,
+        verify: bool = False,
+        max_connections: int | None = None,
+        max_connections_per_host: int | None = None,
+    ):
+        """
+        初始化异步网络客户端,其余参数见BaseNetworkClient
+
+        Args:
+            max_connections: 连接池中同时打开的最大连接数
+            max_connections_per_host: 对同一个主机同时打开的最大连接数
+        """
+        if not AIOHTTP:
+            raise ImportError("AsyncNetworkClient requires aiohttp, please install it with `pip install aiohttp`")
+        super().__init__(
+            rate_limit=rate_limit,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            timeout=timeout,
+            user_agent=user_agent,
+            use_proxy=use_proxy,
+            proxy=proxy,
+            headers=headers,
+            allow_redirects=allow_redirects,
+            cookie=cookie,
+            verify=verify,
+        )
+        self.max_connections:int = max_connections or self.config.get("session.max_connections", 100)
+        self.max_connections_per_host:int = max_connections_per_host or self.config.get("session.max_connections_per_host", 10)
+        # aiohttp的session必须在事件循环中创建,因此延迟到第一次请求时创建
+        self.session:"aiohttp.ClientSession|None" = None
+        self._session_lock:asyncio.Lock|None = None
+        # 每个session上正在进行的请求数,以及已经被替换、等待请求结束后关闭的session
+        self._in_flight:dict["aiohttp.ClientSession",int] = {}
+        self._retired:set["aiohttp.ClientSession"] = set()
+
+    async def __aenter__(self) -> "AsyncNetworkClient":
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def update_cookie(self,cookie:dict[str,str]) -> None:
+        """
+        更新session的cookie
+        """
+        self.cookie = {**(self.cookie or {}), **cookie}
+        if self.session is not None:
+            self.session.cookie_jar.update_cookies(cookie)
+
+    def update_headers(self,headers:dict[str,str]) -> None:
+        """
+        更新session的headers
+        """
+        self.default_headers.update(headers)
+        if self.session is not None:
+            self.session.headers.update(headers)
+
+    def _create_session(self) -> "aiohttp.ClientSession":
+        """创建并配置session,连接池大小由max_connections限制"""
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.max_connections_per_host,
+            ssl=self.verify,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.default_headers,
+            cookies=self.cookie,
+        )
+        if self.use_proxy:
+            proxy_settings = self.proxy.get_proxies()
+            if proxy_settings and (proxy_settings.get('http') or proxy_settings.get('https')):
+                logger.info(f"Applied proxy: {proxy_settings}")
+            else:
+                logger.warning("No valid proxy settings found. Proxies will not be used.")
+        return session
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session_lock is None:
+            self._session_lock = asyncio.Lock()
+        async with self._session_lock:
+            if self.session is None or self.session.closed:
+                self.session = self._create_session()
+        return self.session
+
+    @asynccontextmanager
+    async def _use_session(self) -> AsyncIterator["aiohttp.ClientSession"]:
+        """在一次请求期间占用当前的session,被替换的session在最后一个请求结束后关闭"""
+        session = await self._get_session()
+        self._in_flight[session] = self._in_flight.get(session, 0) + 1
+        try:
+            yield session
+        finally:
+            self._in_flight[session] -= 1
+            if not self._in_flight[session]:
+                del self._in_flight[session]
+                if session in self._retired:
+                    self._retired.discard(session)
+                    await session.close()
+
+    async def _renew_session(self, old_session: "aiohttp.ClientSession") -> None:
+        """
+        遇到403时更换会话,多个协程同时遇到403时只更换一次
+
+        旧的session上可能还有其他协程的请求,此时只替换不关闭,由_use_session在这些请求结束后关闭
+        """
+        async with self._session_lock:
+            if self.session is old_session:
+                self.session = self._create_session()
+                if self._in_flight.get(old_session):
+                    self._retired.add(old_session)
+                else:
+                    await old_session.close()
+
+    async def close(self) -> None:
+        """关闭session以及连接池,包括还没有关闭的旧session"""
+        for session in [self.session, *self._retired]:
+            if session is not None and not session.closed:
+                await session.close()
+        self._retired.clear()
+        self._in_flight.clear()
+        self.session = None
+
+    def _request_kwargs(self, url: str, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """将requests风格的参数转换为aiohttp的参数"""
+        timeout = kwargs.pop('timeout', self.timeout)
+        kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout)
+        # 302由_request_with_retry手动处理,与NetworkClient保持一致
+        kwargs.setdefault('allow_redirects', self.allow_redirects)
+        if 'verify' in kwargs:
+            kwargs['ssl'] = bool(kwargs.pop('verify'))
+        if 'proxies' in kwargs:
+            proxies = kwargs.pop('proxies') or {}
+            kwargs['proxy'] = Proxy(http=proxies.get('http'), https=proxies.get('https')).get_proxy_url(url)
+        elif self.use_proxy:
+            kwargs.setdefault('proxy', self.proxy.get_proxy_url(url))
+        kwargs.pop('stream', None)
+        return kwargs
+
+    async def get(
+        self,
+        url: str,
+        params: dict[str, Any]|None = None,
+        **kwargs
+    ) -> "aiohttp.ClientResponse":
+        """
+        发送GET请求并返回响应,参数与NetworkClient.get相同
+
+        返回:
+            已经读取完响应体的aiohttp.ClientResponse对象
+
+        异常:
+            RetryError: 当请求在多次重试后仍然失败时抛出
+        """
+        return await self._request_with_retry("GET", url, params=params, **kwargs)
+
+    async def _request_with_retry(
+        self,
+        method: str,
+        url: str,
+        params: dict[str, Any]|None = None,
+        **kwargs
+    ) -> "aiohttp.ClientResponse":
+        """
+        发送HTTP请求并在失败时自动重试,同时实现速率限制。
+
+        处理流程与NetworkClient._request_with_retry相同:
+            1. 应用速率限制
+            2. 404重试,403更换会话后重试,429/503按照Retry-After等待
+            3. 302手动跟随重定向
+            4. 超时时逐步增加超时时间,连接错误使用指数退避
+            5. 在所有重试失败后抛出RetryError
+        """
+        if 'timeout' not in kwargs:
+            kwargs['timeout'] = self.timeout
+
+        tries = 0
+        timeout = kwargs['timeout']
+        # 下一次请求之前需要等待的秒数;等待在释放session之后进行,
+        # 等待期间被替换的session可以在其他请求结束后立即关闭
+        delay = 0.0
+
+        while tries < self.max_retries:
+            if delay:
+                await asyncio.sleep(delay)
+                delay = 0.0
+            # 速率限制
+            await self.rate_limiter.wait_async(url)
+            async with self._use_session() as session:
+                try:
+                    logger.debug(f"Requesting {method} {url} (attempt {tries+1}/{self.max_retries})")
+                    request_kwargs = self._request_kwargs(url, dict(kwargs))
+                    response = await session.request(method, url, params=params, **request_kwargs)
+
+                    # 处理常见的HTTP状态码
+                    if response.status == 200:
+                        # 读取响应体后连接会自动归还连接池
+                        await response.read()
+                        return response
+
+                    response.release()
+                    if response.status == 404:
+                        logger.warning(f"Resource not found (404): {url}")
+                        tries += 1
+                        continue
+                    elif response.status == 403:
+                        logger.warning(f"Access denied (403) for {url}")
+                        # 如果遇到访问被拒绝，可以尝试更换会话
+                        if tries < self.max_retries - 1:
+                            logger.info("Creating a new session and retrying...")
+                            await self._renew_session(session)
+                            # 增加等待时间，避免立即重试
+                            delay = self.retry_delay * (2 ** tries)
+                            logger.info(f"Waiting {delay} seconds before retry...")
+                            tries += 1
+                            continue
+                    elif response.status == 429 or response.status == 503:
+                        # 处理速率限制
+                        retry_after = int(response.headers.get('Retry-After', self.retry_delay * 2))
+                        logger.warning(f"Rate limited (status {response.status}). Waiting {retry_after} seconds.")
+                        delay = retry_after
+                        tries += 1
+                        continue
+                    elif response.status == 302 and 'Location' in response.headers:
+                        # 处理重定向
+                        logger.debug(f"Following redirect to: {response.headers['Location']}")
+                        url = urljoin(str(response.url), response.headers['Location'])
+                        continue
+                    else:
+                        logger.warning(f"Unexpected status code: {response.status}")
+
+                    # 对于其他状态码，尝试重试
+                    response.raise_for_status()
+
+                except asyncio.TimeoutError as e:
+                    logger.warning(f"Request timed out: {e}")
+                    # 如果超时，可以尝试增加超时时间
+                    if timeout < 3 * self.timeout:
+                        logger.info("Increasing timeout and retrying...")
+                        timeout = timeout + self.timeout
+                        kwargs['timeout'] = timeout
+                        tries += 1
+                        continue
+                    logger.warning("Maximum timeout reached")
+
+                except aiohttp.ClientConnectionError as e:
+                    logger.warning(f"Connection error: {e}")
+                    # 连接错误可能是网络问题，等待后重试
+                    if tries < self.max_retries - 1:
+                        delay = self.retry_delay * (2 ** tries)
+                        logger.info(f"Retrying in {delay} seconds...")
+
+                except aiohttp.ClientError as e:
+                    logger.warning(f"Request failed: {e}")
+
+            tries += 1
+            if tries < self.max_retries:
+                sleep_time = self.retry_delay * (2 ** tries)  # Exponential backoff
+                logger.info(f"Retrying in {sleep_time} seconds... (attempt {tries+1}/{self.max_retries})")
+                delay += sleep_time
+
+        # 如果所有重试都失败了
+        raise RetryError(f"Failed to {method.lower()} {url} after {self.max_retries} attempts")
+
+    async def download_file(
+        self,
+        url: str,
+        save_path: str | Path,
+        chunk_size: int = 65536,
+        checksum: str | None = None,
+        hash_algorithm: str = "sha256",
+        **kwargs
+    ) -> Path:
+        """
+        Download a file with retries, rate limiting and resume support.
+
+        Uses the same files as NetworkClient.download_file: the data is written to
+        "<save_path>.part" and renamed with os.replace once complete, and
+        "<save_path>.part.meta" keeps the URL and validator (ETag or Last-Modified).
+        A ".part" file is only resumed from the same URL with Range and If-Range, and is
+        discarded when the server answers 200 or the validator changed.
+        File I/O runs in worker threads (asyncio.to_thread) and does not block the event loop.
+
+        Args:
+            url: URL to download
+            save_path: Path to save the file
+            chunk_size: Size of chunks for streaming download
+            checksum: Expected hex digest of the file, None to skip verification
+            hash_algorithm: hashlib algorithm used for checksum
+            **kwargs: Additional request parameters
+
+        Returns:
+            Path to the downloaded file
+
+        Raises:
+            aiohttp.ClientError: If the download fails after retries
+            DownloadError: If the checksum does not match
+        """
+        if not isinstance(save_path, Path):
+            save_path = Path(save_path)
+
+        save_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = save_path.with_name(save_path.name + ".part")
+        meta_path = self._meta_path(part_path)
+
+        logger.info(f"Downloading file from {url} to {save_path}")
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        digest = None
+        delay = 0.0
+        for attempt in range(self.max_retries):
+            if delay:
+                # 在释放session之后等待,被替换的session不会因为等待而保持打开
+                await asyncio.sleep(delay)
+                delay = 0.0
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            validator = await asyncio.to_thread(self._load_validator, part_path, url) if offset else None
+            if offset and validator is None:
+                # 无法确认part文件与服务器上的文件相同(例如来自另一个镜像),重新下载
+                logger.info(f"Discarding {part_path}: no validator for {url}")
+                part_path.unlink()
+                offset = 0
+            request_headers = dict(headers)
+            if offset:
+                request_headers['Range'] = f'bytes={offset}-'
+                request_headers['If-Range'] = validator
+
+            await self.rate_limiter.wait_async(url)
+            try:
+                request_kwargs = self._request_kwargs(url, {**kwargs, 'headers': request_headers})
+                async with self._use_session() as session, session.get(url, **request_kwargs) as response:
+                    if offset and response.status == 206 and self._validator(response.headers) not in (None, validator):
+                        # 服务器上的文件已经改变
+                        logger.info(f"Discarding {part_path}: validator changed")
+                        part_path.unlink()
+                        continue
+                    hasher = hashlib.new(hash_algorithm)
+                    if offset and response.status == 416:
+                        # Range超出文件大小,说明part文件已经完整或者已经失效
+                        if response.headers.get('Content-Range', '').endswith(f'/{offset}'):
+                            await asyncio.to_thread(self._hash_file, part_path, hasher, chunk_size)
+                            digest = hasher.hexdigest()
+                            break
+                        part_path.unlink()
+                        continue
+                    response.raise_for_status()
+
+                    if offset and response.status == 206:
+                        logger.info(f"Resuming download from byte {offset}")
+                        await asyncio.to_thread(self._hash_file, part_path, hasher, chunk_size)
+                        mode = 'ab'
+                    else:
+                        # 200: 服务器忽略了Range或者If-Range不匹配,返回的是完整的新文件
+                        offset = 0
+                        mode = 'wb'
+                        await asyncio.to_thread(self._save_validator, part_path, url, self._validator(response.headers))
+
+                    content_length = response.content_length or 0
+                    logger.debug(f"File size: {offset + content_length} bytes")
+
+                    f = await asyncio.to_thread(open, part_path, mode)
+                    try:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            await asyncio.to_thread(f.write, chunk)
+                            hasher.update(chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+
+                    size = part_path.stat().st_size
+                    if content_length and size < offset + content_length:
+                        raise aiohttp.ClientPayloadError(f"Connection closed after {size} of {offset + content_length} bytes")
+                digest = hasher.hexdigest()
+                break
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning(f"Download failed (attempt {attempt+1}/{self.max_retries}): {e}")
+
+                if attempt < self.max_retries - 1:
+                    delay = self.retry_delay * (2 ** attempt)  # Exponential backoff
+                    logger.info(f"Retrying in {delay} seconds...")
+                else:
+                    raise e
+        if digest is None:
+            raise RetryError(f"Failed to download {url} after {self.max_retries} attempts")
+
+        if checksum is not None and digest != checksum.lower():
+            part_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {checksum}, got {digest}")
+
+        await asyncio.to_thread(os.replace, part_path, save_path)
+        meta_path.unlink(missing_ok=True)
+        logger.info(f"Successfully downloaded to {save_path}")
+        return save_path
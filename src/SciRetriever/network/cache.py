@@ -0,0 +1,290 @@
+"""
+NetworkClient的HTTP响应缓存
+
+重复运行爬虫时,相同的Crossref /works/{doi}、Semantic Scholar搜索页和Google Scholar的bibtex页
+可以直接从本地磁盘读取,不再消耗速率限制的预算。
+
+示例：
+    client = CRClient(email="xxx")
+    client.set_cache(DiskResponseCache(
+        "~/.sciretriever/cache/http.db",
+        max_size=2 * 1024 ** 3,
+        host_ttl={"api.crossref.org": 30 * 24 * 3600, "scholar.google.com": 7 * 24 * 3600},
+    ))
+"""
+import abc
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from ..utils.config import get_config
+from ..utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 参与缓存key计算的请求头,其余请求头(如User-Agent)不影响响应内容
+_VARY_HEADERS = ("accept", "accept-language")
+
+
+@dataclass
+class CacheEntry:
+    """缓存中的一条响应"""
+    key: str
+    url: str
+    status_code: int
+    headers: dict[str, str]
+    content: bytes
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def to_response(self) -> requests.Response:
+        """还原为requests.Response对象,response.from_cache为True"""
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.reason = "OK"
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = self.content
+        response.from_cache = True
+        return response
+
+    def conditional_headers(self) -> dict[str, str]:
+        """过期后用于重新验证的请求头"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache(abc.ABC):
+    """响应缓存的抽象基类,自定义缓存只需要实现get/set/refresh/delete"""
+
+    def __init__(
+        self,
+        default_ttl: float | None = None,
+        host_ttl: dict[str, float] | None = None,
+        vary_headers: tuple[str, ...] = _VARY_HEADERS,
+    ):
+        """
+        Args:
+            default_ttl: 默认缓存有效期(秒)
+            host_ttl: 按主机设置的缓存有效期,例如{"api.crossref.org": 30 * 24 * 3600}
+            vary_headers: 参与缓存key计算的请求头
+        """
+        config = get_config()
+        self.default_ttl: float = default_ttl if default_ttl is not None else config.get("cache.default_ttl", 7 * 24 * 3600)
+        self.host_ttl: dict[str, float] = {host.lower(): ttl for host, ttl in (host_ttl or {}).items()}
+        self.vary_headers: tuple[str, ...] = tuple(header.lower() for header in vary_headers)
+
+    def ttl(self, url: str) -> float:
+        host = urlsplit(url).netloc.lower()
+        return self.host_ttl.get(host, self.default_ttl)
+
+    def make_key(
+        self,
+        method: str,
+        url: str,
+        params: dict[str, Any] | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> str:
+        """
+        根据规范化的method、url、查询参数以及相关请求头生成缓存key
+
+        url中的查询参数与params合并后排序,值为None的参数与requests一样被忽略
+        """
+        parts = urlsplit(url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        if params:
+            for name, value in params.items():
+                if value is None:
+                    continue
+                values = value if isinstance(value, (list, tuple)) else [value]
+                query.extend((name, str(v)) for v in values)
+        normalized_url = urlunsplit((
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path or "/",
+            urlencode(sorted(query)),
+            "",
+        ))
+        lowered = {name.lower(): value for name, value in (headers or {}).items()}
+        vary = [f"{name}:{lowered[name]}" for name in self.vary_headers if name in lowered]
+        raw = "\n".join([method.upper(), normalized_url, *vary])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @abc.abstractmethod
+    def get(self, key: str) -> CacheEntry | None:
+        """读取缓存,不存在时返回None(过期的条目也会返回,用于重新验证)"""
+
+    @abc.abstractmethod
+    def set(self, key: str, response: requests.Response) -> None:
+        """保存响应"""
+
+    @abc.abstractmethod
+    def refresh(self, key: str, url: str, headers: CaseInsensitiveDict | dict[str, str]) -> None:
+        """收到304后延长缓存的有效期"""
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        """删除缓存"""
+
+
+class DiskResponseCache(ResponseCache):
+    """
+    基于SQLite的磁盘缓存
+
+    总大小超过max_size时按照最近访问时间(LRU)淘汰,淘汰到max_size的90%为止
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        max_size: int | None = None,
+        default_ttl: float | None = None,
+        host_ttl: dict[str, float] | None = None,
+        vary_headers: tuple[str, ...] = _VARY_HEADERS,
+    ):
+        """
+        Args:
+            path: SQLite文件路径,None时使用配置cache.path或~/.sciretriever/cache/http.db
+            max_size: 缓存的最大字节数
+            其余参数见ResponseCache
+        """
+        super().__init__(default_ttl=default_ttl, host_ttl=host_ttl, vary_headers=vary_headers)
+        config = get_config()
+        path = path or config.get("cache.path") or (Path.home() / ".sciretriever" / "cache" / "http.db")
+        self.path: Path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_size: int = max_size or config.get("cache.max_size", 1024 ** 3)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, url TEXT NOT NULL, status_code INTEGER NOT NULL, "
+            "headers TEXT NOT NULL, content BLOB NOT NULL, etag TEXT, last_modified TEXT, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_accessed_at ON responses (accessed_at)")
+        self._conn.commit()
+        self._total_size: int = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, status_code, headers, content, etag, last_modified, expires_at "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+        url, status_code, headers, content, etag, last_modified, expires_at = row
+        return CacheEntry(
+            key=key,
+            url=url,
+            status_code=status_code,
+            headers=json.loads(headers),
+            content=content,
+            etag=etag,
+            last_modified=last_modified,
+            expires_at=expires_at,
+        )
+
+    def set(self, key: str, response: requests.Response) -> None:
+        content = response.content
+        size = len(content)
+        if size > self.max_size:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status_code, headers, content, etag, last_modified, expires_at, accessed_at, size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    response.url,
+                    response.status_code,
+                    json.dumps(dict(response.headers)),
+                    content,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    now + self.ttl(response.url),
+                    now,
+                    size,
+                ),
+            )
+            self._conn.commit()
+            self._total_size += size - (old[0] if old else 0)
+            if self._total_size > self.max_size:
+                self._evict()
+
+    def refresh(self, key: str, url: str, headers: CaseInsensitiveDict | dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE responses SET expires_at = ?, accessed_at = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE key = ?",
+                (now + self.ttl(url), now, headers.get("ETag"), headers.get("Last-Modified"), key),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+            self._total_size -= row[0]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+            self._total_size = 0
+
+    def _evict(self) -> None:
+        """按照LRU淘汰缓存,调用者需要持有self._lock"""
+        target = int(self.max_size * 0.9)
+        # 其他进程可能也写入了缓存,淘汰前重新统计总大小
+        self._total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if self._total_size <= self.max_size:
+            return
+        evicted = 0
+        cursor = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at")
+        keys = []
+        for key, size in cursor:
+            if self._total_size - evicted <= target:
+                break
+            keys.append((key,))
+            evicted += size
+        cursor.close()
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", keys)
+        self._conn.commit()
+        self._total_size -= evicted
+        logger.info(f"Response cache evicted {len(keys)} entries ({evicted} bytes)")
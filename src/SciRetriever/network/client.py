@@ -1,7 +1,12 @@
 """
 对所有爬虫类网络请求都适用的对象
 """
+import hashlib
+import json
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any
 import requests
@@ -16,39 +21,15 @@ except Exception:
     DEFAULT_USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/80.0.3987.149 Safari/537.36'
 
 from ..utils.config import Config, get_config
-from ..utils.exceptions import DownloadError, RateLimitError,RetryError
+from ..utils.exceptions import DownloadError, NotFoundError, RateLimitError,RetryError
 from ..utils.logging import get_logger,setup_logging
+from .ratelimit import RateLimiter
+from .cache import ResponseCache
 
 # log_ = Path.cwd() / 'logs' / 'sciretriever.log'
 # setup_logging(log_file = log_)
 logger = get_logger(__name__)
 
-class RateLimiter:
-    """限制对服务器请求速率的类"""
-    
-    def __init__(self, rate_limit: float|None = None):
-        """
-        Initialize rate limiter.
-        
-        Args:
-            rate_limit: Minimum seconds between requests, None to use config
-        """
-        self.config = get_config()
-        self.rate_limit:float = rate_limit or self.config.get("network.rate_limit", 5.0)
-        self.last_request_time:float = 0.0
-    
-    def wait(self):
-        """Wait if necessary to respect rate limit."""
-        current_time = time.time()
-        elapsed = current_time - self.last_request_time
-        
-        if elapsed < self.rate_limit:
-            sleep_time = self.rate_limit - elapsed
-            logger.info(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
-            time.sleep(sleep_time)
-        
-        self.last_request_time = time.time()
-
 class Proxy:
     """
     管理代理设置的类
@@ -70,6 +51,14 @@ class Proxy:
         }
     def get_proxies(self) -> dict[str, str]:
         return self._proxies
+    def get_proxy_url(self, url: str) -> str | None:
+        """
+        返回某个url对应的代理地址,aiohttp只接受带协议头的单个代理地址
+        """
+        proxy = self.https if url.startswith("https") else self.http
+        if proxy and "://" not in proxy:
+            proxy = "http://" + proxy
+        return proxy
     @classmethod
     def from_config(cls, config: dict[str, str]|Config) -> 'Proxy':
         return cls(
@@ -78,8 +67,13 @@ class Proxy:
         )
 
     
-class NetworkClient:
-    """用于网络爬虫的通用网络请求客户端"""
+class BaseNetworkClient:
+    """
+    网络客户端的公共配置部分
+
+    同步的NetworkClient与异步的AsyncNetworkClient共享同一套参数、请求头、代理以及速率限制,
+    子类只需要实现各自的会话(session)和请求方法
+    """
     
     def __init__(
         self,
@@ -135,8 +129,6 @@ class NetworkClient:
         self.allow_redirects:bool = allow_redirects
         self.verify:bool = verify
         self.cookie:dict[str,str] | None = cookie
-        # 创建session
-        self.session:Session = self._create_session()
     
     def _get_version(self) -> str:
         """Get SciRetriever version."""
@@ -159,6 +151,88 @@ class NetworkClient:
             user_agent = DEFAULT_USER_AGENT
             
         return user_agent
+
+    def get_soup(self,html:bytes) -> BeautifulSoup:
+        return BeautifulSoup(html, 'html.parser')
+
+    # 以下方法用于断点续传,NetworkClient和AsyncNetworkClient共用同样的.part/.part.meta文件格式
+    @staticmethod
+    def _validator(headers: Any) -> str | None:
+        """
+        响应对应的If-Range验证器: 强ETag,没有时使用Last-Modified
+        
+        弱ETag(W/"...")不能用于If-Range
+        """
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            return etag
+        return headers.get('Last-Modified')
+    
+    @staticmethod
+    def _meta_path(part_path: Path) -> Path:
+        return part_path.with_name(part_path.name + ".meta")
+    
+    def _load_validator(self, part_path: Path, url: str) -> str | None:
+        """读取part文件的验证器,不是从url下载的或者没有验证器时返回None"""
+        try:
+            with open(self._meta_path(part_path), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url:
+            return None
+        return meta.get('validator')
+    
+    def _save_validator(self, part_path: Path, url: str, validator: str | None) -> None:
+        with open(self._meta_path(part_path), 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'validator': validator}, f)
+    
+    @staticmethod
+    def _hash_file(path: Path, hasher: "hashlib._Hash", chunk_size: int) -> None:
+        """将已存在的文件内容计入hash"""
+        with open(path, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                hasher.update(chunk)
+
+class NetworkClient(BaseNetworkClient):
+    """用于网络爬虫的通用网络请求客户端"""
+    
+    def __init__(
+        self,
+        rate_limit: float | None = None,
+        max_retries: int | None = None,
+        retry_delay: float | None = None,
+        timeout: float | None = None,
+        user_agent: str | None = None,
+        use_proxy: bool = False,
+        proxy: Proxy | None = None,
+        headers: dict[str, str] | None = None,
+        allow_redirects: bool = True,
+        cookie: dict[str, str] | None = None,
+        verify: bool = False
+    ):
+        """
+        初始化网络客户端,参数见BaseNetworkClient
+        """
+        super().__init__(
+            rate_limit=rate_limit,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            timeout=timeout,
+            user_agent=user_agent,
+            use_proxy=use_proxy,
+            proxy=proxy,
+            headers=headers,
+            allow_redirects=allow_redirects,
+            cookie=cookie,
+            verify=verify,
+        )
+        # 创建session
+        self.session:Session = self._create_session()
+        # 保护session的更换,多个线程共用一个客户端时遇到403只更换一次
+        self._session_lock:threading.Lock = threading.Lock()
+        # 响应缓存,默认关闭
+        self.cache:ResponseCache|None = None
         
     def update_cookie(self,cookie:dict[str,str]) -> None:
         """
@@ -172,6 +246,31 @@ class NetworkClient:
         """
         self.session.headers.update(headers)
 
+    def set_cache(self,cache:ResponseCache|None) -> None:
+        """
+        设置GET请求的响应缓存,None表示关闭缓存
+        """
+        self.cache = cache
+
+    def invalidate_cache(self,url:str,params:dict[str, Any]|None = None,**kwargs) -> None:
+        """
+        删除某个请求的缓存,例如缓存到了验证码页面
+        """
+        if self.cache is None:
+            return
+        headers = {**self.session.headers, **kwargs.get('headers', {})}
+        self.cache.delete(self.cache.make_key("GET", url, params, headers))
+
+    def _renew_session(self, old_session: Session) -> None:
+        """
+        遇到403时更换会话,多个线程同时遇到403时只更换一次
+
+        旧的session上可能还有其他线程的请求,只替换不关闭
+        """
+        with self._session_lock:
+            if self.session is old_session:
+                self.session = self._create_session()
+
     def _create_session(self) -> requests.Session:
         """创建并配置session"""
         session = requests.Session()
@@ -252,8 +351,33 @@ class NetworkClient:
             
             # 设置超时的GET请求
             response = client.get('https://api.example.com/data', timeout=60.0)
+        
+        缓存:
+            通过set_cache设置缓存后,未过期的响应直接从缓存返回(response.from_cache为True),
+            过期的响应带ETag/Last-Modified重新验证,收到304时继续使用缓存。
+            stream=True的请求不使用缓存。
         """
-        return self._request_with_retry("GET", url, params=params, **kwargs)
+        if self.cache is None or kwargs.get('stream'):
+            return self._request_with_retry("GET", url, params=params, **kwargs)
+        
+        headers = {**self.session.headers, **kwargs.get('headers', {})}
+        key = self.cache.make_key("GET", url, params, headers)
+        entry = self.cache.get(key)
+        if entry is not None:
+            if entry.fresh:
+                logger.debug(f"Cache hit: {url}")
+                return entry.to_response()
+            # 过期的缓存需要重新验证
+            kwargs['headers'] = {**kwargs.get('headers', {}), **entry.conditional_headers()}
+        
+        response = self._request_with_retry("GET", url, params=params, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            logger.debug(f"Cache revalidated: {url}")
+            self.cache.refresh(key, entry.url, response.headers)
+            return entry.to_response()
+        if response.status_code == 200:
+            self.cache.set(key, response)
+        return response
         
     def _request_with_retry(
         self,
@@ -301,6 +425,7 @@ class NetworkClient:
         
         异常:
             DownloadError: 当请求在达到最大重试次数后仍然失败时抛出
+            NotFoundError: 最后一次请求返回404时抛出(RetryError的子类)
         
         工作流程:
             1. 应用速率限制，确保请求不会过于频繁
@@ -328,18 +453,27 @@ class NetworkClient:
         # 尝试重试
         tries = 0
         timeout = kwargs['timeout']
+        # 最后一次请求是否返回404
+        not_found = False
         
         while tries < self.max_retries:
+            not_found = False
             try:
                 # 速率限制
-                self.rate_limiter.wait()
+                self.rate_limiter.wait(url)
                 
                 logger.debug(f"Requesting {method} {url} (attempt {tries+1}/{self.max_retries})")
-                response = self.session.request(method, url, params=params, **kwargs)
+                # 本次请求使用的session,其他线程可能在请求期间更换self.session
+                session = self.session
+                response = session.request(method, url, params=params, **kwargs)
+                not_found = response.status_code == 404
                 
                 # 处理常见的HTTP状态码
                 if response.status_code == 200:
                     return response
+                elif response.status_code == 304:
+                    # 条件请求(缓存重新验证)的响应,由调用者处理
+                    return response
                 elif response.status_code == 404:
                     logger.warning(f"Resource not found (404): {url}")
                     tries += 1
@@ -349,7 +483,7 @@ class NetworkClient:
                     # 如果遇到访问被拒绝，可以尝试更换会话
                     if tries < self.max_retries - 1:
                         logger.info("Creating a new session and retrying...")
-                        self.session = self._create_session()
+                        self._renew_session(session)
                         # 增加等待时间，避免立即重试
                         sleep_time = self.retry_delay * (2 ** tries)
                         logger.info(f"Waiting {sleep_time} seconds before retry...")
@@ -403,29 +537,48 @@ class NetworkClient:
                 time.sleep(sleep_time)
         
         # 如果所有重试都失败了
+        if not_found:
+            raise NotFoundError(f"Resource not found (404): {url}")
         raise RetryError(f"Failed to {method.lower()} {url} after {self.max_retries} attempts")
     
     def download_file(
         self,
         url: str,
         save_path: str | Path,
-        chunk_size: int = 8192,
+        chunk_size: int = 65536,
+        segments: int = 1,
+        min_segment_size: int = 4 * 1024 * 1024,
+        checksum: str | None = None,
+        hash_algorithm: str = "sha256",
         **kwargs
     ) -> Path:
         """
-        Download a file with retries and rate limiting.
+        Download a file with retries, rate limiting and resume support.
+        
+        The data is written to "<save_path>.part" and renamed atomically once complete,
+        so an interrupted download never leaves a truncated file at save_path.
+        A retry (or a later call) continues the ".part" file with an HTTP Range request.
+        The URL and validator (ETag or Last-Modified) of the ".part" file are kept in
+        "<save_path>.part.meta"; a ".part" file is only resumed from the same URL with
+        If-Range, and is discarded when the server answers 200 or the validator changed.
         
         Args:
             url: URL to download
             save_path: Path to save the file
             chunk_size: Size of chunks for streaming download
+            segments: Number of parallel byte-range segments, used only when the server
+                advertises "Accept-Ranges: bytes" and the file is large enough
+            min_segment_size: Minimum size of each segment in bytes
+            checksum: Expected hex digest of the file, None to skip verification
+            hash_algorithm: hashlib algorithm used for checksum
             **kwargs: Additional request parameters
             
         Returns:
             Path to the downloaded file
             
         Raises:
-            DownloadError: If the download fails after retries
+            requests.RequestException: If the download fails after retries
+            DownloadError: If the checksum does not match
         """
         # Ensure save_path is a Path object
         if not isinstance(save_path, Path):
@@ -433,31 +586,135 @@ class NetworkClient:
         
         # Create parent directories if they don't exist
         save_path.parent.mkdir(parents=True, exist_ok=True)
+        part_path = save_path.with_name(save_path.name + ".part")
         
         logger.info(f"Downloading file from {url} to {save_path}")
         
-        # Apply rate limiting
-        self.rate_limiter.wait()
+        kwargs.pop('stream', None)
+        kwargs.setdefault('timeout', self.timeout)
         
-        # Set defaults for streaming download
-        kwargs['stream'] = True
+        meta_path = self._meta_path(part_path)
+        digest = None
+        if segments > 1:
+            total_size, validator = self._probe_range_support(url, **kwargs)
+            if total_size and validator and total_size >= 2 * min_segment_size:
+                segments = min(segments, total_size // min_segment_size)
+                try:
+                    digest = self._download_segments(
+                        url, part_path, total_size, segments, chunk_size, hash_algorithm, validator, **kwargs
+                    )
+                except (DownloadError, requests.RequestException) as e:
+                    logger.warning(f"Segmented download failed, fall back to a single stream: {e}")
+                    self._remove_segments(part_path)
+                    digest = None
+        if digest is None:
+            digest = self._download_stream(url, part_path, chunk_size, hash_algorithm, **kwargs)
+        
+        if checksum is not None and digest != checksum.lower():
+            part_path.unlink(missing_ok=True)
+            meta_path.unlink(missing_ok=True)
+            raise DownloadError(f"Checksum mismatch for {url}: expected {checksum}, got {digest}")
+        
+        os.replace(part_path, save_path)
+        meta_path.unlink(missing_ok=True)
+        logger.info(f"Successfully downloaded to {save_path}")
+        return save_path
+    
+    def _probe_range_support(self, url: str, **kwargs) -> tuple[int | None, str | None]:
+        """
+        使用HEAD请求检查服务器是否支持Range请求
+        
+        Returns:
+            (文件大小, 验证器),不支持时文件大小为None
+        """
+        self.rate_limiter.wait(url)
+        try:
+            response = self.session.head(url, allow_redirects=True, **kwargs)
+        except requests.RequestException as e:
+            logger.debug(f"HEAD request failed: {e}")
+            return None, None
+        if response.status_code != 200 or response.headers.get('Accept-Ranges', '').lower() != 'bytes':
+            return None, None
+        size = int(response.headers.get('Content-Length', 0))
+        return size or None, self._validator(response.headers)
+    
+    @staticmethod
+    def _remove_segments(part_path: Path) -> None:
+        for segment_path in part_path.parent.glob(f"{part_path.name}.*"):
+            if segment_path.suffix != ".meta":
+                segment_path.unlink()
+    
+    def _download_stream(
+        self,
+        url: str,
+        part_path: Path,
+        chunk_size: int,
+        hash_algorithm: str,
+        **kwargs
+    ) -> str:
+        """
+        下载到part_path,已经存在的部分使用Range请求续传
+        
+        Returns:
+            文件的hex digest
+        """
+        headers = dict(kwargs.pop('headers', None) or {})
         
-        # Try download with retries
         for attempt in range(self.max_retries):
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            validator = self._load_validator(part_path, url) if offset else None
+            if offset and validator is None:
+                # 无法确认part文件与服务器上的文件相同(例如来自另一个镜像),重新下载
+                logger.info(f"Discarding {part_path}: no validator for {url}")
+                part_path.unlink()
+                offset = 0
+            request_headers = dict(headers)
+            if offset:
+                request_headers['Range'] = f'bytes={offset}-'
+                request_headers['If-Range'] = validator
+            
+            self.rate_limiter.wait(url)
             try:
-                with self.session.get(url, **kwargs) as response:
+                with self.session.get(url, stream=True, headers=request_headers, **kwargs) as response:
+                    if offset and response.status_code == 206 and self._validator(response.headers) not in (None, validator):
+                        # 服务器上的文件已经改变
+                        logger.info(f"Discarding {part_path}: validator changed")
+                        part_path.unlink()
+                        continue
+                    if offset and response.status_code == 416:
+                        # Range超出文件大小,说明part文件已经完整或者已经失效
+                        content_range = response.headers.get('Content-Range', '')
+                        if content_range.endswith(f'/{offset}'):
+                            hasher = hashlib.new(hash_algorithm)
+                            self._hash_file(part_path, hasher, chunk_size)
+                            return hasher.hexdigest()
+                        part_path.unlink()
+                        continue
                     response.raise_for_status()
                     
-                    total_size = int(response.headers.get('content-length', 0))
-                    logger.debug(f"File size: {total_size} bytes")
+                    hasher = hashlib.new(hash_algorithm)
+                    if offset and response.status_code == 206:
+                        logger.info(f"Resuming download from byte {offset}")
+                        self._hash_file(part_path, hasher, chunk_size)
+                        mode = 'ab'
+                    else:
+                        # 200: 服务器忽略了Range或者If-Range不匹配,返回的是完整的新文件
+                        offset = 0
+                        mode = 'wb'
+                        self._save_validator(part_path, url, self._validator(response.headers))
                     
-                    with open(save_path, 'wb') as f:
+                    content_length = int(response.headers.get('content-length', 0))
+                    logger.debug(f"File size: {offset + content_length} bytes")
+                    
+                    with open(part_path, mode) as f:
                         for chunk in response.iter_content(chunk_size=chunk_size):
                             if chunk:
                                 f.write(chunk)
-                
-                logger.info(f"Successfully downloaded to {save_path}")
-                return save_path
+                                hasher.update(chunk)
+                    
+                    if content_length and part_path.stat().st_size < offset + content_length:
+                        raise requests.ConnectionError(f"Connection closed after {part_path.stat().st_size} of {offset + content_length} bytes")
+                return hasher.hexdigest()
                 
             except requests.RequestException as e:
                 logger.warning(f"Download failed (attempt {attempt+1}/{self.max_retries}): {e}")
@@ -468,8 +725,103 @@ class NetworkClient:
                     time.sleep(sleep_time)
                 else:
                     raise e
-    def get_soup(self,html:bytes) -> BeautifulSoup:
-        return BeautifulSoup(html, 'html.parser')
+        raise RetryError(f"Failed to download {url} after {self.max_retries} attempts")
+    
+    def _download_segment(
+        self,
+        url: str,
+        segment_path: Path,
+        start: int,
+        end: int,
+        chunk_size: int,
+        validator: str,
+        **kwargs
+    ) -> None:
+        """
+        下载[start, end]字节到segment_path,已经存在的部分会续传
+        
+        文件改变时服务器对If-Range返回200,此时抛出DownloadError
+        """
+        headers = dict(kwargs.pop('headers', None) or {})
+        length = end - start + 1
+        
+        for attempt in range(self.max_retries):
+            done = segment_path.stat().st_size if segment_path.exists() else 0
+            if done >= length:
+                return
+            request_headers = {**headers, 'Range': f'bytes={start + done}-{end}', 'If-Range': validator}
+            
+            self.rate_limiter.wait(url)
+            try:
+                with self.session.get(url, stream=True, headers=request_headers, **kwargs) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise DownloadError(f"Server ignored the Range header (status {response.status_code})")
+                    with open(segment_path, 'ab') as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                if segment_path.stat().st_size >= length:
+                    return
+                raise requests.ConnectionError(f"Segment {start}-{end} closed early")
+            
+            except requests.RequestException as e:
+                logger.warning(f"Segment {start}-{end} failed (attempt {attempt+1}/{self.max_retries}): {e}")
+                if attempt < self.max_retries - 1:
+                    time.sleep(self.retry_delay * (2 ** attempt))
+                else:
+                    raise e
+    
+    def _download_segments(
+        self,
+        url: str,
+        part_path: Path,
+        total_size: int,
+        segments: int,
+        chunk_size: int,
+        hash_algorithm: str,
+        validator: str,
+        **kwargs
+    ) -> str:
+        """
+        将文件分成segments段并行下载,完成后按顺序合并到part_path
+        
+        每一段写入"<part_path>.<序号>",中断后再次调用时,URL和验证器没有改变的情况下每一段会各自续传
+        
+        Returns:
+            文件的hex digest
+        """
+        if self._load_validator(part_path, url) != validator:
+            self._remove_segments(part_path)
+            part_path.unlink(missing_ok=True)
+        self._save_validator(part_path, url, validator)
+        
+        step = -(-total_size // segments)
+        ranges = [(start, min(start + step, total_size) - 1) for start in range(0, total_size, step)]
+        segment_paths = [part_path.with_name(f"{part_path.name}.{i}") for i in range(len(ranges))]
+        logger.info(f"Downloading {total_size} bytes in {len(ranges)} segments")
+        
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [
+                executor.submit(self._download_segment, url, path, start, end, chunk_size, validator, **kwargs)
+                for path, (start, end) in zip(segment_paths, ranges)
+            ]
+            for future in futures:
+                future.result()
+        
+        hasher = hashlib.new(hash_algorithm)
+        with open(part_path, 'wb') as f:
+            for path, (start, end) in zip(segment_paths, ranges):
+                with open(path, 'rb') as segment:
+                    remaining = end - start + 1
+                    while remaining > 0 and (chunk := segment.read(min(chunk_size, remaining))):
+                        f.write(chunk)
+                        hasher.update(chunk)
+                        remaining -= len(chunk)
+        for path in segment_paths:
+            path.unlink()
+        return hasher.hexdigest()
+    
     # def post(
     #     self,
     #     url: str,
@@ -0,0 +1,274 @@
+"""
+按主机共享的令牌桶速率限制
+
+同一个进程中访问相同主机、并且限制(limits)相同的客户端共享同一个令牌桶,
+线程和协程都通过"先预约,再睡眠"的方式排队,不会在锁内睡眠。
+限制不同的客户端使用各自的令牌桶,例如使用默认network.rate_limit的客户端
+不会拖慢显式设置了更快窗口的WileyClient;需要对某个主机强制统一限制时使用set_host_limits。
+
+如果提供了ledger(SQLite文件路径),令牌状态保存在该文件中,
+同一台机器上的多个进程可以共享同一份速率预算。
+
+示例：
+    # wiley最多每秒3个请求，每10分钟60个请求
+    limiter = RateLimiter(limits=[(3, 1.0), (60, 600.0)])
+    limiter.wait("https://api.wiley.com/onlinelibrary/tdm/v1/articles/xxx")
+
+    # 多个run_year进程共享Google Scholar的速率预算
+    limiter = RateLimiter(45, ledger="~/.sciretriever/ratelimit.db")
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+from ..utils.config import get_config
+from ..utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# (请求数, 秒数), 例如(3, 1.0)表示每秒最多3个请求
+Limit = tuple[float, float]
+
+
+class TokenBucket:
+    """
+    多窗口令牌桶
+
+    每个窗口(capacity, period)容量为capacity,每period秒补充capacity个令牌,
+    一次请求需要所有窗口各消耗一个令牌。令牌允许透支,透支的部分就是调用者需要等待的时间,
+    因此多个调用者会依次预约到不同的时间点。
+    注意:窗口允许一次突发capacity个请求,之后按照capacity/period的速度匀速放行。
+    """
+
+    def __init__(self, limits: list[Limit]):
+        self._lock = threading.Lock()
+        self.limits: list[Limit] = []
+        self._tokens: list[float] = []
+        self._updated: float = time.monotonic()
+        self.add_limits(limits)
+
+    def add_limits(self, limits: list[Limit]) -> None:
+        """添加新的窗口,已经存在的窗口会被忽略"""
+        with self._lock:
+            for capacity, period in limits:
+                limit = (float(capacity), float(period))
+                if limit[0] <= 0 or limit[1] <= 0 or limit in self.limits:
+                    continue
+                self.limits.append(limit)
+                self._tokens.append(limit[0])
+
+    def reserve(self) -> float:
+        """
+        预约一次请求
+
+        Returns:
+            调用者在发送请求之前需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+
+            delay = 0.0
+            for i, (capacity, period) in enumerate(self.limits):
+                rate = capacity / period
+                tokens = min(capacity, self._tokens[i] + elapsed * rate) - 1
+                self._tokens[i] = tokens
+                if tokens < 0:
+                    delay = max(delay, -tokens / rate)
+            return delay
+
+
+class LedgerTokenBucket:
+    """
+    保存在SQLite文件中的多窗口令牌桶,接口与TokenBucket相同
+
+    每个(host, capacity, period)窗口在rate_limit_ledger表中占一行,
+    reserve()在BEGIN IMMEDIATE事务中读取并更新该host的所有窗口,
+    SQLite的文件锁保证多个进程之间的预约是原子的。
+    host是get_host_bucket生成的"主机#限制"键,限制相同的进程共享同一组窗口。
+    """
+
+    def __init__(self, path: str | Path, host: str, limits: list[Limit]):
+        self.path: Path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.host: str = host
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_ledger ("
+            "host TEXT NOT NULL, capacity REAL NOT NULL, period REAL NOT NULL, "
+            "tokens REAL NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (host, capacity, period))"
+        )
+        self.add_limits(limits)
+
+    @property
+    def limits(self) -> list[Limit]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT capacity, period FROM rate_limit_ledger WHERE host = ?", (self.host,)
+            ).fetchall()
+        return [(capacity, period) for capacity, period in rows]
+
+    def add_limits(self, limits: list[Limit]) -> None:
+        """添加新的窗口,已经存在的窗口会被忽略"""
+        rows = [
+            (self.host, float(capacity), float(period), float(capacity), time.time())
+            for capacity, period in limits
+            if capacity > 0 and period > 0
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO rate_limit_ledger (host, capacity, period, tokens, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def reserve(self) -> float:
+        """
+        预约一次请求
+
+        Returns:
+            调用者在发送请求之前需要等待的秒数
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 不同进程之间只能使用墙上时间
+                now = time.time()
+                rows = self._conn.execute(
+                    "SELECT capacity, period, tokens, updated FROM rate_limit_ledger WHERE host = ?",
+                    (self.host,),
+                ).fetchall()
+                delay = 0.0
+                updates = []
+                for capacity, period, tokens, updated in rows:
+                    rate = capacity / period
+                    tokens = min(capacity, tokens + max(0.0, now - updated) * rate) - 1
+                    updates.append((tokens, now, self.host, capacity, period))
+                    if tokens < 0:
+                        delay = max(delay, -tokens / rate)
+                self._conn.executemany(
+                    "UPDATE rate_limit_ledger SET tokens = ?, updated = ? "
+                    "WHERE host = ? AND capacity = ? AND period = ?",
+                    updates,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            return delay
+
+
+# 进程内共享的令牌桶, key为(ledger路径, 主机, 限制)
+_HOST_BUCKETS: dict[tuple[str, str, tuple[Limit, ...]], TokenBucket | LedgerTokenBucket] = {}
+# set_host_limits设置的限制,优先于客户端自己的限制
+_HOST_OVERRIDES: dict[str, TokenBucket] = {}
+_HOST_BUCKETS_LOCK = threading.Lock()
+
+
+def _limits_key(limits: list[Limit]) -> tuple[Limit, ...]:
+    return tuple(sorted({(float(capacity), float(period)) for capacity, period in limits}))
+
+
+def get_host_bucket(
+    host: str,
+    limits: list[Limit],
+    ledger: str | Path | None = None,
+) -> TokenBucket | LedgerTokenBucket:
+    """
+    获取某个主机的令牌桶
+
+    令牌桶按照(主机, 限制)区分:限制相同的客户端共享预算,限制不同的客户端互不影响。
+    set_host_limits设置过的主机总是使用该限制(不使用ledger时)。
+    提供ledger时令牌桶保存在该SQLite文件中,由所有限制相同的进程共享。
+    """
+    limits_key = _limits_key(limits)
+    key = (str(Path(ledger).expanduser()) if ledger else "", host, limits_key)
+    with _HOST_BUCKETS_LOCK:
+        if not ledger and host in _HOST_OVERRIDES:
+            return _HOST_OVERRIDES[host]
+        bucket = _HOST_BUCKETS.get(key)
+        if bucket is None:
+            if ledger:
+                ledger_host = host + "#" + ",".join(f"{capacity:g}/{period:g}" for capacity, period in limits_key)
+                bucket = LedgerTokenBucket(ledger, ledger_host, list(limits_key))
+            else:
+                bucket = TokenBucket(list(limits_key))
+            _HOST_BUCKETS[key] = bucket
+        return bucket
+
+
+def set_host_limits(host: str, limits: list[Limit]) -> TokenBucket:
+    """显式设置某个主机在本进程内的限制,所有客户端对该主机的请求都使用这一个令牌桶"""
+    bucket = TokenBucket(limits)
+    with _HOST_BUCKETS_LOCK:
+        _HOST_OVERRIDES[host.lower()] = bucket
+    return bucket
+
+
+class RateLimiter:
+    """限制对服务器请求速率的类"""
+
+    def __init__(
+        self,
+        rate_limit: float|None = None,
+        limits: list[Limit]|None = None,
+        ledger: str|Path|None = None,
+    ):
+        """
+        Initialize rate limiter.
+
+        Args:
+            rate_limit: Minimum seconds between requests, None to use config
+            limits: Extra (requests, seconds) windows, e.g. [(3, 1.0), (60, 600.0)].
+                When limits is given and rate_limit is None, only the windows are used.
+            ledger: SQLite file shared by several processes, None to use config
+                ("session.rate_limit_ledger"); without a ledger the budget is per process
+        """
+        self.config = get_config()
+        self.ledger:str|Path|None = ledger or self.config.get("session.rate_limit_ledger")
+        self.rate_limit:float = rate_limit or self.config.get("network.rate_limit", 5.0)
+        self.limits:list[Limit] = list(limits or [])
+        if rate_limit is not None or not self.limits:
+            self.limits.insert(0, (1, self.rate_limit))
+        # 没有提供url时使用该限制器自己的令牌桶
+        self._bucket:TokenBucket = TokenBucket(self.limits)
+
+    def bucket(self, url: str|None = None) -> TokenBucket|LedgerTokenBucket:
+        """返回url所属主机的令牌桶"""
+        host = urlparse(url).netloc.lower() if url else ""
+        if not host:
+            return self._bucket
+        return get_host_bucket(host, self.limits, self.ledger)
+
+    def reserve(self, url: str|None = None) -> float:
+        """预约一次请求,返回需要等待的秒数"""
+        return self.bucket(url).reserve()
+
+    def wait(self, url: str|None = None):
+        """Wait if necessary to respect rate limit."""
+        sleep_time = self.reserve(url)
+        if sleep_time > 0:
+            logger.info(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
+            time.sleep(sleep_time)
+
+    async def wait_async(self, url: str|None = None):
+        """
+        Asyncio version of wait().
+
+        使用ledger时预约是一个SQLite写事务(BEGIN IMMEDIATE,可能等待其他进程最多60秒),
+        在线程中执行,不会阻塞事件循环中的其他协程
+        """
+        if self.ledger:
+            sleep_time = await asyncio.to_thread(self.reserve, url)
+        else:
+            sleep_time = self.reserve(url)
+        if sleep_time > 0:
+            logger.info(f"Rate limiting: sleeping for {sleep_time:.2f} seconds")
+            await asyncio.sleep(sleep_time)
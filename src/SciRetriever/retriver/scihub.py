@@ -3,6 +3,7 @@ from bs4 import BeautifulSoup
 import requests
 from .retriver import BaseRetriver
 from ..network import NetworkClient, Proxy
+from ..utils.exceptions import NotFoundError
 from ..utils.logging import get_logger
 import urllib
 logger = get_logger(__name__)
@@ -67,7 +68,10 @@ class ScihubClient(NetworkClient):
     #     url = self.base_url + doi
     #     response = self.get(url)
     #     return response
-    def download_doi(self,doi:str,file_path:Path|str) -> None:
+    def download_doi(self,doi:str,file_path:Path|str,**kwargs) -> None:
+        """
+        kwargs会传给download_file,例如segments、checksum
+        """
         path = Path(file_path)
         
         for available_base_url in self.available_urls:
@@ -91,10 +95,10 @@ class ScihubClient(NetworkClient):
             download_button = download_panel.find('div', class_='download')
             a = download_button.find('a')
             url = a.get('href') if not a.get('href').startswith('/') else self.base_url.rstrip("/") + a.get('href')
-            self.download_file(url=url,save_path=path)
+            self.download_file(url=url,save_path=path,**kwargs)
         else:
             logger.info(f"scihub中没有文章{doi}，跳过下载")
-            raise Exception(f"scihub中没有文章{doi}，跳过下载")
+            raise NotFoundError(f"scihub中没有文章{doi}，跳过下载")
 
 class ScihubRetriver(BaseRetriver):
     def __init__(
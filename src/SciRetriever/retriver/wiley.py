@@ -1,7 +1,7 @@
 from pathlib import Path
 import requests
 from .retriver import BaseRetriver
-from ..network import NetworkClient, Proxy
+from ..network import NetworkClient, Proxy, RateLimiter
 from ..utils.logging import get_logger
 import urllib
 logger = get_logger(__name__)
@@ -10,6 +10,7 @@ logger = get_logger(__name__)
 https://onlinelibrary.wiley.com/library-info/resources/text-and-datamining#accordionHeader-2
 wiley最多每秒3个请求，每10分钟60个请求，请注意速率限制！
 '''
+_WILEY_LIMITS = [(3, 1.0), (60, 600.0)]
 
 
 class WileyClient(NetworkClient):
@@ -50,15 +51,20 @@ class WileyClient(NetworkClient):
         )
         self.api_key = api_key
         self.base_url = "https://api.wiley.com/onlinelibrary/tdm/v1/articles/"
+        # 所有访问api.wiley.com的客户端共享同一个配额
+        self.rate_limiter = RateLimiter(rate_limit, limits=_WILEY_LIMITS)
         headers = {
             "Wiley-TDM-Client-Token":api_key,
         }
         self.update_headers(headers)
         
-    def download_doi(self,doi,file_path:Path|str):
+    def download_doi(self,doi,file_path:Path|str,**kwargs):
+        """
+        kwargs会传给download_file,例如segments、checksum
+        """
         path = Path(file_path)
         url = self.base_url + urllib.parse.quote(doi)
-        self.download_file(url=url,save_path=path)
+        self.download_file(url=url,save_path=path,**kwargs)
 
 # 目前是多余的
 class WileyRetriver(BaseRetriver):
@@ -1,9 +1,11 @@
-from typing import Any
+import asyncio
+from typing import Any, Iterable
 
 
 import requests
+from ..model.batch import PaperBatch
 from ..model.paper import PaperMetadata
-from ..network import NetworkClient, Proxy
+from ..network import AsyncNetworkClient, NetworkClient, Proxy
 from ..utils.exceptions import SearchError, RateLimitError, SciRetrieverError
 from ..utils.logging import get_logger, setup_logging
 from .searcher import BaseSearcher
@@ -115,8 +117,8 @@ class CRClient(NetworkClient):
         crossref = Crossref.from_works(response=response, params=params, session=self)
         return crossref
 
+    @staticmethod
     def _build_params(
-        self,
         query_params: dict[str, str] | None = None,
         filters: dict[str, Any] | None = None,
         sort: dict[str, Any] | None = None,
@@ -174,6 +176,111 @@ class CRClient(NetworkClient):
         raise SciRetrieverError(f"Crossref API请求失败：{str(error)}") from error
 
 
+class AsyncCRClient(AsyncNetworkClient):
+    """
+    CRClient的异步版本,用于同时查询大量DOI,需要安装aiohttp
+
+    示例：
+    async with AsyncCRClient(email="xxx@xxx.com", max_connections_per_host=20) as client:
+        batch = await client.get_batch_by_dois(dois)
+
+    额外参数：
+        email: 邮箱
+    """
+
+    def __init__(
+        self,
+        email: str,
+        rate_limit: float | None = None,
+        max_retries: int | None = None,
+        retry_delay: float | None = None,
+        timeout: float | None = None,
+        user_agent: str | None = None,
+        use_proxy: bool = False,
+        proxy: Proxy | None = None,
+        headers: dict[str, str] | None = None,
+        allow_redirects: bool = True,
+        cookie: dict[str, str] | None = None,
+        verify: bool = False,
+        max_connections: int | None = None,
+        max_connections_per_host: int | None = None,
+    ) -> None:
+        super().__init__(
+            use_proxy=use_proxy,
+            proxy=proxy,
+            headers=headers,
+            allow_redirects=allow_redirects,
+            cookie=cookie,
+            verify=verify,
+            rate_limit=rate_limit,
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            timeout=timeout,
+            user_agent=user_agent,
+            max_connections=max_connections,
+            max_connections_per_host=max_connections_per_host,
+        )
+        self.email = email
+        self.base_url = "https://api.crossref.org"
+        self.update_headers({"mailto": self.email})
+
+    async def get_works_page(
+        self,
+        query_params: dict[str, str] | None = None,
+        filters: dict[str, Any] | None = None,
+        sort: dict[str, str] | None = None,
+        max_results: int = 1000,
+        cursor: str | None = None,
+    ) -> dict[str, Any]:
+        """
+        获取一页Works,参数与CRClient.get_works相同
+
+        返回:
+        响应中的message,下一页的游标为message["next-cursor"]
+        """
+        params = CRClient._build_params(
+            query_params=query_params,
+            filters=filters,
+            sort=sort,
+            max_results=max_results,
+            cursor=cursor,
+        )
+        response = await self.get(url=self.base_url + "/works", params=params)
+        return (await response.json())["message"]
+
+    async def get_works_by_doi(self, doi: str) -> dict:
+        """
+        根据DOI获取论文信息,返回值与CRClient.get_works_by_doi相同
+        """
+        response = await self.get(url=self.base_url + f"/works/{doi}")
+        return await response.json()
+
+    async def get_items_by_dois(self, dois: Iterable[str]) -> list[dict[str, Any] | None]:
+        """
+        并发查询多个DOI,同时进行的请求数由连接池和速率限制控制
+
+        返回:
+        与dois顺序相同的item列表,查询失败的DOI为None
+        """
+        dois = list(dois)
+        results = await asyncio.gather(*(self.get_works_by_doi(doi) for doi in dois), return_exceptions=True)
+        items: list[dict[str, Any] | None] = []
+        for doi, result in zip(dois, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to get {doi} from Crossref: {result}")
+                items.append(None)
+            else:
+                items.append(result["message"])
+        return items
+
+    async def get_batch_by_dois(self, dois: Iterable[str]) -> PaperBatch:
+        """
+        并发查询多个DOI并按列导出,查询失败的DOI被跳过
+        """
+        items = await self.get_items_by_dois(dois)
+        return PaperBatch.from_crossref(item for item in items if item is not None)
+
+
 class Crossref:
     def __init__(
         self,
@@ -228,57 +335,39 @@ class Crossref:
         )
 
     def items2papers(self, item: dict[str, Any]) -> PaperMetadata:
-        title = item.get("title", [None])[0]
-        authors = self.get_authors(item.get("author", []))
-        abstract = item.get("abstract")
-        doi = item.get("DOI")
-        url = item.get("URL")
-        publisher = item.get("publisher")
-        pub_year = self.get_year(item)
-        journal = item.get("container-title", [None])[0]
-        volume = item.get("volume")
-        issue = item.get("issue")
-        pages = item.get("page")
-        keywords = None
-        paper_metadata = item
-        type = item.get("type")
-        source = item.get("source")
-
-        pdf_downloaded = False
-        pdf_path = None
-        download_data = None
-        pdf_url = None
-        citations_num = item.get("is-referenced-by-count", 0)
-        notes = None
-        references = None
-        citations = None
-
-        return PaperMetadata(
-            title=title,
-            authors=authors,
-            abstract=abstract,
-            doi=doi,
-            url=url,
-            publisher=publisher,
-            pub_year=pub_year,
-            journal=journal,
-            volume=volume,
-            issue=issue,
-            pages=pages,
-            keywords=keywords,
-            paper_metadata=paper_metadata,
-            type=type,
-            source=source,
-            pdf_downloaded=pdf_downloaded,
-            pdf_path=pdf_path,
-            pdf_url=pdf_url,
-            citations_num=citations_num,
-            notes=notes,
-            references=references,
-            citations=citations,
-        )
+        return PaperMetadata(**self.item2row(item), references=None, citations=None)
 
-    def get_year(self, item: dict[str, Any]) -> int | None:
+    @classmethod
+    def item2row(cls, item: dict[str, Any]) -> dict[str, Any]:
+        """
+        将Crossref的item转换为PaperMetadata的字段字典(papers表的一行),
+        items2papers和PaperBatch.from_crossref共用
+        """
+        return {
+            "title": item.get("title", [None])[0],
+            "authors": cls.get_authors(item.get("author", [])),
+            "abstract": item.get("abstract"),
+            "doi": item.get("DOI"),
+            "url": item.get("URL"),
+            "publisher": item.get("publisher"),
+            "pub_year": cls.get_year(item),
+            "journal": item.get("container-title", [None])[0],
+            "volume": item.get("volume"),
+            "issue": item.get("issue"),
+            "pages": item.get("page"),
+            "keywords": None,
+            "paper_metadata": item,
+            "type": item.get("type"),
+            "source": item.get("source"),
+            "pdf_downloaded": False,
+            "pdf_path": None,
+            "pdf_url": None,
+            "citations_num": item.get("is-referenced-by-count", 0),
+            "notes": None,
+        }
+
+    @staticmethod
+    def get_year(item: dict[str, Any]) -> int | None:
         """
         获取年份
         """
@@ -298,7 +387,14 @@ class Crossref:
         )
         return papers
 
-    def get_authors(self, crossref_author):
+    def export_batch(self) -> PaperBatch:
+        """
+        按列导出论文,不创建PaperMetadata对象
+        """
+        return PaperBatch.from_crossref(self.items or [])
+
+    @staticmethod
+    def get_authors(crossref_author):
         author_names: list[str] = []
         for idx, author in enumerate(crossref_author):
             try:
@@ -1,35 +1,230 @@
+import os
 import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import List
+from itertools import islice
+from typing import Any, Iterable, Iterator, List, Optional
+
+try:
+    import ahocorasick
+    AHOCORASICK = True
+except ImportError:
+    AHOCORASICK = False
+
+
+def trie_pattern(terms: Iterable[str]) -> str:
+    """
+    将多个词合并为按前缀分解的正则表达式，例如 ["cat", "car", "dog"] -> (?:ca(?:t|r)|dog)。
+    Python的re对普通的 a|b|c 逐个尝试每个分支，按前缀分解后每个位置只需要比较少量字符。
+    """
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        # 结束标记表示到这里已经是一个完整的词
+        optional = "" in node
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        # 长分支在前，保证同一位置优先匹配最长的词
+        group = "(?:" + "|".join(sorted(branches, key=len, reverse=True)) + ")"
+        return group + "?" if optional else group
+
+    return build(trie)
+
+
+class TermMatcher:
+    """
+    子串匹配器。
+    安装了pyahocorasick时使用Aho-Corasick自动机，一次扫描文本即可判断是否包含任一词；
+    否则逐个使用预先转为小写的词做子串查找(str的子串查找比正则表达式的多分支匹配更快)。
+    传入的文本必须已经转为小写。
+    """
+    def __init__(self, terms: Iterable[str]):
+        # 去重并保持顺序
+        self.terms: tuple[str, ...] = tuple(dict.fromkeys(term.lower() for term in terms if term))
+        self._automaton = None
+        if self.terms and AHOCORASICK:
+            self._automaton = ahocorasick.Automaton()
+            for term in self.terms:
+                self._automaton.add_word(term, term)
+            self._automaton.make_automaton()
+
+    def __getstate__(self):
+        # 只传递词表，自动机在接收方重新构建
+        return {"terms": self.terms}
+
+    def __setstate__(self, state):
+        self.__init__(state["terms"])
+
+    def search(self, text_lower: str) -> Optional[str]:
+        """返回第一个命中的词，没有命中时返回None"""
+        if self._automaton is not None:
+            for _, term in self._automaton.iter(text_lower):
+                return term
+            return None
+        for term in self.terms:
+            if term in text_lower:
+                return term
+        return None
+
+    def findall(self, text_lower: str) -> Counter:
+        """
+        统计每个词在文本中出现的次数。
+        与Aho-Corasick自动机相同，重叠的出现也分别计数("aa"在"aaa"中出现2次)。
+        """
+        if self._automaton is not None:
+            return Counter(term for _, term in self._automaton.iter(text_lower))
+        counts = Counter()
+        for term in self.terms:
+            start = text_lower.find(term)
+            while start != -1:
+                counts[term] += 1
+                start = text_lower.find(term, start + 1)
+        return counts
+
+
+class WordMatcher:
+    """
+    全词匹配器：所有词合并为一个按前缀分解并预编译的 \\b(...)\\b 正则表达式。
+    传入的文本必须已经转为小写。
+    """
+    def __init__(self, terms: Iterable[str]):
+        self.terms: tuple[str, ...] = tuple(dict.fromkeys(term.lower() for term in terms if term))
+        self._pattern: Optional[re.Pattern] = None
+        if self.terms:
+            self._pattern = re.compile(r'\b(' + trie_pattern(self.terms) + r')\b')
+
+    def __getstate__(self):
+        return {"terms": self.terms}
+
+    def __setstate__(self, state):
+        self.__init__(state["terms"])
+
+    def search(self, text_lower: str) -> Optional[str]:
+        """返回第一个命中的词，没有命中时返回None"""
+        if self._pattern is None:
+            return None
+        found = self._pattern.search(text_lower)
+        return found.group(1) if found else None
+
+    def findall(self, text_lower: str) -> Counter:
+        """统计每个词在文本中作为完整单词出现的次数"""
+        if self._pattern is None:
+            return Counter()
+        return Counter(found.group(1) for found in self._pattern.finditer(text_lower))
+
 
 @dataclass
 class KeywordGroup:
     """
     定义一个筛选维度（例如：'金属类型' 或 '发光性质'）。
     逻辑：组内是 OR 关系（命中任意一个词即可）。
+    词表在创建时编译一次，创建后修改了strict_terms或fuzzy_terms需要调用compile()。
     """
     name: str  # 组名，方便调试，如 "Research Object"
     strict_terms: List[str] = field(default_factory=list)  # 需要全词匹配的词 (如 "Co", "AI", "C")
     fuzzy_terms: List[str] = field(default_factory=list)   # 可以模糊匹配的词 (如 "Cobalt", "Machine Learning")
 
-    def match(self, text: str) -> bool:
-        """判断文本是否命中该组"""
-        text_lower = text.lower()
+    def __post_init__(self):
+        self.compile()
+
+    def compile(self) -> None:
+        """编译匹配器"""
+        self._fuzzy = TermMatcher(self.fuzzy_terms)
+        self._strict = WordMatcher(self.strict_terms)
 
+    def match_lower(self, text_lower: str) -> bool:
+        """判断已经转为小写的文本是否命中该组"""
         # 1. 模糊匹配 (Substring match)
         # 适用于长难词，效率高
-        if any(term.lower() in text_lower for term in self.fuzzy_terms):
+        if self._fuzzy.search(text_lower) is not None:
             return True
 
         # 2. 严格全词匹配 (Regex Word Boundary)
         # 适用于短词、缩写，防止噪音
-        if self.strict_terms:
-            # 构造正则: \b(Co|Fe|NO)\b，忽略大小写
-            pattern = r'\b(' + '|'.join(re.escape(w) for w in self.strict_terms) + r')\b'
-            if re.search(pattern, text, re.IGNORECASE):
-                return True
-        
-        return False
+        return self._strict.search(text_lower) is not None
+
+    def hits_lower(self, text_lower: str) -> Counter:
+        """统计已经转为小写的文本中该组每个词命中的次数"""
+        return self._fuzzy.findall(text_lower) + self._strict.findall(text_lower)
+
+    def match(self, text: str) -> bool:
+        """判断文本是否命中该组"""
+        return self.match_lower(text.lower())
+
+    def check_many(self, texts: Iterable[str]) -> List[bool]:
+        """批量判断，每个文本只转换一次小写"""
+        return [bool(text) and self.match_lower(text.lower()) for text in texts]
+
+
+@dataclass
+class FilterResult:
+    """
+    一次筛选的详细结果
+    passed: 是否通过筛选，与UniversalFilter.check的结果相同
+    excluded_by: 命中的黑名单词及次数
+    hits: 每个组命中的词及次数
+    missing_groups: 没有命中的组
+    """
+    passed: bool
+    excluded_by: dict[str, int] = field(default_factory=dict)
+    hits: dict[str, dict[str, int]] = field(default_factory=dict)
+    missing_groups: List[str] = field(default_factory=list)
+
+    @property
+    def score(self) -> int:
+        """所有组命中词的总次数，可以用来给通过筛选的论文排序"""
+        return sum(sum(terms.values()) for terms in self.hits.values())
+
+
+@dataclass
+class FilterStats:
+    """
+    一批文本的筛选统计，次数均为命中的文本数(同一个文本中出现多次只计一次)
+    total: 文本总数
+    passed: 通过筛选的文本数
+    excluded: 被黑名单排除的文本数
+    group_hits: 每个组命中的文本数
+    term_hits: 每个(组名, 词)命中的文本数，黑名单的组名为"exclude"
+    sole_hits: 每个(组名, 词)是该组唯一命中词的文本数，为0的词删除后不会改变该组的结果
+    """
+    total: int = 0
+    passed: int = 0
+    excluded: int = 0
+    group_hits: Counter = field(default_factory=Counter)
+    term_hits: Counter = field(default_factory=Counter)
+    sole_hits: Counter = field(default_factory=Counter)
+
+    def add(self, result: FilterResult) -> None:
+        self.total += 1
+        self.passed += result.passed
+        self.excluded += bool(result.excluded_by)
+        for term in result.excluded_by:
+            self.term_hits[("exclude", term)] += 1
+        for name, terms in result.hits.items():
+            self.group_hits[name] += 1
+            for term in terms:
+                self.term_hits[(name, term)] += 1
+            if len(terms) == 1:
+                self.sole_hits[(name, next(iter(terms)))] += 1
+
+    def unused_terms(self, universal_filter: "UniversalFilter") -> List[tuple[str, str]]:
+        """没有命中任何文本的(组名, 词)"""
+        unused = [("exclude", term) for term in universal_filter._exclude.terms if not self.term_hits[("exclude", term)]]
+        for group in universal_filter.groups:
+            for term in (*group._fuzzy.terms, *group._strict.terms):
+                if not self.term_hits[(group.name, term)]:
+                    unused.append((group.name, term))
+        return unused
+
 
 class UniversalFilter:
     """
@@ -41,21 +236,129 @@ class UniversalFilter:
     def __init__(self, required_groups: List[KeywordGroup], exclude_terms: List[str] = None):
         self.groups = required_groups
         self.exclude_terms = exclude_terms if exclude_terms else []
+        self._exclude = TermMatcher(self.exclude_terms)
 
-    def check(self, text: str) -> bool:
-        if not text:
-            return False
-        
-        text_lower = text.lower()
+    def compile(self) -> None:
+        """修改了exclude_terms或者组的词表之后重新编译"""
+        self._exclude = TermMatcher(self.exclude_terms)
+        for group in self.groups:
+            group.compile()
 
+    def check_lower(self, text_lower: str) -> bool:
+        """判断已经转为小写的文本是否满足条件"""
         # 1. 检查黑名单 (Veto logic)
-        if any(bad_word.lower() in text_lower for bad_word in self.exclude_terms):
+        if self._exclude.search(text_lower) is not None:
             return False
 
         # 2. 检查所有必须满足的组 (Intersection logic)
         # 必须所有组都返回 True，结果才为 True
         for group in self.groups:
-            if not group.match(text):
+            if not group.match_lower(text_lower):
                 return False  # 只要有一个组没命中，直接失败
-        
+
         return True
+
+    def check(self, text: str) -> bool:
+        if not text:
+            return False
+        return self.check_lower(text.lower())
+
+    def check_many(self, texts: Iterable[str]) -> List[bool]:
+        """
+        批量筛选，返回与texts顺序一致的结果。
+        每个文本只转换一次小写，所有组共享同一个小写文本。
+        """
+        check_lower = self.check_lower
+        return [bool(text) and check_lower(text.lower()) for text in texts]
+
+    def explain(self, text: str) -> FilterResult:
+        """
+        返回命中了哪些组和哪些词以及次数，passed与check的结果相同。
+        所有组和黑名单都会完整扫描一次(不提前结束)，以便统计。
+        """
+        if not text:
+            return FilterResult(passed=False, missing_groups=[group.name for group in self.groups])
+        text_lower = text.lower()
+        excluded_by = dict(self._exclude.findall(text_lower))
+        hits = {}
+        missing_groups = []
+        for group in self.groups:
+            terms = group.hits_lower(text_lower)
+            if terms:
+                hits[group.name] = dict(terms)
+            else:
+                missing_groups.append(group.name)
+        return FilterResult(
+            passed=not excluded_by and not missing_groups,
+            excluded_by=excluded_by,
+            hits=hits,
+            missing_groups=missing_groups,
+        )
+
+    def explain_many(self, texts: Iterable[str]) -> List[FilterResult]:
+        """批量explain"""
+        return [self.explain(text) for text in texts]
+
+    def stats(self, texts: Iterable[str]) -> FilterStats:
+        """
+        统计一批文本中每个组和每个词的命中情况，用于删除无用的词或者收紧条件。
+
+        示例：
+            stats = my_filter.stats(paper_text(paper) for paper in sample)
+            print(stats.passed / stats.total, stats.unused_terms(my_filter))
+        """
+        stats = FilterStats()
+        for text in texts:
+            stats.add(self.explain(text))
+        return stats
+
+    def check_parallel(
+        self,
+        items: Iterable[Any],
+        workers: Optional[int] = None,
+        batch_size: int = 5000,
+    ) -> Iterator[bool]:
+        """
+        使用多进程筛选大量文本，按照输入的顺序逐个返回结果。
+
+        过滤器只在每个子进程启动时传递一次，输入按batch_size分批发送，
+        同时最多有2*workers批在处理中，因此输入可以是任意长度的生成器。
+
+        Args:
+            items: 文本或者带有title/abstract属性的对象(例如PaperMetadata、Paper)
+            workers: 进程数，默认为CPU核数
+            batch_size: 每批发送给子进程的文本数
+
+        示例：
+            mask = list(my_filter.check_parallel(paper_text for paper in papers))
+        """
+        workers = workers or os.cpu_count() or 1
+        texts = (item if isinstance(item, str) or item is None else paper_text(item) for item in items)
+        batches = iter(lambda: list(islice(texts, batch_size)), [])
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+            pending = deque()
+            for batch in batches:
+                pending.append(executor.submit(_check_batch, batch))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+
+def paper_text(paper: Any) -> str:
+    """论文用于筛选的文本：标题 + 摘要"""
+    return f"{getattr(paper, 'title', None) or ''} {getattr(paper, 'abstract', None) or ''}"
+
+
+# 子进程中的过滤器，由_init_worker在进程启动时设置
+_WORKER_FILTER: Optional[UniversalFilter] = None
+
+
+def _init_worker(universal_filter: UniversalFilter) -> None:
+    global _WORKER_FILTER
+    _WORKER_FILTER = universal_filter
+
+
+def _check_batch(texts: List[Optional[str]]) -> List[bool]:
+    return _WORKER_FILTER.check_many(texts)
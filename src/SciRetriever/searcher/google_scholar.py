@@ -7,19 +7,26 @@ from urllib.parse import quote
 from typing_extensions import override
 import requests
 
+import os
 import time
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable
 import json
+import gzip
 from bs4 import BeautifulSoup, Tag
 import bibtexparser
 from pathlib import Path
 import re
 
 from ..database.model import Paper
+from ..model.batch import PaperBatch
 from ..model.paper import PaperMetadata
 from ..network import NetworkClient, Proxy
+from ..utils.config import get_config
 from ..utils.exceptions import SciRetrieverError
 from ..utils.logging import get_logger
+from .gs_parser import GSParser, extract_tag, get_authorlist, get_parser, parse_total_results, BS4Parser
+from .gs_store import GSBibCache, GSCrawlStore
 from .searcher import BaseSearcher
 
 
@@ -90,6 +97,9 @@ class GSClient(NetworkClient):
 
     额外参数：
         mirror: 镜像网站,0为官方网站
+        parser: 结果页面的解析后端,见gs_parser
+        bib_cache: cid -> bib的本地存储,GSRow.load_bib先查询它,没有时才请求bibtex;
+                   默认在配置了search.gs_bib_cache时自动打开
     """
     def __init__(
         self,
@@ -105,6 +115,8 @@ class GSClient(NetworkClient):
         allow_redirects: bool = True,
         cookie: dict[str, str]|None = None,
         verify: bool = False,
+        parser: str|GSParser|None = None,
+        bib_cache: GSBibCache|None = None,
         ) -> None:
         super().__init__(
             use_proxy=use_proxy,
@@ -121,6 +133,11 @@ class GSClient(NetworkClient):
         )
         self.mirror:int = mirror
         self.base_url:str = _GoogleScholar[self.mirror]
+        # 结果页面的解析后端,见gs_parser
+        self.parser:GSParser = get_parser(parser)
+        if bib_cache is None and get_config().get("search.gs_bib_cache"):
+            bib_cache = GSBibCache()
+        self.bib_cache:GSBibCache|None = bib_cache
 
     def _get_mirror_response(self,url:str,response:requests.Response) -> requests.Response:
         """
@@ -136,8 +153,9 @@ class GSClient(NetworkClient):
             if cookie_match:
                 verify_data = cookie_match.group(1)
                 
-                # 手动设置cookie
-                self.session.cookies.set('google_verify_data', verify_data, domain='scholar.aigrogu.com', path='/')
+                # 手动设置cookie,加锁保证设置在当前的session上而不是正在被更换的旧session上
+                with self._session_lock:
+                    self.session.cookies.set('google_verify_data', verify_data, domain='scholar.aigrogu.com', path='/')
                 # 等待一小段时间模拟浏览器行为
                 time.sleep(1)
                 
@@ -154,6 +172,12 @@ class GSClient(NetworkClient):
 
 
     def get_page_soup(self,scholar_url:str) -> tuple[BeautifulSoup, str]:
+        html = self.get_page_html(scholar_url)
+        soup = BeautifulSoup(html, "html.parser")
+        return soup,html
+
+    def get_page_html(self,scholar_url:str) -> str:
+        # 获取页面的html,不解析
         url:str = self.base_url + scholar_url
         response = self.get(url=url)
         
@@ -161,16 +185,24 @@ class GSClient(NetworkClient):
             raise Exception(f"Failed to get page: {response.status_code}")
         
         if self.mirror == 1:
+            if 'AutoJump' in response.text:
+                # 不能缓存验证页面
+                self.invalidate_cache(url)
             response = self._get_mirror_response(url = url,response = response)
-            soup = BeautifulSoup(response.text, "html.parser")
-            return soup,response.text
+            if 'AutoJump' in response.text:
+                self.invalidate_cache(url)
+            return response.text
 
         else:
-            has_captcha = self._requests_has_captcha(response.text)
+            try:
+                has_captcha = self._requests_has_captcha(response.text)
+            except GSCaptchaError:
+                self.invalidate_cache(url)
+                raise
             if not has_captcha:
-                soup = BeautifulSoup(response.text, "html.parser")
-                return soup,response.text
+                return response.text
             else:
+                self.invalidate_cache(url)
                 logger.error("Google Scholar has detected a captcha,auto switch website to mirror=1")
                 raise GSCaptchaError("Google Scholar has detected a captcha.")
                 # self.mirror = 1
@@ -313,12 +345,18 @@ class GoogleScholar():
         html:str|None = None,
         param_list:list[str]|None = None,
         next_url:str|None = None,
+        lean:bool = False,
+        archive_dir:str|Path|None = None,
         ) -> None:
         if not session:
             logger.warning("未提供session,将使用默认session")
             session = GSClient()
         self.session:GSClient = session
         self.rows:list["GSRow"] = rows
+        # lean: 解析之后丢弃soup、html和每一行的Tag,下一页沿用该设置
+        # archive_dir: 丢弃之前将html压缩保存到该目录
+        self.lean:bool = lean
+        self.archive_dir:Path|None = Path(archive_dir) if archive_dir is not None else None
         self.page_num:int = page_num
         self.param_list:list[str]|None = param_list
         
@@ -334,36 +372,36 @@ class GoogleScholar():
         cls,
         url:str|None = None,
         html:str|None = None,
-        session:GSClient|None = None
+        session:GSClient|None = None,
+        parser:str|GSParser|None = None,
+        lean:bool = False,
+        archive_dir:str|Path|None = None,
         ) -> "GoogleScholar":
         # 该url并不是完整的url，只有后半部分
         # 通过url就会发送请求
-        # 从url中获取soup
+        # parser: 解析后端,默认使用session.parser
+        # lean: 解析之后调用release丢弃soup和html,archive_dir不为None时先压缩保存html
         if not session:
             logger.warning("未提供session,将使用默认session")
             session = GSClient()
+        parser = get_parser(parser) if parser is not None else session.parser
         if url is not None:
-            soup,html = session.get_page_soup(url)
-        elif html:
-            soup = BeautifulSoup(html, "html.parser")
-        else:
+            html = session.get_page_html(url)
+        elif not html:
             raise ValueError("url and html cannot both be set to None")
         
-        if not soup.find("div",id="gs_bdy_ccl"):
+        page = parser.parse(html)
+        if not page.is_scholar:
             raise GSPageError("Not is Google Scholar Page.")
         
-        html_rows = soup.find_all('div', class_='gs_r gs_or gs_scl') + soup.find_all('div', class_='gsc_mpat_ttl')
-        if html_rows == []:
+        if page.found == 0:
             raise GSRowsError("未找到任何文章")
 
-        # 删除一些没有data-cid的文章或者广告
-        rows = [GSRow.from_row(row,session) for row in html_rows if row.get("data-cid")]
+        # 删除一些没有data-cid的文章或者广告(由解析后端完成)
+        nodes = page.nodes if page.nodes is not None else [None] * len(page.rows)
+        rows = [GSRow.from_info(info,session,row=node) for info,node in zip(page.rows,nodes)]
         
-        html_next_url = None
-        next_link = soup.find(class_='gs_ico gs_ico_nav_next')
-        if next_link and next_link.parent and 'href' in next_link.parent.attrs:
-            html_next_url = next_link.parent['href']
-            
+        html_next_url = page.next_url
         if session.mirror == 1 and isinstance(html_next_url, str):
             next_url = html_next_url.replace("/extdomains/scholar.google.com","")
         elif session.mirror == 0 and isinstance(html_next_url, str):
@@ -375,7 +413,7 @@ class GoogleScholar():
         param = url.split("?")[-1] if url else ""
         param_list = param.split("&") if url is not None else None
 
-        page_num = int(soup.find(class_="gs_ico gs_ico_nav_current").parent.text.strip())
+        page_num = page.page_num
         
         # 检查page_num是否正确
         if param_list is not None:
@@ -385,37 +423,43 @@ class GoogleScholar():
                     assert page_num == page_num2,ValueError("page_num is not equal to page_num2")
                     break
             
-            
-        totle_results = cls._get_total_results(soup)
-        
-        return cls(
+        scholar = cls(
             url = url,
             session = session,
             html = html,
-            soup = soup,
+            soup = page.soup,
             rows = rows,
             param_list = param_list,
             page_num = page_num,
             next_url = next_url,
-            totle_results = totle_results,
+            totle_results = page.totle_results,
+            lean = lean,
+            archive_dir = archive_dir,
             )
+        if lean:
+            scholar.release(archive_dir)
+        return scholar
     
     @classmethod
     def from_html(
         cls,
         html_path:str|Path,
-        session:GSClient|None = None
+        session:GSClient|None = None,
+        parser:str|GSParser|None = None,
         ) -> "GoogleScholar":
         if isinstance(html_path,str):
             html_path = Path(html_path)
             
-        with open(html_path, "r", encoding="utf-8") as f:
+        # 支持release压缩保存的page_*.html.gz
+        opener = gzip.open if html_path.suffix == ".gz" else open
+        with opener(html_path, "rt", encoding="utf-8") as f:
             html = f.read()
             
         return cls.from_url(
             url = None,
             html = html,
-            session = session
+            session = session,
+            parser = parser,
             )
         
     @classmethod
@@ -456,25 +500,53 @@ class GoogleScholar():
         
     @staticmethod
     def _get_total_results(soup:BeautifulSoup):
-        if soup.find("div", class_="gs_pda"):
-            return 0
-
-        for x in soup.find_all('div', class_='gs_ab_mdw'):
-            # Accounting for different thousands separators:
-            # comma, dot, space, apostrophe
-            if "About" in x.text and "results" in x.text:
-                # Example: "About 1,234 results (0.12 seconds)"
-                match = re.match(pattern=r'(^|\s*About)\s*([0-9,\.\s’]+)', string=x.text)
-                if match:
-                    return int(re.sub(pattern=r'[,\.\s’]',repl='', string=match.group(2)))
-        return 0
+        return parse_total_results(
+            bool(soup.find("div", class_="gs_pda")),
+            [x.text for x in soup.find_all('div', class_='gs_ab_mdw')],
+        )
     
-    def fill_all_bib(self):
-        # 填充所有的row
-        if self.rows is not None:
-            for row in self.rows:
-                if not row.filled:
-                    row.load_bib()
+    def fill_all_bib(
+        self,
+        workers:int|None = None,
+        on_filled:Callable[["GSRow"],None]|None = None,
+        ):
+        """
+        填充所有的row
+
+        Args:
+            workers: 同时进行的bib请求数,默认为配置中的search.gs_fill_workers,
+                     请求仍然受session按主机共享的速率限制,镜像网站或代理池允许时才需要调大
+            on_filled: 每个row填充完成后在当前线程中调用,用于立即保存进度
+        """
+        if self.rows is None:
+            return
+        rows = [row for row in self.rows if not row.filled]
+        if workers is None:
+            workers = get_config().get("search.gs_fill_workers", 1)
+        if workers <= 1 or len(rows) <= 1:
+            for row in rows:
+                row.load_bib()
+                if on_filled is not None:
+                    on_filled(row)
+            return
+
+        error:BaseException|None = None
+        with ThreadPoolExecutor(max_workers=min(workers, len(rows))) as executor:
+            futures = {executor.submit(row.load_bib): row for row in rows}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    # 出现验证码等错误时不再发送新的请求,已经填充的row仍然会保存
+                    if error is None:
+                        error = e
+                        for pending in futures:
+                            pending.cancel()
+                    continue
+                if on_filled is not None:
+                    on_filled(futures[future])
+        if error is not None:
+            raise error
     @property
     def filled(self):
         return all([row.filled for row in self.rows])
@@ -482,7 +554,12 @@ class GoogleScholar():
     def __next__(self):
         # 下一个页面
         if self.next_url:
-            return GoogleScholar.from_url(url = self.next_url, session = self.session)
+            return GoogleScholar.from_url(
+                url = self.next_url,
+                session = self.session,
+                lean = self.lean,
+                archive_dir = self.archive_dir,
+                )
         else:
             raise StopIteration
     
@@ -512,8 +589,11 @@ class GoogleScholar():
             self.fill_all_bib()
         if isinstance(json_path,str):
             json_path = Path(json_path)
-        with open(json_path, "w", encoding="utf-8") as f:
+        # 先写入临时文件再替换,填充过程中频繁保存时不会留下不完整的json
+        tmp_path = json_path.with_name(json_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
             json.dump(self.dump_dict(), f, indent=4)
+        os.replace(tmp_path, json_path)
             
     def dump_json(self):
         # 导出为json
@@ -536,14 +616,37 @@ class GoogleScholar():
     
     def export_html(self,html_path:str|Path):
         # 导出为html
-        if not self.soup:
-            logger.error("未找到soup,无法导出html")
+        if not self.soup and not self.html:
+            logger.error("未找到soup和html,无法导出html")
             return
         if isinstance(html_path,str):
             html_path = Path(html_path)
         with open(html_path, "w", encoding="utf-8") as f:
-            html = str(self.soup.prettify())
+            # 非bs4后端没有soup,直接写出原始html
+            html = str(self.soup.prettify()) if self.soup else self.html
+            f.write(html)
+
+    def export_html_archive(self,archive_dir:str|Path) -> Path|None:
+        # 将原始html压缩保存为archive_dir/page_{page_num}.html.gz,可以用from_html重新解析
+        html = self.html if self.html else (str(self.soup) if self.soup else None)
+        if html is None:
+            return None
+        archive_dir = Path(archive_dir)
+        archive_dir.mkdir(parents=True, exist_ok=True)
+        html_path = archive_dir / f"page_{self.page_num}.html.gz"
+        with gzip.open(html_path, "wt", encoding="utf-8") as f:
             f.write(html)
+        return html_path
+
+    def release(self,archive_dir:str|Path|None = None) -> Path|None:
+        # 丢弃soup、html和每一行的Tag,只保留解析出的字段
+        # archive_dir不为None时先压缩保存html,返回保存的路径
+        html_path = self.export_html_archive(archive_dir) if archive_dir is not None else None
+        self.soup = None
+        self.html = None
+        for row in self.rows:
+            row.row = None
+        return html_path
     def export_paper(self,filled:bool = False)-> list[PaperMetadata]:
         # 导出为Paper对象
         papers = []
@@ -552,6 +655,13 @@ class GoogleScholar():
                 row.load_bib()
             papers.append(row.export_paper())
         return papers
+
+    def export_batch(self,filled:bool = False)-> PaperBatch:
+        # 按列导出,不创建PaperMetadata对象
+        if filled:
+            for row in self.rows:
+                row.load_bib()
+        return PaperBatch.from_gs(self.rows)
 class GSRow():
     """
     GoogleScholar中一个文章的对象
@@ -585,6 +695,13 @@ class GSRow():
         year: 文章的发表年份
         pulisher: 文章的出版社
     """
+    # 导出和保存的字段,row和session不导出
+    FIELDS: tuple[str, ...] = (
+        "cid", "pos", "title", "pub_url", "abstract", "author", "publisher", "journal", "pub_type",
+        "pub_year", "url_scholarbib", "num_citations", "cite_url", "related_url", "pdf_url", "filled", "bib",
+    )
+    __slots__ = ("row", "session") + FIELDS
+
     def __init__(
         self,
         row: BeautifulSoup|None = None,
@@ -633,7 +750,11 @@ class GSRow():
     @classmethod
     def from_row(cls,row,session: GSClient) -> "GSRow":
         # 从row中加载信息
-        row_dict = cls.load_information(row=row)
+        return cls.from_info(cls.load_information(row=row),session,row=row)
+
+    @classmethod
+    def from_info(cls,row_dict:dict[str,Any],session: GSClient,row:Tag|None = None) -> "GSRow":
+        # 从解析后端得到的字典创建,row为bs4后端的Tag,其他后端为None
         cid:str|None = row_dict.get("cid")
         pos:int|None = row_dict.get("pos")
         title:str|None = row_dict.get("title")
@@ -644,7 +765,7 @@ class GSRow():
         journal:str|None = row_dict.get("journal")
         pub_type:str|None = row_dict.get("pub_type")
         pub_year:str|None = row_dict.get("pub_year")
-        url_scholarbib:str|None = row_dict.get("url_scholarbib")
+        url_scholarbib:str|None = row_dict.get("url_scholarbib") or _BIBCITE.format(cid, pos)
         num_citations:int|None = row_dict.get("num_citations")
         cite_url:str|None = row_dict.get("cite_url")
         related_url:str|None = row_dict.get("related_url")
@@ -711,156 +832,45 @@ class GSRow():
         
     @staticmethod
     def _get_authorlist(authorinfo:str) -> list[str]:
-        authorlist:list[str] = []
-        text = authorinfo.split(' - ')[0]
-        for i in text.split(','):
-            i = i.strip()
-            if bool(re.search(r'\d', i)):
-                continue
-            if ("Proceedings" in i or "Conference" in i or "Journal" in i or
-                    "(" in i or ")" in i or "[" in i or "]" in i or
-                    "Transactions" in i):
-                continue
-            i = i.replace("…", "")
-            authorlist.append(i)
-        return authorlist
+        return get_authorlist(authorinfo)
 
     @staticmethod
     def _extract_tag(text:str) -> str|None:
         """从形如 [TAG][X] 的文本中提取 TAG"""
-        match = re.search(r'\[([A-Z]+)\]', text)
-        if match:
-            return match.group(1)  # 返回第一个匹配的括号内容
-        return None
+        return extract_tag(text)
     
     @classmethod
     def load_information(cls,row:Tag) -> dict[str,Any]:
-        """根据row加载信息"""
-        row = row
-        # databox是每一个文章的box而不是整个页面的box
-        databox = row.find('div', class_='gs_ri')
-        title = databox.find('h3', class_='gs_rt')
-        
-        if title.find('a'):
-            pub_url = title.find('a')['href']
-        else:
-            pub_url = ""
-        cid:str = row.get('data-cid')
-        pos:int = int(row.get('data-rp'))
-
-        pub_type = None
-        if title.find('span', class_='gs_ctu'):  # A citation
-            title.span.extract()
-        elif title.find('span', class_='gs_ctc'):  # A book or PDF
-            span = title.span.extract()
-            span_text = span.text
-            tag = cls._extract_tag(span_text)
-            if tag == 'BOOK':
-                pub_type = 'BOOK'
-            else:
-                pub_type = 'ARTICLE'
-        else:
-            pub_type = 'ARTICLE'
-        
-        title = title.text.strip()
-        # 提取作者等基本信息
-        author_div_element = databox.find('div', class_='gs_a')
-        authorinfo = author_div_element.text
-        authorinfo = authorinfo.replace(u'\xa0', u' ')       # NBSP
-        authorinfo = authorinfo.replace(u'&amp;', u'&')      # Ampersand
-        author = cls._get_authorlist(authorinfo)
-        # 获取author_id
-        # authorinfo_html = author_div_element.decode_contents()
-        # self.author_id = self._get_author_id_list(authorinfo_html)
-
-        # 该行有四种类型并且有一些信息(author/venue/year/host):
-        #  (A) authors - host
-        #  (B) authors - venue, year - host
-        #  (C) authors - venue - host
-        #  (D) authors - year - host
-        venueyear = authorinfo.split(' - ')
-        publisher = venueyear[-1].strip()
-        journal = None
-        pub_year = None
-        # If there is no middle part (A) then venue and year are unknown.
-        if len(venueyear) > 2:
-            venueyear = venueyear[1].split(',')
-            journal = None
-            year = venueyear[-1].strip()
-            if year.isnumeric() and len(year) == 4:
-                pub_year = int(year)
-                if len(venueyear) >= 2:
-                    journal = ','.join(venueyear[0:-1]) # everything but last
-            else:
-                journal = ','.join(venueyear) # everything
-                pub_year = None
-            journal = journal
-        
-        # abstract 有可能不全
-        abstract = None
-        if databox.find('div', class_='gs_rs'):
-            abstract = databox.find('div', class_='gs_rs').text
-            abstract = abstract.replace(u'\u2026', u'')
-            abstract = abstract.replace(u'\n', u' ')
-            abstract = abstract.strip()
-
-            if abstract[0:8].lower() == 'abstract':
-                abstract = abstract[9:].strip()
-
-
-        # sclib指的是将该文章存入自己库的链接,需要整个页面的信息才能拿到，而GSRow只有单个文章的信息
-        # sclib = row.find('div', id='gs_res_glb').get('data-sva').format(self.cid)
-        # self.add_lib_url = sclib
-
+        """根据row加载信息(bs4后端)"""
+        row_dict = BS4Parser.parse_row(row)
         # bibcite url
-        url_scholarbib:str = _BIBCITE.format(cid, pos)
-        # cite and related
-        lowerlinks = databox.find('div', class_='gs_fl').find_all('a')
-
-        num_citations = 0
-        cite_url = None
-        related_url = None
-        pdf_url = None
-        for link in lowerlinks:
-            if 'Cited by' in link.text:
-                num_citations = int(re.findall(r'\d+', link.text)[0].strip())
-                cite_url = link['href']
-
-            if 'Related articles' in link.text:
-                related_url = link['href']
-        # pdf url
-        if row.find('div', class_='gs_ggs gs_fl'):
-            pdf_url = row.find('div', class_='gs_ggs gs_fl').a['href']
-        return {
-            "cid":cid,
-            "pos":pos,
-            "title":title,
-            "pub_url":pub_url,
-            "abstract":abstract,
-            "author":author,
-            "publisher":publisher,
-            "journal":journal,
-            "pub_type":pub_type,
-            "pub_year":pub_year,
-            "url_scholarbib":url_scholarbib,
-            "num_citations":num_citations,
-            "cite_url":cite_url,
-            "related_url":related_url,
-            "pdf_url":pdf_url,
-        }
+        row_dict["url_scholarbib"] = _BIBCITE.format(row_dict["cid"], row_dict["pos"])
+        return row_dict
         
     def load_bib(self) -> None:
         if self.filled:
             return
+        # 同一个cid的bib不会改变,先从本地存储中查找
+        bib_cache = self.session.bib_cache
+        if bib_cache is not None:
+            cached = bib_cache.get(self.cid)
+            if cached is not None:
+                if self.bib is None:
+                    self.bib = {}
+                self.bib.update(cached)
+                self.filled = True
+                return
         
         bibtex_url:str = self._get_bibtex(self.url_scholarbib)
         bibtex_url = bibtex_url.replace(self.session.base_url,"")
         if bibtex_url:
-            while True:
-                # time.sleep(self.session.retry_delay)
-                _, bibtex_text = self.session.get_page_soup(bibtex_url)
+            # 镜像网站可能连续返回AutoJump验证页面,最多请求max_retries次
+            for _ in range(self.session.max_retries):
+                bibtex_text = self.session.get_page_html(bibtex_url)
                 if "AutoJump" not in bibtex_text:
                     break
+            else:
+                raise GSPageError(f"Still got the AutoJump page after {self.session.max_retries} attempts: {bibtex_url}")
             parser = bibtexparser.bparser.BibTexParser(common_strings=True)
             parsed_bib = self.remap_bib(bibtexparser.loads(bibtex_text,parser).entries[-1], _BIB_MAPPING, _BIB_DATATYPES)
             # author: str -> list
@@ -869,8 +879,13 @@ class GSRow():
             parsed_bib_author = [author.strip() for author in parsed_bib_author]
             parsed_bib.update({'author': parsed_bib_author})
             
+            # 从from_dict或GSCrawlStore恢复的row可能没有bib
+            if self.bib is None:
+                self.bib = {}
             self.bib.update(parsed_bib)
             self.filled = True
+            if bib_cache is not None:
+                bib_cache.set(self.cid, parsed_bib)
 
     def _get_bibtex(self, bib_url) -> str:
         """Retrieves the bibtex url"""
@@ -894,9 +909,7 @@ class GSRow():
             
     def dump_dict(self) -> dict[str,Any]:
         # 导出时以bib为优先
-        paper_dict = self.__dict__.copy()
-        paper_dict.pop("row")
-        paper_dict.pop("session")
+        paper_dict = {name: getattr(self, name) for name in self.FIELDS}
 
         # if self.filled:
         #     bib = paper_dict.pop("bib")
@@ -930,32 +943,34 @@ class GSRow():
     
     def export_paper(self) -> PaperMetadata:
         # 导出为paper对象
-        
+        return PaperMetadata(**self.export_row())
+
+    def export_row(self) -> dict[str,Any]:
+        # 导出为PaperMetadata的字段字典(papers表的一行),export_paper和PaperBatch.from_gs共用
         page_dict = self.dump_dict()
         if not self.filled:
             # raise ValueError("bib is not filled")
-            paper = PaperMetadata(
-                title=page_dict.get('title'),
-                authors=page_dict.get('author'),
-                abstract=page_dict.get('abstract'),
-                doi=None,
-                url=page_dict.get('pub_url'),
-                publisher=page_dict.get('publisher'),
-                pub_year=page_dict.get('pub_year'),
-                journal=page_dict.get('journal'),
-                volume=page_dict.get('volume'),
-                issue=page_dict.get('number'),
-                pages=page_dict.get('pages'),
-                keywords=None,
-                paper_metadata=page_dict.copy(),
-                type=page_dict.get('pub_type').lower() if page_dict.get('pub_type') else None,
-                pdf_downloaded=False,
-                pdf_path=None,
-                pdf_url=page_dict.get('pdf_url'),
-                notes=None,
-                citations_num=page_dict.get('num_citations'),
-            )
-            return paper
+            return {
+                "title": page_dict.get('title'),
+                "authors": page_dict.get('author'),
+                "abstract": page_dict.get('abstract'),
+                "doi": None,
+                "url": page_dict.get('pub_url'),
+                "publisher": page_dict.get('publisher'),
+                "pub_year": page_dict.get('pub_year'),
+                "journal": page_dict.get('journal'),
+                "volume": page_dict.get('volume'),
+                "issue": page_dict.get('number'),
+                "pages": page_dict.get('pages'),
+                "keywords": None,
+                "paper_metadata": page_dict.copy(),
+                "type": page_dict.get('pub_type').lower() if page_dict.get('pub_type') else None,
+                "pdf_downloaded": False,
+                "pdf_path": None,
+                "pdf_url": page_dict.get('pdf_url'),
+                "notes": None,
+                "citations_num": page_dict.get('num_citations'),
+            }
         bib = page_dict.pop("bib")
         
         for key,value in page_dict.items():
@@ -965,37 +980,45 @@ class GSRow():
             if key not in bib:
                 bib[key] = None
             
-        paper = PaperMetadata(
-            title=bib["title"],
-            authors=bib["author"],
-            abstract=page_dict["abstract"],
-            doi=None,
-            url=page_dict["pub_url"],
-            publisher=bib["publisher"],
-            pub_year=int(bib["pub_year"]) if bib["pub_year"] else None,
-            journal=bib["journal"],
-            volume=bib["volume"],
-            issue=bib["number"],
-            pages=bib['pages'],
-            keywords=None,
-            paper_metadata=bib,
-            type=page_dict.get('pub_type').lower() if page_dict.get('pub_type') else None,
-            pdf_downloaded=False,
-            pdf_path=None,
-            pdf_url=page_dict["pdf_url"],
-            notes=None,
-            citations_num=page_dict["num_citations"],
-        )
-        return paper
+        return {
+            "title": bib["title"],
+            "authors": bib["author"],
+            "abstract": page_dict["abstract"],
+            "doi": None,
+            "url": page_dict["pub_url"],
+            "publisher": bib["publisher"],
+            "pub_year": int(bib["pub_year"]) if bib["pub_year"] else None,
+            "journal": bib["journal"],
+            "volume": bib["volume"],
+            "issue": bib["number"],
+            "pages": bib['pages'],
+            "keywords": None,
+            "paper_metadata": bib,
+            "type": page_dict.get('pub_type').lower() if page_dict.get('pub_type') else None,
+            "pdf_downloaded": False,
+            "pdf_path": None,
+            "pdf_url": page_dict["pdf_url"],
+            "notes": None,
+            "citations_num": page_dict["num_citations"],
+        }
 
 class GSWorkplace():
     """
     Google Scholar的总对象,针对每一次查询。还需要用于与外界交互。
+
+    所有页面和文章保存在root_dir/crawl.db(GSCrawlStore)中,页面按需读取,
+    旧版本的page_*.json会在第一次打开时自动导入,export_json可以重新导出为page_*.json。
+
+    lean: 每一页解析之后丢弃soup、html和每一行的Tag,长时间运行时内存只随页数少量增长
+    archive_html: lean模式下丢弃之前将html压缩保存到root_dir/html/page_*.html.gz
     """
     def __init__(
         self,
         start_page: GoogleScholar,
         root_dir:Path,
+        lean:bool = False,
+        archive_html:bool = False,
+        store:GSCrawlStore|None = None,
         ) -> None:
         
         if not root_dir.exists():
@@ -1005,15 +1028,16 @@ class GSWorkplace():
         # 将基础的信息加载完成
         self.start_page:GoogleScholar = start_page
         self.root_dir:Path = root_dir
+        self.lean:bool = lean
+        self.archive_dir:Path|None = root_dir / "html" if archive_html else None
+        if self.lean:
+            self.start_page.release(self.archive_dir)
 
-        self._pages:list[GoogleScholar] = []
+        self.store:GSCrawlStore = store if store is not None else GSCrawlStore(root_dir)
         # num_list 理应是一个从1开始的连续的数字列表
-        self.num_list:list[int] = []
-        
-        json_list = list(self.root_dir.glob("page_*.json"))
-
-        self.num_list = [int(json.stem.split("_")[-1]) for json in json_list]
-        self.num_list.sort()
+        self.num_list:list[int] = self.store.page_nums()
+        # 最后一页,按需从store中读取
+        self._last:GoogleScholar|None = None
         
         # 用于保证start_page是第一个page
         self.check_start_page()
@@ -1022,11 +1046,7 @@ class GSWorkplace():
         if self.num_list == []:
             # 没有任何page,则直接从start_page开始
             self.num_list = [1]
-            self.start_page.export_json(self.root_dir / f"page_{self.start_page.page_num}.json")
-            
-        # 加载所有的page
-        for num in self.num_list:
-            self._pages.append(GoogleScholar.from_json(self.root_dir / f"page_{num}.json",session = self.start_page.session))
+            self.store.save_page(self.start_page.dump_dict())
 
         self.totle_num:int = self.start_page.totle_results
         
@@ -1036,7 +1056,7 @@ class GSWorkplace():
         if self.start_page.page_num != 1:
             logger.warning("start_page不是第1个page,将强制转换")
             if 1 not in self.num_list:
-                logger.warning("page_1.json不存在,将强制进行下载")
+                logger.warning("page_1不存在,将强制进行下载")
                 param_list = self.start_page.param_list
                 if param_list is None:
                     raise ValueError("param_list is None")
@@ -1047,78 +1067,130 @@ class GSWorkplace():
                         break
                 url = GoogleScholar.get_url_from_param_list(param_list)
                 start_page = GoogleScholar.from_url(url,session=self.start_page.session)
+                if self.lean:
+                    start_page.release(self.archive_dir)
+                self.num_list.append(1)
+                self.num_list.sort()
+                self.store.save_page(start_page.dump_dict())
             else:
-                # 从page_1.json中获取start_page
-                start_page = GoogleScholar.from_json(self.root_dir / f"page_{self.num_list[0]}.json",session = self.start_page.session)
+                # 从store中获取start_page
+                start_page = self._load(1)
             self.start_page = start_page
-            
-            self.num_list.append(1)
-            self.num_list.sort()
-            
-            self.start_page.export_json(self.root_dir / f"page_{self.start_page.page_num}.json")
 
 
     @classmethod
-    def from_root_dir(cls,root_dir:Path,session:GSClient|None = None):
-        # 如果从root_dir来进行实例化，必须有page_1.json,否则就报错
-        if not (root_dir / "page_1.json").exists():
-            raise FileNotFoundError("page_1.json not found")
-        start_page = GoogleScholar.from_json(root_dir / "page_1.json",session=session)
+    def from_root_dir(cls,root_dir:Path,session:GSClient|None = None,lean:bool = False,archive_html:bool = False):
+        # 如果从root_dir来进行实例化，必须有第1页(crawl.db或者旧版的page_1.json),否则就报错
+        if not (root_dir / GSCrawlStore.FILE_NAME).exists() and not (root_dir / "page_1.json").exists():
+            raise FileNotFoundError("page_1 not found")
+        store = GSCrawlStore(root_dir)
+        if 1 not in store:
+            raise FileNotFoundError("page_1 not found")
+        start_page = GoogleScholar.from_dict(store.load_page(1),session=session)
         return cls(
             start_page = start_page,
             root_dir = root_dir,
+            lean = lean,
+            archive_html = archive_html,
+            store = store,
         )
 
+    def _load(self,page_num:int) -> GoogleScholar:
+        # 从store中读取一页
+        if self._last is not None and self._last.page_num == page_num:
+            return self._last
+        return GoogleScholar.from_dict(self.store.load_page(page_num),session=self.start_page.session)
+
+    @property
+    def last_page(self) -> GoogleScholar:
+        # 最后一页,继续爬取只需要它的next_url
+        if self._last is None or self._last.page_num != self.num_list[-1]:
+            self._last = self._load(self.num_list[-1])
+        return self._last
+
+    @property
+    def has_next(self) -> bool:
+        # 是否还有下一页,不需要读取页面
+        return bool(self.num_list) and self.store.next_url(self.num_list[-1]) is not None
+
+    @property
+    def filled(self) -> bool:
+        # 所有文章的bib是否都已经填充,不需要读取页面
+        return not self.store.unfilled_pages()
+
     @property
     def pages(self):
-        return self._pages.copy()
+        # 读取所有的页,页数很多时使用iter_pages
+        return list(self.iter_pages())
+
+    def iter_pages(self):
+        # 逐页读取
+        for num in self.num_list:
+            yield self._load(num)
+
     @property
     def papers(self):
-        return [page.export_paper() for page in self._pages]
+        return [page.export_paper() for page in self.iter_pages()]
+
+    @property
+    def batch(self) -> PaperBatch:
+        # 所有页的论文按列合并
+        return PaperBatch.concat(page.export_batch() for page in self.iter_pages())
     
     def append(self,page:"GoogleScholar"):
-        self._pages.append(page)
+        if self.lean:
+            page.release(self.archive_dir)
+        self.store.save_page(page.dump_dict())
         self.num_list.append(page.page_num)
+        self._last = page
         
     def __iter__(self):
         return self
     
     def __len__(self):
-        return len(self._pages)
+        return len(self.num_list)
     
     def __getitem__(self,index:int):
-        return self._pages[index]
+        return self._load(self.num_list[index])
     
     def __next__(self):
-        if self._pages == []:
+        if self.num_list == []:
             if self.start_page:
                 self.append(self.start_page)
                 return self.start_page
             else:
                 raise ValueError("ERROR: 请提供start_page")
             
-        end_pages = self._pages[-1]
+        end_pages = self.last_page
         if end_pages.next_url:
             try:
                 next_page = next(end_pages)
             except GSRowsError as e:
-                logger.info(f"共{len(self._pages)}页,后面没有文章了")
-                self._pages[-1].next_url = None
+                logger.info(f"共{len(self.num_list)}页,后面没有文章了")
+                end_pages.next_url = None
+                self.store.set_next_url(end_pages.page_num, None)
                 raise StopIteration
             self.append(next_page)
             return next_page
         else:
             raise StopIteration
     
-    def fill_all_bib(self):
-        for page in self._pages:
-            page.fill_all_bib()
+    def fill_all_bib(self,workers:int|None = None):
+        # 只读取含有未填充文章的页
+        for num in self.store.unfilled_pages():
+            page = self._load(num)
+            page.fill_all_bib(workers=workers,on_filled=self._checkpoint(page))
+
+    def _checkpoint(self,page:GoogleScholar) -> Callable[["GSRow"],None]:
+        # 每填充一个row就更新store中的这一行,中断后已经填充的bib不会丢失
+        index = {id(row): idx for idx, row in enumerate(page.rows)}
+        return lambda row: self.store.update_row(page.page_num, index[id(row)], row.dump_dict())
     
     def dump_dict(self) -> dict[str,str|int|list[Any]]:
         TGS_dict = {
             "totle_num":self.totle_num,
             "root_dir":str(self.root_dir),
-            "pages":[page.dump_dict() for page in self._pages],
+            "pages":[self.store.load_page(num) for num in self.num_list],
         }
         return TGS_dict
     
@@ -1126,10 +1198,11 @@ class GSWorkplace():
         return json.dumps(self.dump_dict(),indent=4)
     
     def export_json(self):
-        for _,page in enumerate(self._pages):
-            json_file = f"page_{page.page_num}.json"
-            # page_old = GoogleScholar.from_json(self.root_dir / json_file,session=page.session)
-            page.export_json(self.root_dir / json_file)
+        # 导出为旧版的page_*.json
+        for num in self.num_list:
+            json_file = self.root_dir / f"page_{num}.json"
+            with open(json_file, "w", encoding="utf-8") as f:
+                json.dump(self.store.load_page(num), f, indent=4)
 
     def check_and_rest(self, crawl_start_time, continuous_crawl_limit=300, rest_duration=180):
         """检查是否需要休息，如果需要则休息指定时间
@@ -1150,7 +1223,8 @@ class GSWorkplace():
             return True, time.time()
         return False, crawl_start_time
     
-    def run(self,is_fill:bool = False):
+    def run(self,is_fill:bool = False,fill_workers:int|None = None):
+        # fill_workers: 填充bib时同时进行的请求数,见GoogleScholar.fill_all_bib
         logger.info(f"开始运行:{self.root_dir}")
         
         # 添加爬虫休息功能的变量
@@ -1158,18 +1232,16 @@ class GSWorkplace():
         # check all pages
         if is_fill:
             logger.info("开始检查所有page的bib")
-            for page in self._pages:
-                if all([row.filled for row in page.rows]):
-                    continue
-                else:
-                    # 检查是否需要休息
-                    _, crawl_start_time = self.check_and_rest(crawl_start_time)
-                    # w = random.uniform(self.start_page.session.retry_delay, self.start_page.session.retry_delay+5)
-                    # time.sleep(w)
-                    page.fill_all_bib()
-                    page.export_json(self.root_dir / f"page_{page.page_num}.json")
-                    logger.info(f"page_{page.page_num}的bib检查完成")
-        logger.info(f"当前已下载到第{self._pages[-1].page_num}页,继续下载")
+            # 只读取含有未填充文章的页
+            for num in self.store.unfilled_pages():
+                page = self._load(num)
+                # 检查是否需要休息
+                _, crawl_start_time = self.check_and_rest(crawl_start_time)
+                # w = random.uniform(self.start_page.session.retry_delay, self.start_page.session.retry_delay+5)
+                # time.sleep(w)
+                page.fill_all_bib(workers=fill_workers,on_filled=self._checkpoint(page))
+                logger.info(f"page_{page.page_num}的bib检查完成")
+        logger.info(f"当前已下载到第{self.num_list[-1]}页,继续下载")
         while True:
             try:
                 # 检查是否需要休息
@@ -1178,15 +1250,12 @@ class GSWorkplace():
                 # time.sleep(w)
                 next_page = next(self)
             except GSPageError as e:
-                logger.warning(f"page_{self._pages[-1].page_num + 1}下载失败,重试")
+                logger.warning(f"page_{self.num_list[-1] + 1}下载失败,重试")
                 continue
             except StopIteration as e:
                 logger.info("所有page下载完成")
-                self._pages[-1].export_json(self.root_dir / f"page_{self._pages[-1].page_num}.json")
                 raise StopIteration
-            next_page.export_json(self.root_dir / f"page_{next_page.page_num}.json")
             if is_fill:
                 _, crawl_start_time = self.check_and_rest(crawl_start_time)
-                next_page.fill_all_bib()
-                next_page.export_json(self.root_dir / f"page_{next_page.page_num}.json")
+                next_page.fill_all_bib(workers=fill_workers,on_filled=self._checkpoint(next_page))
             logger.info(f"page_{next_page.page_num}下载完成")
@@ -0,0 +1,415 @@
+"""
+Google Scholar结果页面的解析后端
+
+GoogleScholar.from_url把HTML交给解析后端,后端返回与GSRow.load_information相同的字典:
+    bs4: BeautifulSoup + html.parser,默认,保留soup和每一行的Tag
+    lxml: lxml.html + 预编译的XPath,不创建soup,重新解析大量已保存的页面时快一个数量级
+    auto: 安装了lxml时使用lxml,否则使用bs4
+
+两个后端的结果应当完全一致,可以用compare_backends检查已保存的页面:
+    for path in Path("crawl").rglob("*.html"):
+        diffs = compare_backends(path.read_text(encoding="utf-8"))
+        if diffs:
+            print(path, diffs)
+"""
+import abc
+import re
+from dataclasses import dataclass, field
+from typing import Any
+
+from bs4 import BeautifulSoup, Tag
+
+from ..utils.config import get_config
+
+try:
+    import lxml.html
+    from lxml import etree
+    LXML = True
+except ImportError:
+    LXML = False
+
+
+@dataclass
+class ParsedPage:
+    """
+    一个结果页面的解析结果
+    is_scholar: 是否是Google Scholar的结果页面,为False时其他字段没有意义
+    found: 页面中文章和广告的总数(包括没有data-cid的)
+    rows: 有data-cid的文章,每个元素与GSRow.load_information的结果相同(不含url_scholarbib)
+    nodes: rows对应的bs4 Tag,只有bs4后端才有
+    next_url: 下一页链接(未处理镜像网站的前缀)
+    page_num: 当前页码
+    totle_results: 结果总数
+    soup: bs4后端的BeautifulSoup
+    """
+    is_scholar: bool
+    found: int = 0
+    rows: list[dict[str, Any]] = field(default_factory=list)
+    nodes: list[Tag] | None = None
+    next_url: str | None = None
+    page_num: int | None = None
+    totle_results: int = 0
+    soup: BeautifulSoup | None = None
+
+    def comparable(self) -> dict[str, Any]:
+        """用于比较不同后端结果的字段"""
+        return {
+            "is_scholar": self.is_scholar,
+            "found": self.found,
+            "rows": self.rows,
+            "next_url": self.next_url,
+            "page_num": self.page_num,
+            "totle_results": self.totle_results,
+        }
+
+
+def get_authorlist(authorinfo: str) -> list[str]:
+    """从作者行(authors - venue, year - host)中提取作者"""
+    authorlist: list[str] = []
+    text = authorinfo.split(' - ')[0]
+    for i in text.split(','):
+        i = i.strip()
+        if bool(re.search(r'\d', i)):
+            continue
+        if ("Proceedings" in i or "Conference" in i or "Journal" in i or
+                "(" in i or ")" in i or "[" in i or "]" in i or
+                "Transactions" in i):
+            continue
+        i = i.replace("…", "")
+        authorlist.append(i)
+    return authorlist
+
+
+def extract_tag(text: str) -> str | None:
+    """从形如 [TAG][X] 的文本中提取 TAG"""
+    match = re.search(r'\[([A-Z]+)\]', text)
+    if match:
+        return match.group(1)  # 返回第一个匹配的括号内容
+    return None
+
+
+def parse_authorinfo(authorinfo: str) -> dict[str, Any]:
+    """
+    解析作者行,该行有四种类型并且有一些信息(author/venue/year/host):
+        (A) authors - host
+        (B) authors - venue, year - host
+        (C) authors - venue - host
+        (D) authors - year - host
+    """
+    authorinfo = authorinfo.replace(u'\xa0', u' ')       # NBSP
+    authorinfo = authorinfo.replace(u'&amp;', u'&')      # Ampersand
+    author = get_authorlist(authorinfo)
+
+    venueyear = authorinfo.split(' - ')
+    publisher = venueyear[-1].strip()
+    journal = None
+    pub_year = None
+    # If there is no middle part (A) then venue and year are unknown.
+    if len(venueyear) > 2:
+        venueyear = venueyear[1].split(',')
+        year = venueyear[-1].strip()
+        if year.isnumeric() and len(year) == 4:
+            pub_year = int(year)
+            if len(venueyear) >= 2:
+                journal = ','.join(venueyear[0:-1]) # everything but last
+        else:
+            journal = ','.join(venueyear) # everything
+    return {"author": author, "publisher": publisher, "journal": journal, "pub_year": pub_year}
+
+
+def clean_abstract(abstract: str) -> str:
+    """摘要有可能不全,去掉省略号、换行和开头的Abstract"""
+    abstract = abstract.replace(u'…', u'')
+    abstract = abstract.replace(u'\n', u' ')
+    abstract = abstract.strip()
+    if abstract[0:8].lower() == 'abstract':
+        abstract = abstract[9:].strip()
+    return abstract
+
+
+def parse_total_results(has_pda: bool, texts: list[str]) -> int:
+    """从页面顶部的 About 1,234 results (0.12 seconds) 中提取结果总数"""
+    if has_pda:
+        return 0
+    for text in texts:
+        # Accounting for different thousands separators:
+        # comma, dot, space, apostrophe
+        if "About" in text and "results" in text:
+            match = re.match(pattern=r'(^|\s*About)\s*([0-9,\.\s’]+)', string=text)
+            if match:
+                return int(re.sub(pattern=r'[,\.\s’]', repl='', string=match.group(2)))
+    return 0
+
+
+def _row_info(
+    cid: str,
+    pos: int,
+    title: str,
+    pub_url: str,
+    pub_type: str | None,
+    authorinfo: str,
+    abstract: str | None,
+    links: list[tuple[str, str | None]],
+    pdf_url: str | None,
+) -> dict[str, Any]:
+    """两个后端共用的字段整理"""
+    num_citations = 0
+    cite_url = None
+    related_url = None
+    for text, href in links:
+        if 'Cited by' in text:
+            num_citations = int(re.findall(r'\d+', text)[0].strip())
+            cite_url = href
+        if 'Related articles' in text:
+            related_url = href
+    return {
+        "cid": cid,
+        "pos": pos,
+        "title": title,
+        "pub_url": pub_url,
+        "abstract": clean_abstract(abstract) if abstract is not None else None,
+        **parse_authorinfo(authorinfo),
+        "pub_type": pub_type,
+        "num_citations": num_citations,
+        "cite_url": cite_url,
+        "related_url": related_url,
+        "pdf_url": pdf_url,
+    }
+
+
+class GSParser(abc.ABC):
+    """解析后端的基类"""
+    name: str = ""
+
+    @abc.abstractmethod
+    def parse(self, html: str) -> ParsedPage:
+        """解析一个结果页面的HTML"""
+
+
+class BS4Parser(GSParser):
+    """BeautifulSoup + html.parser"""
+    name = "bs4"
+
+    def parse(self, html: str) -> ParsedPage:
+        return self.parse_soup(BeautifulSoup(html, "html.parser"))
+
+    def parse_soup(self, soup: BeautifulSoup) -> ParsedPage:
+        if not soup.find("div", id="gs_bdy_ccl"):
+            return ParsedPage(is_scholar=False, soup=soup)
+
+        html_rows = soup.find_all('div', class_='gs_r gs_or gs_scl') + soup.find_all('div', class_='gsc_mpat_ttl')
+        # 删除一些没有data-cid的文章或者广告
+        nodes = [row for row in html_rows if row.get("data-cid")]
+
+        next_url = None
+        next_link = soup.find(class_='gs_ico gs_ico_nav_next')
+        if next_link and next_link.parent and 'href' in next_link.parent.attrs:
+            next_url = next_link.parent['href']
+
+        current = soup.find(class_="gs_ico gs_ico_nav_current")
+        page_num = int(current.parent.text.strip()) if current else None
+
+        return ParsedPage(
+            is_scholar=True,
+            found=len(html_rows),
+            rows=[self.parse_row(row) for row in nodes],
+            nodes=nodes,
+            next_url=next_url,
+            page_num=page_num,
+            totle_results=parse_total_results(
+                bool(soup.find("div", class_="gs_pda")),
+                [x.text for x in soup.find_all('div', class_='gs_ab_mdw')],
+            ),
+            soup=soup,
+        )
+
+    @staticmethod
+    def parse_row(row: Tag) -> dict[str, Any]:
+        """根据row加载信息"""
+        # databox是每一个文章的box而不是整个页面的box
+        databox = row.find('div', class_='gs_ri')
+        title = databox.find('h3', class_='gs_rt')
+
+        pub_url = title.find('a')['href'] if title.find('a') else ""
+
+        if title.find('span', class_='gs_ctu'):  # A citation
+            title.span.extract()
+            pub_type = None
+        elif title.find('span', class_='gs_ctc'):  # A book or PDF
+            span = title.span.extract()
+            pub_type = 'BOOK' if extract_tag(span.text) == 'BOOK' else 'ARTICLE'
+        else:
+            pub_type = 'ARTICLE'
+
+        abstract_div = databox.find('div', class_='gs_rs')
+        pdf_div = row.find('div', class_='gs_ggs gs_fl')
+        return _row_info(
+            cid=row.get('data-cid'),
+            pos=int(row.get('data-rp')),
+            title=title.text.strip(),
+            pub_url=pub_url,
+            pub_type=pub_type,
+            authorinfo=databox.find('div', class_='gs_a').text,
+            abstract=abstract_div.text if abstract_div else None,
+            links=[(link.text, link['href']) for link in databox.find('div', class_='gs_fl').find_all('a')],
+            pdf_url=pdf_div.a['href'] if pdf_div else None,
+        )
+
+
+def _has_class(name: str) -> str:
+    """XPath条件: class中含有name,与bs4的class_=name相同"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def _is_class(value: str) -> str:
+    """XPath条件: class完全等于value,与bs4的class_='a b'相同"""
+    return f"normalize-space(@class)='{value}'"
+
+
+if LXML:
+    _X_IS_SCHOLAR = etree.XPath("//div[@id='gs_bdy_ccl']")
+    _X_ROWS = etree.XPath(f"//div[{_is_class('gs_r gs_or gs_scl')}]")
+    _X_PROFILE_ROWS = etree.XPath(f"//div[{_has_class('gsc_mpat_ttl')}]")
+    _X_NEXT = etree.XPath(f"//*[{_is_class('gs_ico gs_ico_nav_next')}]")
+    _X_CURRENT = etree.XPath(f"//*[{_is_class('gs_ico gs_ico_nav_current')}]")
+    _X_PDA = etree.XPath(f"//div[{_has_class('gs_pda')}]")
+    _X_RESULTS = etree.XPath(f"//div[{_has_class('gs_ab_mdw')}]")
+
+    _X_DATABOX = etree.XPath(f".//div[{_has_class('gs_ri')}]")
+    _X_TITLE = etree.XPath(f".//h3[{_has_class('gs_rt')}]")
+    _X_LINK = etree.XPath(".//a")
+    _X_SPAN = etree.XPath(".//span")
+    _X_CTU = etree.XPath(f".//span[{_has_class('gs_ctu')}]")
+    _X_CTC = etree.XPath(f".//span[{_has_class('gs_ctc')}]")
+    _X_AUTHOR = etree.XPath(f".//div[{_has_class('gs_a')}]")
+    _X_ABSTRACT = etree.XPath(f".//div[{_has_class('gs_rs')}]")
+    _X_LOWER = etree.XPath(f".//div[{_has_class('gs_fl')}]")
+    _X_PDF = etree.XPath(f".//div[{_is_class('gs_ggs gs_fl')}]")
+
+
+class LxmlParser(GSParser):
+    """lxml.html + 预编译的XPath"""
+    name = "lxml"
+
+    def __init__(self):
+        if not LXML:
+            raise ImportError("lxml is required for the lxml parser backend, install it with 'pip install lxml'")
+
+    def parse(self, html: str) -> ParsedPage:
+        # 带有编码声明的str不能直接交给lxml
+        doc = lxml.html.document_fromstring(
+            html.encode("utf-8"), parser=lxml.html.HTMLParser(encoding="utf-8")
+        )
+        if not _X_IS_SCHOLAR(doc):
+            return ParsedPage(is_scholar=False)
+
+        html_rows = _X_ROWS(doc) + _X_PROFILE_ROWS(doc)
+        nodes = [row for row in html_rows if row.get("data-cid")]
+
+        next_url = None
+        next_link = _X_NEXT(doc)
+        if next_link and next_link[0].getparent() is not None:
+            next_url = next_link[0].getparent().get("href")
+
+        current = _X_CURRENT(doc)
+        page_num = int(current[0].getparent().text_content().strip()) if current else None
+
+        return ParsedPage(
+            is_scholar=True,
+            found=len(html_rows),
+            rows=[self.parse_row(row) for row in nodes],
+            next_url=next_url,
+            page_num=page_num,
+            totle_results=parse_total_results(
+                bool(_X_PDA(doc)),
+                [x.text_content() for x in _X_RESULTS(doc)],
+            ),
+        )
+
+    @staticmethod
+    def parse_row(row) -> dict[str, Any]:
+        databox = _X_DATABOX(row)[0]
+        title = _X_TITLE(databox)[0]
+
+        links = _X_LINK(title)
+        pub_url = links[0].get("href") if links else ""
+
+        if _X_CTU(title):  # A citation
+            # 与bs4的title.span.extract()相同,删除第一个span但保留其后的文本
+            _X_SPAN(title)[0].drop_tree()
+            pub_type = None
+        elif _X_CTC(title):  # A book or PDF
+            span = _X_SPAN(title)[0]
+            span_text = span.text_content()
+            span.drop_tree()
+            pub_type = 'BOOK' if extract_tag(span_text) == 'BOOK' else 'ARTICLE'
+        else:
+            pub_type = 'ARTICLE'
+
+        abstract_div = _X_ABSTRACT(databox)
+        pdf_div = _X_PDF(row)
+        return _row_info(
+            cid=row.get('data-cid'),
+            pos=int(row.get('data-rp')),
+            title=title.text_content().strip(),
+            pub_url=pub_url,
+            pub_type=pub_type,
+            authorinfo=_X_AUTHOR(databox)[0].text_content(),
+            abstract=abstract_div[0].text_content() if abstract_div else None,
+            links=[(link.text_content(), link.get("href")) for link in _X_LINK(_X_LOWER(databox)[0])],
+            pdf_url=_X_LINK(pdf_div[0])[0].get("href") if pdf_div else None,
+        )
+
+
+_BACKENDS: dict[str, type[GSParser]] = {
+    "bs4": BS4Parser,
+    "lxml": LxmlParser,
+}
+
+
+def get_parser(parser: "str | GSParser | None" = None) -> GSParser:
+    """
+    获取解析后端
+
+    Args:
+        parser: 后端名称(bs4、lxml、auto)或者GSParser实例,默认为配置中的search.gs_parser
+    """
+    if isinstance(parser, GSParser):
+        return parser
+    if parser is None:
+        parser = get_config().get("search.gs_parser", "bs4")
+    if parser == "auto":
+        parser = "lxml" if LXML else "bs4"
+    if parser not in _BACKENDS:
+        raise ValueError(f"Unknown Google Scholar parser '{parser}', expected one of {list(_BACKENDS)} or 'auto'")
+    return _BACKENDS[parser]()
+
+
+def compare_backends(html: str, backends: tuple[str, ...] = ("bs4", "lxml")) -> list[str]:
+    """
+    用不同的后端解析同一个页面并比较结果
+
+    Returns:
+        不一致的地方,为空表示结果完全相同
+    """
+    results = {name: get_parser(name).parse(html).comparable() for name in backends}
+    reference_name = backends[0]
+    reference = results[reference_name]
+    diffs: list[str] = []
+    for name in backends[1:]:
+        other = results[name]
+        for key in reference:
+            if key == "rows":
+                continue
+            if reference[key] != other[key]:
+                diffs.append(f"{key}: {reference_name}={reference[key]!r} {name}={other[key]!r}")
+        if len(reference["rows"]) != len(other["rows"]):
+            diffs.append(f"rows: {reference_name} has {len(reference['rows'])}, {name} has {len(other['rows'])}")
+            continue
+        for index, (expected, actual) in enumerate(zip(reference["rows"], other["rows"])):
+            for key in expected:
+                if expected[key] != actual.get(key):
+                    diffs.append(
+                        f"rows[{index}].{key}: {reference_name}={expected[key]!r} {name}={actual.get(key)!r}"
+                    )
+    return diffs
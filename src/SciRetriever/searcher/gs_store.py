@@ -0,0 +1,275 @@
+"""
+Google Scholar爬取结果的本地存储
+
+GSBibCache: cid -> 解析后的bib。同一篇文章的bib不会改变,不同查询、不同年份中重复出现的文章
+            以及从html重新解析的页面都不需要再次请求bibtex。
+GSCrawlStore: 一次查询(GSWorkplace)的所有页面和文章,保存在root_dir/crawl.db中,
+              按页读取、按行更新,继续爬取时不需要解析和重写所有的page_*.json。
+
+示例：
+    session = GSClient(bib_cache=GSBibCache("~/.sciretriever/cache/gs_bib.db"))
+    # 从已有的爬取结果中导入已经填充的bib
+    session.bib_cache.import_pages(Path("/home/xxx/GS/catalytic").rglob("page_*.json"))
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable
+
+from ..utils.config import get_config
+from ..utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class GSBibCache:
+    """
+    基于SQLite的cid -> bib存储,可以在多个线程之间共享
+    """
+
+    def __init__(self, path: str | Path | None = None):
+        """
+        Args:
+            path: SQLite文件路径,None时使用配置search.gs_bib_cache或~/.sciretriever/cache/gs_bib.db
+        """
+        path = path or get_config().get("search.gs_bib_cache") or (Path.home() / ".sciretriever" / "cache" / "gs_bib.db")
+        self.path: Path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bibs (cid TEXT PRIMARY KEY, bib TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, cid: str | None) -> dict[str, Any] | None:
+        """返回cid对应的bib,没有时返回None"""
+        if not cid:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT bib FROM bibs WHERE cid = ?", (cid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, cids: Iterable[str]) -> dict[str, dict[str, Any]]:
+        """批量查询,返回已经缓存的cid -> bib"""
+        cids = [cid for cid in dict.fromkeys(cids) if cid]
+        found: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            # SQLite单条语句的参数个数有上限
+            for start in range(0, len(cids), 500):
+                chunk = cids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT cid, bib FROM bibs WHERE cid IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((cid, json.loads(bib)) for cid, bib in rows)
+        return found
+
+    def set(self, cid: str | None, bib: dict[str, Any]) -> None:
+        """保存cid对应的bib,已经存在时覆盖"""
+        if not cid or not bib:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bibs (cid, bib, created_at) VALUES (?, ?, ?)",
+                (cid, json.dumps(bib, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def set_many(self, bibs: Iterable[tuple[str, dict[str, Any]]]) -> int:
+        """批量保存(cid, bib),返回保存的数量"""
+        now = time.time()
+        rows = [(cid, json.dumps(bib, ensure_ascii=False), now) for cid, bib in bibs if cid and bib]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO bibs (cid, bib, created_at) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+        return len(rows)
+
+    def import_pages(self, json_paths: Iterable[str | Path]) -> int:
+        """
+        从已有的page_*.json中导入已经填充的bib
+
+        Returns:
+            导入的数量
+        """
+        total = 0
+        for json_path in json_paths:
+            with open(json_path, "r", encoding="utf-8") as f:
+                page = json.load(f)
+            total += self.set_many(
+                (row.get("cid"), row.get("bib")) for row in page.get("rows", []) if row.get("filled")
+            )
+        logger.info(f"Imported {total} bib entries into {self.path}")
+        return total
+
+    def __contains__(self, cid: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM bibs WHERE cid = ?", (cid,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM bibs").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class GSCrawlStore:
+    """
+    基于SQLite的爬取结果存储,每个GSWorkplace(root_dir)一个
+
+    pages: 每页一行(page_num、url、next_url、totle_results、param_list)
+    rows: 每篇文章一行,data为GSRow.dump_dict()的JSON,filled单独保存以便查询未填充的页
+
+    第一次打开含有旧版page_*.json的目录时会自动导入。
+    """
+    FILE_NAME: str = "crawl.db"
+
+    def __init__(self, root_dir: str | Path):
+        self.root_dir: Path = Path(root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.path: Path = self.root_dir / self.FILE_NAME
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "page_num INTEGER PRIMARY KEY, url TEXT, next_url TEXT, totle_results INTEGER NOT NULL, "
+            "param_list TEXT, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "page_num INTEGER NOT NULL, idx INTEGER NOT NULL, cid TEXT, filled INTEGER NOT NULL, "
+            "data TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (page_num, idx))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_rows_filled ON rows (filled, page_num)")
+        self._conn.commit()
+
+        if not self.page_nums():
+            legacy = sorted(self.root_dir.glob("page_*.json"))
+            if legacy:
+                self.import_json(legacy)
+
+    def import_json(self, json_paths: Iterable[str | Path]) -> int:
+        """
+        导入旧版的page_*.json,已经存在的页会被覆盖
+
+        Returns:
+            导入的页数
+        """
+        total = 0
+        for json_path in json_paths:
+            with open(json_path, "r", encoding="utf-8") as f:
+                self.save_page(json.load(f))
+            total += 1
+        logger.info(f"Imported {total} pages into {self.path}")
+        return total
+
+    def save_page(self, page_dict: dict[str, Any]) -> None:
+        """保存一页(GoogleScholar.dump_dict()),替换该页原有的记录"""
+        now = time.time()
+        page_num = page_dict["page_num"]
+        rows = [
+            (page_num, idx, row.get("cid"), int(bool(row.get("filled"))), json.dumps(row, ensure_ascii=False), now)
+            for idx, row in enumerate(page_dict.get("rows") or [])
+        ]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (page_num, url, next_url, totle_results, param_list, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    page_num,
+                    page_dict.get("url"),
+                    page_dict.get("next_url"),
+                    page_dict.get("totle_results") or 0,
+                    json.dumps(page_dict.get("param_list")),
+                    now,
+                ),
+            )
+            self._conn.execute("DELETE FROM rows WHERE page_num = ?", (page_num,))
+            self._conn.executemany(
+                "INSERT INTO rows (page_num, idx, cid, filled, data, updated_at) VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def update_row(self, page_num: int, idx: int, row_dict: dict[str, Any]) -> None:
+        """更新一篇文章(GSRow.dump_dict()),例如填充bib之后"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE rows SET cid = ?, filled = ?, data = ?, updated_at = ? WHERE page_num = ? AND idx = ?",
+                (
+                    row_dict.get("cid"),
+                    int(bool(row_dict.get("filled"))),
+                    json.dumps(row_dict, ensure_ascii=False),
+                    time.time(),
+                    page_num,
+                    idx,
+                ),
+            )
+
+    def set_next_url(self, page_num: int, next_url: str | None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE pages SET next_url = ?, updated_at = ? WHERE page_num = ?", (next_url, time.time(), page_num)
+            )
+
+    def load_page(self, page_num: int) -> dict[str, Any]:
+        """
+        读取一页,格式与GoogleScholar.dump_dict()相同,可以传给GoogleScholar.from_dict
+
+        Raises:
+            KeyError: 该页不存在
+        """
+        with self._lock:
+            page = self._conn.execute(
+                "SELECT url, next_url, totle_results, param_list FROM pages WHERE page_num = ?", (page_num,)
+            ).fetchone()
+            if page is None:
+                raise KeyError(f"page {page_num} not found in {self.path}")
+            rows = self._conn.execute(
+                "SELECT data FROM rows WHERE page_num = ? ORDER BY idx", (page_num,)
+            ).fetchall()
+        url, next_url, totle_results, param_list = page
+        return {
+            "url": url,
+            "totle_results": totle_results,
+            "page_num": page_num,
+            "next_url": next_url,
+            "param_list": json.loads(param_list) if param_list else None,
+            "rows": [json.loads(data) for (data,) in rows],
+        }
+
+    def page_nums(self) -> list[int]:
+        """已经保存的页码,从小到大"""
+        with self._lock:
+            return [num for (num,) in self._conn.execute("SELECT page_num FROM pages ORDER BY page_num")]
+
+    def unfilled_pages(self) -> list[int]:
+        """含有未填充bib的文章的页码"""
+        with self._lock:
+            return [
+                num for (num,) in self._conn.execute(
+                    "SELECT DISTINCT page_num FROM rows WHERE filled = 0 ORDER BY page_num"
+                )
+            ]
+
+    def next_url(self, page_num: int) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT next_url FROM pages WHERE page_num = ?", (page_num,)).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, page_num: int) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM pages WHERE page_num = ?", (page_num,)).fetchone() is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -7,6 +7,7 @@ from typing import Any
 import requests
 from enum import Enum
 
+from ..model.batch import PaperBatch
 from ..model.paper import PaperMetadata
 from ..database.model import Paper
 from ..network import NetworkClient, Proxy
@@ -344,60 +345,44 @@ class SemanticScholarSearch():
         Returns:
             A PaperMetadata object.
         """
+        return PaperMetadata(**self.data2row(data), references=None, citations=None)
+
+    @classmethod
+    def data2row(cls,data:dict[str,Any]) -> dict[str,Any]:
+        """
+        Convert a data item to the PaperMetadata fields (a row of the papers table).
+        Shared by data2papers and PaperBatch.from_semantic.
+        """
         data_journal = data.get("journal",{})
         data_externalIds = data.get("externalIds",{})
         data_publicationVenue = data.get("publicationVenue",{})
         data_openAccessPdf = data.get("openAccessPdf",{})
-        
-        title = data.get("title","")
-        authors = self.get_authors(data.get("authors",[]))
-        abstract = data.get("abstract")
-        doi = data_externalIds.get("DOI") if data_externalIds else None
-        url = data_openAccessPdf.get("url") if data["isOpenAccess"] else None
-        publisher = data_publicationVenue.get("name") if data_publicationVenue else None
-        pub_year = data.get("year",None)
-        journal = data_journal.get("name",None) if data_journal else None
-        volume = data_journal.get("volume",None) if data_journal else None
-        issue = data_journal.get("issue",None) if data_journal else None
-        pages = data_journal.get("page",None) if data_journal else None
-        keywords = None
-        paper_metadata = data
-        types = data.get("publicationTypes")[0]
-        source = "Semantic Scholar"
-        
-        pdf_downloaded = False
-        pdf_path = None
         pdf_url = data_openAccessPdf.get("url") if data["isOpenAccess"] else None
-        citations_num = data.get("citationCount",0)
-        notes = None
-        references = None
-        citations = None
-
-        return PaperMetadata(
-            title=title,
-            authors=authors,
-            abstract=abstract,
-            doi=doi,
-            url=url,
-            publisher=publisher,
-            pub_year=pub_year,
-            journal=journal,
-            volume=volume,
-            issue=issue,
-            pages=pages,
-            keywords=keywords,
-            paper_metadata=paper_metadata,
-            type=types,
-            source=source,
-            pdf_downloaded=pdf_downloaded,
-            pdf_path=pdf_path,
-            pdf_url=pdf_url,
-            citations_num=citations_num,
-            notes=notes,
-            references=references,
-            citations=citations,
-        )
-    def get_authors(self,authors:list[dict[str,str]]) -> list[str]:
+        
+        return {
+            "title": data.get("title",""),
+            "authors": cls.get_authors(data.get("authors",[])),
+            "abstract": data.get("abstract"),
+            "doi": data_externalIds.get("DOI") if data_externalIds else None,
+            "url": pdf_url,
+            "publisher": data_publicationVenue.get("name") if data_publicationVenue else None,
+            "pub_year": data.get("year",None),
+            "journal": data_journal.get("name",None) if data_journal else None,
+            "volume": data_journal.get("volume",None) if data_journal else None,
+            "issue": data_journal.get("issue",None) if data_journal else None,
+            "pages": data_journal.get("page",None) if data_journal else None,
+            "keywords": None,
+            "paper_metadata": data,
+            "type": data.get("publicationTypes")[0],
+            "source": "Semantic Scholar",
+            "pdf_downloaded": False,
+            "pdf_path": None,
+            "pdf_url": pdf_url,
+            "citations_num": data.get("citationCount",0),
+            "notes": None,
+        }
+    @staticmethod
+    def get_authors(authors:list[dict[str,str]]) -> list[str]:
         return [
             author.get("name","") for author in authors
         ]
@@ -408,3 +393,9 @@ class SemanticScholarSearch():
         """
         papers:list[PaperMetadata] = [self.data2papers(paper) for paper in self.datas] if self.datas else []
         return papers
+
+    def export_batch(self)->PaperBatch:
+        """
+        按列导出论文,不创建PaperMetadata对象
+        """
+        return PaperBatch.from_semantic(self.datas or [])
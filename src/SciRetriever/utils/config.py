@@ -18,7 +18,8 @@ class Config:
     
     DEFAULT_CONFIG = {
         "database": {
-            "path": "sciretriever.db"
+            "path": "sciretriever.db",
+            "profile": "safe"  # SQLite连接配置: safe / concurrent / bulk-load
         },
         "proxy":{
             "http":None,
@@ -29,12 +30,26 @@ class Config:
             "rate_limit": 5.0,  # Seconds between requests
             "max_retries": 3,
             "retry_delay": 2.0,
-            "timeout": 30.0
+            "timeout": 30.0,
+            "max_connections": 100,  # AsyncNetworkClient连接池总大小
+            "max_connections_per_host": 10,
+            "rate_limit_ledger": None  # 多进程共享速率限制的SQLite文件
+        },
+        "cache": {
+            "path": None,  # None时使用~/.sciretriever/cache/http.db
+            "max_size": 1073741824,  # 1GB
+            "default_ttl": 604800  # 7天
         },
         "search": {
             "default_engine": "semantic",
             "default_limit": 10,
-            "auto_tag": False
+            "auto_tag": False,
+            # Google Scholar页面的解析后端: bs4、lxml、auto
+            "gs_parser": "bs4",
+            # Google Scholar填充bib时同时进行的请求数,1为逐个填充
+            "gs_fill_workers": 1,
+            # Google Scholar的cid -> bib存储路径,设置后GSClient自动使用
+            "gs_bib_cache": None
         },
         "tagging": {
             "model": "local",
@@ -16,6 +16,10 @@ class RetryError(SciRetrieverError):
     """Raised when there is an error searching for papers."""
     pass
 
+class NotFoundError(RetryError):
+    """Raised when the requested resource does not exist (HTTP 404 on every attempt)."""
+    pass
+
 class DownloadError(SciRetrieverError):
     """Raised when there is an error downloading a paper."""
     pass
@@ -0,0 +1,76 @@
+"""
+DOI、标题和出版社的规范化
+
+数据库中用规范化之后的DOI(doi_norm)做唯一约束,用规范化标题的哈希(title_hash)查找没有DOI的重复论文,
+入库、去重、导入导出都使用这里的函数,保证同一篇论文得到相同的结果。
+"""
+import hashlib
+import re
+import unicodedata
+
+# DOI前面常见的前缀,PaperBatch.normalize_doi在pyarrow.compute中使用同一个正则表达式
+DOI_PREFIX_PATTERN = r"^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)"
+_DOI_PREFIX = re.compile(DOI_PREFIX_PATTERN, re.IGNORECASE)
+# 标题中除了字母和数字以外的字符
+_TITLE_NOISE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_doi(doi: str | None) -> str | None:
+    """
+    规范化DOI: 去掉https://doi.org/、doi:等前缀和首尾空白,转为小写(DOI不区分大小写)
+
+    Returns:
+        规范化之后的DOI,空DOI返回None
+    """
+    if not doi:
+        return None
+    doi = _DOI_PREFIX.sub("", doi.strip()).strip().lower()
+    return doi or None
+
+
+def normalize_title(title: str | None) -> str:
+    """
+    规范化标题: NFKC规范化、转为小写,去掉标点并合并空白
+    """
+    if not title:
+        return ""
+    title = unicodedata.normalize("NFKC", title).lower()
+    return " ".join(_TITLE_NOISE.sub(" ", title).split())
+
+
+def title_hash(title: str | None) -> str | None:
+    """
+    规范化标题的哈希(sha1的前16个十六进制字符)
+
+    Returns:
+        标题的哈希,标题为空时返回None
+    """
+    title = normalize_title(title)
+    if not title:
+        return None
+    return hashlib.sha1(title.encode("utf-8")).hexdigest()[:16]
+
+
+# 出版社的别名 -> 统一的名称,不同数据源对同一个出版社的写法不同
+PUBLISHER_ALIASES: dict[str, str] = {
+    "Elsevier BV": "Elsevier",
+    "American Chemical Society (ACS)": "American Chemical Society",
+    "ACS Publications": "American Chemical Society",
+    "pubs.rsc.org": "Royal Society of Chemistry",
+    "AIP Publishing": "American Institute of Physics",
+    "Wiley Online Library": "Wiley",
+    "Springer Science and Business Media LLC": "Springer",
+}
+
+
+def canonical_publisher(publisher: str | None, aliases: dict[str, str] | None = None) -> str | None:
+    """
+    将出版社的别名转换为统一的名称,不在aliases中的名称保持不变
+
+    Args:
+        publisher: 出版社名称
+        aliases: 别名表,默认为PUBLISHER_ALIASES
+    """
+    if publisher is None:
+        return None
+    return (PUBLISHER_ALIASES if aliases is None else aliases).get(publisher, publisher)
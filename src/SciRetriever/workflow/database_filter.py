@@ -1,43 +1,28 @@
-from SciRetriever.database.optera import Query, Delete
+from SciRetriever.database.dedup import Dedup, DedupReport
+from ..utils.logging import get_logger
+logger = get_logger(__name__)
 
 
-def filter_duplicate_paper(db_dir: str):
+def filter_duplicate_paper(
+    db_dir: str,
+    near_duplicates: bool = False,
+    threshold: float = 0.9,
+) -> DedupReport:
     """
     根据论文标题和DOI去重，只要DOI相同直接去重
-    对于DOI为空的情况，仅比较标题
+    对于DOI为空的情况，仅比较标题(忽略大小写和标点)
+    重复论文的元数据合并到保留的论文中，见database.dedup.Dedup
     
     Args:
         db_dir: 数据库目录路径
+        near_duplicates: 是否同时删除标题和摘要近似的论文(MinHash/LSH)
+        threshold: 近似重复的相似度阈值
     """
-    query = Query.connect_db(db_dir=db_dir)
-    papers = query.query_all(limit=None)
-    
-    # 维护两个集合：标题集合和DOI集合
-    seen_titles = set()
-    seen_dois = set()
-    duplicate_ids = []
-    
-    for paper in papers:
-        title = paper.title.lower().strip()
-        doi = paper.doi.lower().strip() if paper.doi else ""
-        
-        # DOI为空时仅比较标题
-        if doi == "":
-            if title in seen_titles:
-                duplicate_ids.append(paper.id)
-            else:
-                seen_titles.add(title)
-        # DOI不为空时比较标题或DOI
-        else:
-            if doi in seen_dois:
-                duplicate_ids.append(paper.id)
-            else:
-                seen_dois.add(doi)
+    dedup = Dedup.connect_db(db_dir=db_dir)
+    report = dedup.run(near_duplicates=near_duplicates, threshold=threshold)
 
-    # 执行删除
-    if duplicate_ids:
-        delete = Delete.connect_db(db_dir=db_dir)
-        delete.delete_paper_id(duplicate_ids)
-        print(f"Deleted {len(duplicate_ids)} duplicate papers")
+    if report.removed:
+        logger.info(f"Deleted {report.removed} duplicate papers")
     else:
-        print("No duplicate papers found")
\ No newline at end of file
+        logger.info("No duplicate papers found")
+    return report
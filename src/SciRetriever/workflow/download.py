@@ -0,0 +1,383 @@
+"""
+从papers表中批量下载全文
+
+按照出版社或DOI前缀把未下载的论文分配给不同的Retriver,
+每个Retriver有自己的并发数和速率预算,下载结果分批写回数据库。
+
+示例：
+    optera = Optera.connect_db("all.db")
+    manager = DownloadManager(
+        optera=optera,
+        routes=[
+            DownloadRoute("elsevier", ElsevierRetriver(ElsevierClient(api_key)), publishers=["Elsevier"], concurrency=4),
+            DownloadRoute("wiley", WileyRetriver(WileyClient(api_key)), doi_prefixes=["10.1002/"], concurrency=2),
+            DownloadRoute("scihub", ScihubRetriver(ScihubClient()), concurrency=2, rate_limit=10),
+        ],
+        download_path="./pdf",
+    )
+    report = manager.run()
+
+    多个进程或多台机器共享同一个数据库时,传入queue,论文通过jobs表的租约分配,不会重复下载：
+    manager = DownloadManager(optera=optera, routes=routes, queue=JobQueue.connect_db("all.db"))
+"""
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import requests
+from sqlalchemy import and_, func, not_, or_, select, true, update
+
+from ..database.model import Paper
+from ..database.optera import JobQueue, Optera
+from ..network import RateLimiter
+from ..retriver.elsevier import ElsevierRetriver
+from ..retriver.retriver import BaseRetriver
+from ..retriver.web import WebRetriver
+from ..utils.exceptions import NotFoundError
+from ..utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class DownloadRoute:
+    """
+    一条下载路线
+
+    name: 路线名称,同时作为下载子目录的名称
+    retriver: 负责下载的Retriver
+    publishers: 匹配的出版社名称(不区分大小写)
+    doi_prefixes: 匹配的DOI前缀,例如"10.1002/"
+    concurrency: 该路线同时进行的下载数
+    rate_limit: 该路线两次下载之间的最小间隔秒数,None表示只使用客户端自身的速率限制
+    limits: 该路线额外的(请求数, 秒数)窗口
+    publishers和doi_prefixes都为空时,该路线匹配所有论文(通常作为最后一条路线,例如scihub)
+    """
+    name: str
+    retriver: BaseRetriver
+    publishers: list[str] = field(default_factory=list)
+    doi_prefixes: list[str] = field(default_factory=list)
+    concurrency: int = 1
+    rate_limit: float | None = None
+    limits: list[tuple[float, float]] | None = None
+
+    def __post_init__(self):
+        self._publishers = {publisher.lower() for publisher in self.publishers}
+        self._doi_prefixes = tuple(prefix.lower() for prefix in self.doi_prefixes)
+        self.rate_limiter: RateLimiter | None = None
+        if self.rate_limit is not None or self.limits:
+            self.rate_limiter = RateLimiter(self.rate_limit, limits=self.limits)
+
+    def sql_filter(self) -> Any:
+        """与matches等价的SQL条件"""
+        if not self._publishers and not self._doi_prefixes:
+            return true()
+        conditions = []
+        if self._publishers:
+            conditions.append(func.lower(Paper.publisher).in_(self._publishers))
+        # SQLite的LIKE对ASCII不区分大小写
+        conditions.extend(Paper.doi.startswith(prefix, autoescape=True) for prefix in self._doi_prefixes)
+        return or_(*conditions)
+
+    def matches(self, doi: str, publisher: str | None) -> bool:
+        if not self._publishers and not self._doi_prefixes:
+            return True
+        if publisher and publisher.lower() in self._publishers:
+            return True
+        return doi.lower().startswith(self._doi_prefixes) if self._doi_prefixes else False
+
+    def fetch(self, doi: str, pdf_url: str | None, download_path: Path) -> Path:
+        """
+        下载一篇论文,返回保存的路径
+
+        各个Retriver表示论文不存在的方式不同(HTTPError 404、客户端的NotFoundError、Sci-Hub页面没有下载链接),
+        统一转换为NotFoundError,DownloadManager不会重试这些论文
+        """
+        try:
+            return self._fetch(doi, pdf_url, download_path)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                raise NotFoundError(f"{doi} not found (404): {e}") from e
+            raise
+
+    def _fetch(self, doi: str, pdf_url: str | None, download_path: Path) -> Path:
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+        name = doi.replace('/', '_')
+        if isinstance(self.retriver, ElsevierRetriver):
+            self.retriver.download_xml(doi=doi, name=name, download_path=download_path)
+            return download_path / f"{name}.xml"
+        if isinstance(self.retriver, WebRetriver):
+            if not pdf_url:
+                raise ValueError(f"{doi} has no pdf_url")
+            self.retriver.download_pdf(url=pdf_url, name=name, download_path=download_path)
+            return download_path / f"{name}.pdf"
+        self.retriver.download_pdf(doi=doi, name=name, download_path=download_path)
+        return download_path / f"{name}.pdf"
+
+
+@dataclass
+class DownloadReport:
+    """一次下载任务的统计"""
+    downloaded: int = 0
+    failed: int = 0
+    not_found: int = 0
+    unrouted: int = 0
+    per_route: dict[str, int] = field(default_factory=dict)
+
+
+class DownloadManager:
+    """
+    并发下载papers表中pdf_downloaded为False的论文
+    """
+    def __init__(
+        self,
+        optera: Optera,
+        routes: list[DownloadRoute],
+        download_path: str | Path | None = None,
+        batch_size: int = 100,
+        page_size: int = 1000,
+        queue: JobQueue | None = None,
+        job_kind: str = "download",
+    ) -> None:
+        """
+        Args:
+            optera: 数据库操作单元
+            routes: 下载路线,按顺序匹配
+            download_path: 下载根目录,每条路线保存在其下的name子目录中
+            batch_size: 每多少条下载结果提交一次数据库
+            page_size: 每次从数据库读取的待下载论文数
+            queue: 任务队列,提供时通过领取任务的方式获取待下载的论文,可以由多个worker同时运行
+            job_kind: 队列中下载任务的类型
+        """
+        self.optera = optera
+        self.routes = routes
+        self.download_path = Path(download_path) if download_path else Path.cwd()
+        self.batch_size = batch_size
+        self.page_size = page_size
+        self.queue = queue
+        self.job_kind = job_kind
+
+    def route(self, doi: str, publisher: str | None) -> DownloadRoute | None:
+        for route in self.routes:
+            if route.matches(doi, publisher):
+                return route
+        return None
+
+    def _route_filters(self) -> list[Any]:
+        """
+        每条路线在SQL中的过滤条件
+
+        与route()一致,论文只属于第一条匹配的路线,因此每条路线都要排除前面路线匹配的论文
+        """
+        filters = []
+        previous = []
+        for route in self.routes:
+            condition = route.sql_filter()
+            filters.append(and_(condition, not_(or_(*previous))) if previous else condition)
+            previous.append(condition)
+        return filters
+
+    def _pending(self, condition: Any, limit: int | None = None):
+        """按照id分页读取某条路线待下载的论文,只读取需要的列"""
+        last_id = 0
+        count = 0
+        while True:
+            with self.optera.transaction() as session:
+                rows = session.execute(
+                    select(Paper.id, Paper.doi, Paper.pdf_url)
+                    .where(Paper.pdf_downloaded == False, Paper.doi.isnot(None), Paper.id > last_id, condition)
+                    .order_by(Paper.id)
+                    .limit(self.page_size)
+                ).all()
+            if not rows:
+                return
+            for row in rows:
+                yield row
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+            last_id = rows[-1].id
+
+    def _claimed(self, condition: Any, batch: int, limit: int | None = None):
+        """从任务队列中分批领取某条路线的任务,每批只领取少量任务,避免租约在排队时过期"""
+        count = 0
+        while limit is None or count < limit:
+            size = batch if limit is None else min(batch, limit - count)
+            jobs = self.queue.claim(self.job_kind, limit=size, filters=[condition])
+            if not jobs:
+                return
+            with self._held_lock:
+                self._held.update(job["id"] for job in jobs)
+            job_ids = {job["paper_id"]: job["id"] for job in jobs}
+            with self.optera.transaction() as session:
+                rows = session.execute(
+                    select(Paper.id, Paper.doi, Paper.pdf_url).where(Paper.id.in_(job_ids)).order_by(Paper.id)
+                ).all()
+            for paper_id, doi, pdf_url in rows:
+                yield job_ids[paper_id], paper_id, doi, pdf_url
+            count += len(jobs)
+
+    def _release_held(self, job_ids: list[int]) -> None:
+        with self._held_lock:
+            self._held.difference_update(job_ids)
+
+    def _renew_held(self) -> None:
+        """为已经领取但还没有ack/fail的任务续租,包括正在下载的和等待分批提交的"""
+        with self._held_lock:
+            held = list(self._held)
+        if not held:
+            return
+        renewed = self.queue.renew(held)
+        if renewed < len(held):
+            logger.warning(f"Lost the lease of {len(held) - renewed} download jobs, they may be downloaded again by another worker")
+
+    def _count_unrouted(self) -> int:
+        routed = or_(*(route.sql_filter() for route in self.routes))
+        with self.optera.transaction() as session:
+            return session.execute(
+                select(func.count(Paper.id))
+                .where(Paper.pdf_downloaded == False, Paper.doi.isnot(None), not_(routed))
+            ).scalar_one()
+
+    def _commit(self, results: list[dict[str, Any]], job_ids: list[int]) -> None:
+        if not results:
+            return
+        with self.optera.transaction() as session:
+            session.execute(update(Paper), results)
+        if self.queue is not None:
+            self.queue.ack(job_ids)
+            self._release_held(job_ids)
+        logger.info(f"Committed {len(results)} downloaded papers")
+        results.clear()
+        job_ids.clear()
+
+    def _feed(
+        self,
+        route: DownloadRoute,
+        condition: Any,
+        limit: int | None,
+        outcomes: "queue.Queue[tuple[DownloadRoute, int | None, int, str, Path | None, Exception | None]]",
+        errors: list[Exception],
+    ) -> None:
+        """
+        读取一条路线的待下载论文并提交给该路线的线程池
+
+        每条路线只保留有限数量的排队任务,慢的路线不会阻塞快的路线。
+        读取或领取任务时的异常(例如数据库被锁定)记录在errors中,由run在结束时重新抛出
+        """
+        try:
+            self._submit(route, condition, limit, outcomes)
+        except Exception as e:
+            logger.error(f"[{route.name}] Stopped reading pending papers, error: {e}")
+            errors.append(e)
+
+    def _submit(
+        self,
+        route: DownloadRoute,
+        condition: Any,
+        limit: int | None,
+        outcomes: queue.Queue,
+    ) -> None:
+        slots = threading.BoundedSemaphore(2 * route.concurrency)
+        with ThreadPoolExecutor(max_workers=route.concurrency, thread_name_prefix=route.name) as executor:
+            if self.queue is not None:
+                papers = self._claimed(condition, 2 * route.concurrency, limit)
+            else:
+                papers = ((None, *row) for row in self._pending(condition, limit))
+            for job_id, paper_id, doi, pdf_url in papers:
+                slots.acquire()
+                route_path = self.download_path / route.name
+
+                def job(job_id=job_id, paper_id=paper_id, doi=doi, pdf_url=pdf_url, route_path=route_path) -> None:
+                    try:
+                        path = route.fetch(doi, pdf_url, route_path)
+                        outcomes.put((route, job_id, paper_id, doi, path, None))
+                    except Exception as e:
+                        outcomes.put((route, job_id, paper_id, doi, None, e))
+                    finally:
+                        slots.release()
+
+                executor.submit(job)
+
+    def run(self, limit: int | None = None) -> DownloadReport:
+        """
+        下载所有待下载的论文
+
+        每条路线由一个读取线程从数据库中分页读取属于自己的论文,交给该路线自己的线程池下载;
+        下载结果统一由调用线程分批写回数据库。
+        使用任务队列时,调用线程每隔租约的三分之一为还没有ack的任务续租,
+        下载慢或者batch_size较大时租约也不会在提交之前过期
+
+        Args:
+            limit: 每条路线最多处理的论文数,None表示全部
+
+        Returns:
+            DownloadReport
+
+        Raises:
+            读取线程中的异常,在已经完成的下载结果提交之后重新抛出
+        """
+        report = DownloadReport(per_route={route.name: 0 for route in self.routes})
+        report.unrouted = self._count_unrouted()
+        if self.queue is not None:
+            self.queue.enqueue_pending(self.job_kind)
+        outcomes: queue.Queue = queue.Queue()
+        results: list[dict[str, Any]] = []
+        job_ids: list[int] = []
+        errors: list[Exception] = []
+        self._held: set[int] = set()
+        self._held_lock = threading.Lock()
+        renew_interval = self.queue.lease / 3 if self.queue is not None else None
+        next_renew = time.monotonic() + renew_interval if renew_interval else None
+
+        feeders = []
+        for route, condition in zip(self.routes, self._route_filters()):
+            (self.download_path / route.name).mkdir(parents=True, exist_ok=True)
+            feeder = threading.Thread(target=self._feed, args=(route, condition, limit, outcomes, errors), name=f"{route.name}-feeder", daemon=True)
+            feeder.start()
+            feeders.append(feeder)
+
+        try:
+            while any(feeder.is_alive() for feeder in feeders) or not outcomes.empty():
+                if next_renew is not None and time.monotonic() >= next_renew:
+                    self._renew_held()
+                    next_renew = time.monotonic() + renew_interval
+                try:
+                    route, job_id, paper_id, doi, path, error = outcomes.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if error is None:
+                    report.downloaded += 1
+                    report.per_route[route.name] += 1
+                    results.append({"id": paper_id, "pdf_downloaded": True, "pdf_path": str(path)})
+                    if job_id is not None:
+                        job_ids.append(job_id)
+                    if len(results) >= self.batch_size:
+                        self._commit(results, job_ids)
+                elif isinstance(error, NotFoundError):
+                    report.not_found += 1
+                    logger.info(f"[{route.name}] {doi} not found")
+                    if job_id is not None:
+                        self.queue.fail(job_id, str(error), retry=False)
+                        self._release_held([job_id])
+                else:
+                    report.failed += 1
+                    logger.warning(f"[{route.name}] Download {doi} failed, error: {error}")
+                    if job_id is not None:
+                        self.queue.fail(job_id, str(error))
+                        self._release_held([job_id])
+        finally:
+            self._commit(results, job_ids)
+            if self.queue is not None:
+                # 中断时归还还没有完成的任务
+                self.queue.release()
+
+        if errors:
+            raise errors[0]
+        logger.info(f"Download finished: {report}")
+        return report
@@ -22,8 +22,9 @@ def insert_paper_to_db(
         papers = papermetadata
     logger.info(f"Inserting {len(papers)} papers")
     
-    papers = [paper.export_paper() for paper in papers]
-    insert.from_paper_list(papers)
+    # 以DOI为唯一键批量插入,已经存在的论文按照合并规则更新
+    result = insert.upsert(paper.to_row() for paper in papers)
     
-    logger.info(f"Insert done")
+    logger.info(f"Insert done: {result.inserted} inserted, {result.updated} updated, {result.skipped} skipped")
+    return result
     
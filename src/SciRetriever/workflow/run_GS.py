@@ -13,6 +13,9 @@ def run_year(
     root_dir:str|Path|None = None,
     max_cycles:int = 5,
     log_path:str|Path|None = None,
+    lean:bool = False,
+    archive_html:bool = False,
+    fill_workers:int|None = None,
     ):
     """
     从start_year开始,下载query在start_year到cut_year年之间的所有相关论文
@@ -26,6 +29,9 @@ def run_year(
         root_dir (str|Path|None, optional): 保存路径. Defaults to None.
         max_cycles (int, optional): 最大重试次数. Defaults to 5.
         log_path (str|Path|None, optional): 日志路径. Defaults to None.
+        lean (bool, optional): 每一页解析后丢弃soup和html,减少长时间运行的内存占用. Defaults to False.
+        archive_html (bool, optional): lean模式下将html压缩保存到每年目录下的html文件夹. Defaults to False.
+        fill_workers (int|None, optional): is_fill时同时进行的bib请求数,默认为配置中的search.gs_fill_workers. Defaults to None.
     """
     if root_dir is None:
         root_dir = Path.cwd()
@@ -50,19 +56,20 @@ def run_year(
             logger.warning(f"{year_dir}不存在,将创建")
             year_dir.mkdir(parents=True, exist_ok=True)
         try:
-            totle_GS = GSWorkplace.from_root_dir(year_dir,session=session)
+            totle_GS = GSWorkplace.from_root_dir(year_dir,session=session,lean=lean,archive_html=archive_html)
         except FileNotFoundError:
-            logger.info("未找到page_1.json,将重新下载")
+            logger.info("未找到page_1,将重新下载")
             result = searcher.search_publication(query,year_low=year,year_high=year)
-            totle_GS = GSWorkplace(start_page=result,root_dir=year_dir)
+            totle_GS = GSWorkplace(start_page=result,root_dir=year_dir,lean=lean,archive_html=archive_html)
 
-        if not totle_GS.pages[-1].next_url and not (is_fill and not all([page.filled for page in totle_GS.pages])):
+        # 只查询crawl.db,不读取所有的页
+        if not totle_GS.has_next and not (is_fill and not totle_GS.filled):
             logger.info(f"{year}年已经下载完成")
             continue
         
         for _ in range(max_cycles):
             try:
-                totle_GS.run(is_fill=is_fill)
+                totle_GS.run(is_fill=is_fill,fill_workers=fill_workers)
 
             except IndexError as e:
                 logger.error(f"{year}年下载失败,错误信息:{e}")
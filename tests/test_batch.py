@@ -0,0 +1,61 @@
+"""
+PaperBatch的测试,安装了pyarrow时按列计算的结果必须与列表的实现完全相同
+"""
+import pytest
+
+from SciRetriever.model import batch as batch_module
+from SciRetriever.model.batch import PaperBatch
+from SciRetriever.utils.normalize import canonical_publisher, normalize_doi
+
+ROWS = [
+    {"title": "a", "doi": " https://doi.org/10.1000/ABC ", "type": "Journal-Article", "pub_year": "2020",
+     "publisher": "Elsevier BV", "citations_num": 3, "paper_metadata": {"x": 1}},
+    {"title": "b", "doi": "DOI: 10.1000/def", "type": "book", "pub_year": 1999, "publisher": "Wiley"},
+    {"title": "c", "doi": "", "type": None, "pub_year": None, "publisher": None, "authors": ["A", "B"]},
+    {"title": "d", "doi": None, "type": "journal-article", "pub_year": 2024, "publisher": "Wiley Online Library",
+     "volume": 12},
+    {"title": "e", "doi": "https://dx.doi.org/10.1/x", "type": "JOURNAL-ARTICLE", "pub_year": "n/a",
+     "volume": "13"},
+]
+
+
+@pytest.fixture(params=[True, False], ids=["arrow", "list"])
+def arrow(request, monkeypatch):
+    if request.param and not batch_module.PYARROW:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(batch_module, "PYARROW", request.param)
+    return request.param
+
+
+def test_masks_and_select(arrow):
+    batch = PaperBatch.from_rows(ROWS)
+    if arrow:
+        assert isinstance(batch.columns["type"], batch_module.pa.Array)
+    assert batch.type_mask(["journal-article"]) == [True, False, False, True, True]
+    assert batch.year_mask(2000, 2024) == [True, False, False, True, False]
+    assert batch.year_mask(end=2020) == [True, True, False, False, False]
+    assert batch.isin_mask("publisher", ["Wiley", "Elsevier BV"]) == [True, True, False, False, False]
+    assert batch.isin_mask("volume", [12]) == [False, False, False, True, False]
+    assert batch.notnull_mask("doi") == [True, True, False, False, True]
+
+    selected = batch.select(batch.type_mask(["journal-article"]) & ~batch.year_mask(start=2024))
+    assert selected["title"] == ["a", "e"]
+    assert next(selected.to_rows())["paper_metadata"] == {"x": 1}
+    assert PaperBatch.concat([selected, batch.take([2])])["authors"] == [None, None, ["A", "B"]]
+
+
+def test_normalizers_match_row_functions(arrow):
+    batch = PaperBatch.from_rows(ROWS)
+    assert batch.normalize_doi() == [normalize_doi(row.get("doi")) for row in ROWS]
+    batch.canonicalize_publisher()
+    assert batch["publisher"] == [canonical_publisher(row.get("publisher")) for row in ROWS]
+    batch.fill("source", "Crossref")
+    assert set(batch["source"]) == {"Crossref"}
+
+
+@pytest.mark.skipif(not batch_module.PYARROW, reason="pyarrow is not installed")
+def test_arrow_roundtrip():
+    # volume类型混杂的行无法转换为Arrow
+    batch = PaperBatch.from_rows(ROWS[:4])
+    restored = PaperBatch.from_arrow(batch.to_arrow())
+    assert list(restored.to_rows()) == list(batch.to_rows())
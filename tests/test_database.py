@@ -0,0 +1,84 @@
+"""
+数据库写入与任务队列的测试,每个测试使用tmp_path中独立的SQLite数据库
+"""
+from sqlalchemy import inspect, select, text
+
+from SciRetriever.database.model import Paper, paper_citation_association
+from SciRetriever.database.optera import Insert, JobQueue, Query
+
+
+def connect(tmp_path) -> Insert:
+    return Insert.connect_db(tmp_path / "papers.db")
+
+
+def test_insert_sets_id_and_merges_duplicate_doi(tmp_path):
+    insert = connect(tmp_path)
+    first = Paper(title="Cobalt catalysts", doi="10.1000/ABC")
+    insert.from_paper(first)
+    assert first.id is not None
+
+    again = Paper(title="Cobalt catalysts", doi="https://doi.org/10.1000/abc", citations_num=5)
+    insert.from_paper_list([again, Paper(title="No DOI")])
+    assert again.id == first.id
+
+    with insert.engine.connect() as conn:
+        rows = conn.execute(select(Paper.id, Paper.citations_num).order_by(Paper.id)).all()
+    assert len(rows) == 2
+    assert rows[0].citations_num == 5
+
+
+def test_insert_writes_cited_papers(tmp_path):
+    insert = connect(tmp_path)
+    cited = Paper(title="Cited", doi="10.1000/cited")
+    citing = Paper(title="Citing", doi="10.1000/citing")
+    citing.cited_papers.append(cited)
+    insert.from_paper(citing)
+
+    with insert.engine.connect() as conn:
+        links = conn.execute(select(paper_citation_association)).all()
+    assert links == [(citing.id, cited.id)]
+
+
+def test_insert_without_unique_doi_index(tmp_path):
+    insert = connect(tmp_path)
+    # 旧数据库中存在重复DOI时create_indexes只能创建普通索引
+    with insert.engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_papers_doi_norm"))
+        conn.execute(text("CREATE INDEX ix_papers_doi_norm ON papers (doi_norm)"))
+        conn.execute(text(
+            "INSERT INTO papers (title, doi, doi_norm, created_at, pdf_downloaded) "
+            "VALUES ('a', '10.1/x', '10.1/x', '2024-01-01', 0), ('b', '10.1/x', '10.1/x', '2024-01-01', 0)"
+        ))
+    paper = Paper(title="c", doi="10.1/x")
+    insert.from_paper(paper)
+    assert paper.id == 3
+
+
+def test_enqueue_pending(tmp_path):
+    queue = JobQueue.connect_db(tmp_path / "papers.db")
+    Insert(queue.engine).from_paper_list([
+        Paper(title="a", doi="10.1/a"),
+        Paper(title="b", doi="10.1/b", pdf_downloaded=True),
+        Paper(title="c"),
+    ])
+    assert queue.enqueue_pending("download") == 1
+    # 没有过滤条件时加入全部论文,已经存在的任务被忽略
+    assert queue.enqueue_pending("download", filters=[]) == 2
+    assert queue.enqueue_pending("download", filters=[]) == 0
+    assert queue.stats("download") == {"pending": 3}
+
+
+def test_query_closes_sessions(tmp_path):
+    connect(tmp_path).from_paper_list([Paper(title=f"p{i}", doi=f"10.1/{i}") for i in range(3)])
+    query = Query.connect_db(tmp_path / "papers.db")
+    papers = query.select()
+    assert [paper.title for paper in papers] == ["p0", "p1", "p2"]
+    assert inspect(papers[0]).detached
+    assert query._active_sessions == []
+
+    with Query.connect_db(tmp_path / "papers.db", keep_sessions=True) as query:
+        paper = query.select(limit=1)[0]
+        # 会话保持打开,可以继续延迟加载关联关系
+        assert paper.cited_papers.count() == 0
+        assert len(query._active_sessions) == 1
+    assert query._active_sessions == []
@@ -0,0 +1,95 @@
+"""
+DownloadManager的测试,下载由不访问网络的Retriver模拟
+"""
+import threading
+import time
+
+import pytest
+import requests
+from sqlalchemy import select
+
+from SciRetriever.database.model import Job, Paper
+from SciRetriever.database.optera import Insert, JobQueue
+from SciRetriever.retriver.retriver import BaseRetriver
+from SciRetriever.utils.exceptions import NotFoundError
+from SciRetriever.workflow.download import DownloadManager, DownloadRoute
+
+
+class FakeRetriver(BaseRetriver):
+    """DOI以404结尾时模拟论文不存在,以500结尾时模拟服务器错误"""
+    def __init__(self):
+        super().__init__(client=None)
+
+    def download_pdf(self, doi, name, download_path):
+        if doi.endswith("404"):
+            response = requests.Response()
+            response.status_code = 404
+            raise requests.HTTPError("404 Client Error", response=response)
+        if doi.endswith("500"):
+            raise RuntimeError("server error")
+        (download_path / f"{name}.pdf").write_bytes(b"%PDF")
+
+
+@pytest.fixture
+def queue(tmp_path) -> JobQueue:
+    queue = JobQueue.connect_db(tmp_path / "papers.db", lease=3)
+    Insert(queue.engine).from_paper_list([
+        Paper(title="ok", doi="10.1/ok"),
+        Paper(title="missing", doi="10.1/404"),
+        Paper(title="broken", doi="10.1/500"),
+    ])
+    return queue
+
+
+def test_not_found_is_not_retried(queue, tmp_path):
+    route = DownloadRoute("fake", FakeRetriver())
+    manager = DownloadManager(optera=queue, routes=[route], download_path=tmp_path / "pdf", queue=queue)
+    report = manager.run()
+    assert (report.downloaded, report.not_found) == (1, 1)
+    # 服务器错误回到pending可以重试,论文不存在只尝试一次
+    with queue.engine.connect() as conn:
+        jobs = dict(conn.execute(select(Paper.doi, Job.state).join(Job, Job.paper_id == Paper.id)).all())
+        attempts = conn.execute(select(Job.attempts).join(Paper, Job.paper_id == Paper.id).where(Paper.doi == "10.1/404")).scalar_one()
+    assert jobs == {"10.1/ok": "done", "10.1/404": "failed", "10.1/500": jobs["10.1/500"]}
+    assert attempts == 1
+
+
+def test_route_normalizes_not_found(tmp_path):
+    route = DownloadRoute("fake", FakeRetriver())
+    with pytest.raises(NotFoundError):
+        route.fetch("10.1/404", None, tmp_path)
+
+
+def test_feeder_error_is_raised(queue, tmp_path, monkeypatch):
+    def claim(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    monkeypatch.setattr(queue, "claim", claim)
+    manager = DownloadManager(optera=queue, routes=[DownloadRoute("fake", FakeRetriver())], download_path=tmp_path / "pdf", queue=queue)
+    with pytest.raises(RuntimeError, match="database is locked"):
+        manager.run()
+
+
+def test_leases_are_renewed_until_commit(tmp_path):
+    class SlowRetriver(FakeRetriver):
+        def download_pdf(self, doi, name, download_path):
+            time.sleep(1)
+            super().download_pdf(doi, name, download_path)
+
+    queue = JobQueue.connect_db(tmp_path / "papers.db", lease=1.5)
+    Insert(queue.engine).from_paper_list([Paper(title=f"p{i}", doi=f"10.1/p{i}") for i in range(3)])
+    # batch_size大于论文数,全部下载完成之前不会提交,第一个任务在提交之前已经超过了租约时长
+    manager = DownloadManager(
+        optera=queue, routes=[DownloadRoute("fake", SlowRetriver())], download_path=tmp_path / "pdf",
+        queue=queue, batch_size=100,
+    )
+    other = JobQueue(queue.engine, owner="other", lease=1.5)
+    thread = threading.Thread(target=manager.run)
+    thread.start()
+    claimed = []
+    while thread.is_alive():
+        time.sleep(0.2)
+        claimed.extend(other.claim("download", limit=10))
+    thread.join()
+    assert claimed == []
+    assert queue.stats("download") == {"done": 3}
@@ -0,0 +1,118 @@
+"""
+GoogleScholar.fill_all_bib的测试,bib请求由本地HTTP服务器模拟
+"""
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from SciRetriever.searcher.google_scholar import _BIBCITE, GoogleScholar, GSClient, GSPageError, GSRow
+
+WORKERS = 4
+
+
+class ScholarHandler(BaseHTTPRequestHandler):
+    """前WORKERS个请求同时到达之后一起返回403,之后返回引用弹窗和bibtex"""
+    barrier = threading.Barrier(WORKERS, timeout=5)
+    denied = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            deny = ScholarHandler.denied < WORKERS
+            ScholarHandler.denied += 1
+        if deny:
+            self.barrier.wait()
+            return self.reply(403, "")
+        cid = re.search(r"info:(\w+):|/bib/(\w+)", self.path)
+        if self.path.startswith("/bib/"):
+            cid = cid.group(2)
+            return self.reply(200, f"@article{{{cid},\n  title={{Paper {cid}}},\n  author={{A, B and C, D}},\n  year={{2024}}\n}}")
+        host = f"http://{self.headers['Host']}"
+        return self.reply(200, f'<a class="gs_citi" href="{host}/bib/{cid.group(1)}">BibTeX</a>')
+
+    def reply(self, status, body):
+        data = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    ScholarHandler.denied = 0
+    ScholarHandler.barrier.reset()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ScholarHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_fill_all_bib_concurrent(server):
+    client = GSClient(rate_limit=0.001, retry_delay=0.01, max_retries=3)
+    client.base_url = server
+    created = []
+    create_session = client._create_session
+
+    def counting_create_session():
+        created.append(create_session())
+        return created[-1]
+
+    client._create_session = counting_create_session
+    first_session = client.session
+    rows = [
+        GSRow(session=client, cid=f"c{i}", pos=i, url_scholarbib=_BIBCITE.format(f"c{i}", i), bib={})
+        for i in range(WORKERS)
+    ]
+    page = GoogleScholar(rows=rows, page_num=1, totle_results=WORKERS, session=client)
+    filled = []
+    page.fill_all_bib(workers=WORKERS, on_filled=filled.append)
+
+    assert page.filled
+    assert sorted(row.cid for row in filled) == [f"c{i}" for i in range(WORKERS)]
+    assert all(row.bib["title"] == f"Paper {row.cid}" and row.bib["author"] == ["A, B", "C, D"] for row in rows)
+    # 所有线程同时在同一个session上遇到403,只更换一次
+    assert len(created) == 1
+    assert client.session is created[0] is not first_session
+
+
+class StubClient(GSClient):
+    """不访问网络,bibtex页面依次返回pages中的内容"""
+    def __init__(self, pages):
+        super().__init__(max_retries=3)
+        self.pages = list(pages)
+        self.requests = 0
+
+    def get_page_html(self, scholar_url):
+        if "output=cite" in scholar_url:
+            return '<a class="gs_citi" href="/bib/c0">BibTeX</a>'
+        self.requests += 1
+        return self.pages.pop(0)
+
+
+BIBTEX = "@article{c0,\n  title={Paper c0},\n  author={A, B},\n  year={2024}\n}"
+
+
+def test_load_bib_restored_row():
+    client = StubClient(["<html>AutoJump</html>", BIBTEX])
+    # 从字典恢复的row没有bib
+    row = GSRow.from_dict({"cid": "c0", "pos": 0, "url_scholarbib": _BIBCITE.format("c0", 0), "bib": None}, client)
+    row.load_bib()
+    assert row.filled and row.bib["title"] == "Paper c0"
+    assert client.requests == 2
+
+
+def test_load_bib_autojump_is_bounded():
+    client = StubClient(["<html>AutoJump</html>"] * 5)
+    row = GSRow(session=client, cid="c0", pos=0, url_scholarbib=_BIBCITE.format("c0", 0))
+    with pytest.raises(GSPageError):
+        row.load_bib()
+    assert client.requests == client.max_retries
+    assert not row.filled
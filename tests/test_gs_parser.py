@@ -0,0 +1,131 @@
+"""
+Google Scholar解析后端的一致性测试
+
+fixtures/gs中保存了结果页面(第一页、最后一页)、验证码页面和镜像网站的AutoJump页面,
+bs4和lxml两个后端对每个页面的解析结果必须完全相同。
+"""
+from pathlib import Path
+
+import pytest
+
+from SciRetriever.searcher.google_scholar import GSCaptchaError, GSClient
+from SciRetriever.searcher.gs_parser import LXML, BS4Parser, GSParser, LxmlParser, compare_backends, get_parser
+
+FIXTURES = Path(__file__).parent / "fixtures" / "gs"
+PAGES = sorted(path.name for path in FIXTURES.glob("*.html"))
+NOT_SCHOLAR = ["autojump.html", "captcha.html", "dos_captcha.html"]
+
+requires_lxml = pytest.mark.skipif(not LXML, reason="lxml is not installed")
+
+
+def parsers() -> list[GSParser]:
+    return [BS4Parser(), LxmlParser()] if LXML else [BS4Parser()]
+
+
+def load(name: str) -> str:
+    return (FIXTURES / name).read_text(encoding="utf-8")
+
+
+@pytest.fixture(scope="module")
+def client() -> GSClient:
+    return GSClient()
+
+
+@requires_lxml
+@pytest.mark.parametrize("name", PAGES)
+def test_backends_identical(name):
+    html = load(name)
+    expected = BS4Parser().parse(html).comparable()
+    actual = LxmlParser().parse(html).comparable()
+    assert actual == expected
+    assert compare_backends(html) == []
+
+
+def test_first_page():
+    for parser in parsers():
+        page = parser.parse(load("results_page1.html"))
+        assert page.is_scholar
+        # 广告没有data-cid,计入found但不在rows中
+        assert page.found == 7
+        assert [row["cid"] for row in page.rows] == [
+            "AbC-123_xY", "book_Q9w", "cit-only77", "htmlX_55", "yr-only-1", "proc_ZZ9",
+        ]
+        assert page.next_url == "/scholar?start=10&q=cobalt+catalyst&hl=en&as_sdt=0,5"
+        assert page.page_num == 1
+        assert page.totle_results == 12300
+
+
+def test_first_page_rows():
+    rows = {row["cid"]: row for row in BS4Parser().parse(load("results_page1.html")).rows}
+
+    article = rows["AbC-123_xY"]
+    assert article["title"] == "Single-atom cobalt catalysts for the oxygen reduction reaction"
+    assert article["author"] == ["J Wang", "Y Li", "X Zhang"]
+    assert article["journal"] == "Journal of the American Chemical Society"
+    assert article["pub_year"] == 2020
+    assert article["publisher"] == "ACS Publications"
+    assert article["num_citations"] == 1024
+    assert article["pdf_url"] == "https://pubs.acs.org/doi/pdf/10.1021/jacs.0c01234"
+    assert article["abstract"].startswith("Single-atom cobalt sites")
+
+    assert rows["book_Q9w"]["pub_type"] == "BOOK"
+    assert rows["book_Q9w"]["author"] == ["G Ertl", "H Knözinger", "J Weitkamp"]
+
+    citation = rows["cit-only77"]
+    assert citation["pub_type"] is None
+    assert citation["title"] == "Kinetics of CO oxidation over Co3O4 nanorods"
+    assert citation["pub_url"] == ""
+    assert citation["cite_url"] is None
+
+    assert rows["htmlX_55"]["title"] == "Co–N–C & Fe–N–C: a “review” of catalyst design"
+    assert rows["yr-only-1"]["abstract"] is None
+    assert rows["yr-only-1"]["related_url"] is None
+
+
+def test_last_page():
+    for parser in parsers():
+        page = parser.parse(load("results_last_page.html"))
+        assert page.is_scholar
+        assert page.next_url is None
+        assert page.page_num == 7
+        # 第二页之后的 Page 7 of about 65 results 不提取总数
+        assert page.totle_results == 0
+        assert [row["pub_type"] for row in page.rows] == ["ARTICLE", "ARTICLE"]
+
+
+@pytest.mark.parametrize("name", NOT_SCHOLAR)
+def test_not_scholar(name):
+    for parser in parsers():
+        page = parser.parse(load(name))
+        assert not page.is_scholar
+        assert page.rows == []
+        assert page.next_url is None
+
+
+def test_captcha_detection(client):
+    assert client._requests_has_captcha(load("captcha.html"))
+    assert not client._requests_has_captcha(load("results_page1.html"))
+    assert not client._requests_has_captcha(load("results_last_page.html"))
+    with pytest.raises(GSCaptchaError):
+        client._requests_has_captcha(load("dos_captcha.html"))
+
+
+def test_autojump_detection(client):
+    html = load("autojump.html")
+    # 镜像网站的验证页面不是验证码,由get_page_html按AutoJump处理
+    assert "AutoJump" in html
+    assert not client._requests_has_captcha(html)
+    for name in PAGES:
+        if name != "autojump.html":
+            assert "AutoJump" not in load(name)
+
+
+def test_get_parser():
+    assert isinstance(get_parser("bs4"), BS4Parser)
+    assert isinstance(get_parser("auto"), LxmlParser if LXML else BS4Parser)
+    parser = BS4Parser()
+    assert get_parser(parser) is parser
+    with pytest.raises(ValueError):
+        get_parser("selectolax")
+    with pytest.raises(TypeError):
+        GSParser()
@@ -0,0 +1,40 @@
+"""
+按主机共享的令牌桶
+"""
+from SciRetriever.network.ratelimit import RateLimiter, set_host_limits
+
+WILEY_LIMITS = [(3, 1.0), (60, 600.0)]
+
+
+def test_same_limits_share_bucket():
+    first = RateLimiter(limits=WILEY_LIMITS)
+    second = RateLimiter(limits=list(reversed(WILEY_LIMITS)))
+    url = "https://api.wiley.test/articles/1"
+    assert first.bucket(url) is second.bucket(url)
+
+
+def test_default_limit_does_not_throttle_explicit_limits():
+    default = RateLimiter(5.0)
+    wiley = RateLimiter(limits=WILEY_LIMITS)
+    url = "https://api.wiley-other.test/articles/1"
+    assert default.bucket(url) is not wiley.bucket(url)
+    default.reserve(url)
+    # 默认客户端的请求不消耗Wiley窗口的令牌,突发的3个请求不需要等待
+    assert [wiley.reserve(url) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert wiley.reserve(url) > 0
+
+
+def test_set_host_limits_overrides_clients():
+    bucket = set_host_limits("override.test", [(1, 1.0)])
+    assert RateLimiter(5.0).bucket("https://override.test/x") is bucket
+    assert RateLimiter(limits=WILEY_LIMITS).bucket("https://override.test/y") is bucket
+
+
+def test_ledger_buckets_are_keyed_by_limits(tmp_path):
+    ledger = tmp_path / "ratelimit.db"
+    url = "https://ledger.test/x"
+    default = RateLimiter(5.0, ledger=ledger)
+    wiley = RateLimiter(limits=WILEY_LIMITS, ledger=ledger)
+    default.reserve(url)
+    assert sorted(wiley.bucket(url).limits) == sorted((float(c), float(p)) for c, p in WILEY_LIMITS)
+    assert [wiley.reserve(url) for _ in range(3)] == [0.0, 0.0, 0.0]